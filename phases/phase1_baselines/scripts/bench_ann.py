@@ -0,0 +1,51 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, json, time, numpy as np
+from src.data.store import load_csr
+from src.models.baselines.mf_svd import load_factors
+from src.models.topk import score_user
+from src.models.ann import IVFIndex
+
+def synthetic_factors(n_users: int, n_items: int, dim: int, seed: int = 42):
+    """Clustered user/item vectors with a spread of item norms, roughly what trained factors look like"""
+    rng = np.random.default_rng(seed); centers = rng.standard_normal((64, dim))
+    V = centers[rng.integers(0, 64, n_items)] + 0.5 * rng.standard_normal((n_items, dim))
+    V *= rng.lognormal(0, 0.3, n_items)[:, None]
+    U = centers[rng.integers(0, 64, n_users)] + 0.5 * rng.standard_normal((n_users, dim))
+    return U.astype(np.float32), V.astype(np.float32)
+
+def latency(fn, users):
+    """Per-query milliseconds and the results of fn(u) for every sampled user"""
+    out, ms = [], []
+    for u in users:
+        t = time.perf_counter(); out.append(fn(u)); ms.append((time.perf_counter() - t) * 1e3)
+    return out, np.array(ms)
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Recall vs latency of the IVF index against exact inner-product search')
+    ap.add_argument('--algo', choices=['svd', 'als'], default=None, help='use saved factors (and train_csr as seen items)')
+    ap.add_argument('--n_users', type=int, default=10000); ap.add_argument('--n_items', type=int, default=200000)
+    ap.add_argument('--dim', type=int, default=64); ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--n-lists', type=int, default=None); ap.add_argument('--n-probe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument('--queries', type=int, default=500); ap.add_argument('--out', default=None, help='optional JSON file for the results')
+    a = ap.parse_args(); seen = None
+    if a.algo:
+        f = load_factors(f'data/processed/factors_{a.algo}'); U, V = np.asarray(f['U']), np.asarray(f['V'])
+        if os.path.isdir('data/processed/train_csr'): seen = load_csr('data/processed/train_csr')
+    else:
+        U, V = synthetic_factors(a.n_users, a.n_items, a.dim)
+    t = time.perf_counter(); index = IVFIndex.build(V, a.n_lists); build_s = time.perf_counter() - t
+    print(f'{len(V)} items x {V.shape[1]} dims, {index.n_lists} lists, built in {build_s:.2f}s')
+    users = np.random.default_rng(0).choice(len(U), min(a.queries, len(U)), replace=False)
+    excl = (lambda u: seen.indices[seen.indptr[u]:seen.indptr[u+1]]) if seen is not None else (lambda u: None)
+    exact, ms = latency(lambda u: score_user(U[u], V, excl(u), a.k)[0], users)
+    results = [{'method': 'exact', 'recall': 1.0, 'p50_ms': round(float(np.percentile(ms, 50)), 3), 'p99_ms': round(float(np.percentile(ms, 99)), 3)}]
+    print(f"exact          recall=1.000  p50={results[0]['p50_ms']:7.3f}ms  p99={results[0]['p99_ms']:7.3f}ms")
+    for p in a.n_probe:
+        approx, ms = latency(lambda u: index.query(U[u], a.k, excl(u), n_probe=p)[0], users)
+        recall = np.mean([len(np.intersect1d(x, y)) / max(len(y), 1) for x, y in zip(approx, exact)])
+        r = {'method': 'ivf', 'n_probe': p, 'recall': round(float(recall), 4),
+             'p50_ms': round(float(np.percentile(ms, 50)), 3), 'p99_ms': round(float(np.percentile(ms, 99)), 3)}
+        results.append(r); print(f"n_probe={p:<4d}   recall={r['recall']:.3f}  p50={r['p50_ms']:7.3f}ms  p99={r['p99_ms']:7.3f}ms")
+    if a.out: json.dump({'build_seconds': round(build_s, 3), 'results': results}, open(a.out, 'w'), indent=2); print('Wrote', a.out)
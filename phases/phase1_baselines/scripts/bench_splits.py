@@ -0,0 +1,33 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, json, time, tracemalloc, numpy as np, pandas as pd
+from src.data.splits import encode_ids, build_mappings, leave_last_one_out, leave_last_n_indices
+
+def synthetic_log(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Raw interaction log with sparse (non-contiguous) ids, no dedup, for split/mapping timing"""
+    rng = np.random.default_rng(seed); n_users = max(n_rows // 50, 1); n_items = max(n_rows // 200, 1)
+    return pd.DataFrame({'user_id': rng.integers(0, n_users, n_rows) * 7 + 3,
+                         'item_id': rng.zipf(1.2, n_rows) % n_items * 11,
+                         'timestamp': rng.integers(1_700_000_000, 1_725_000_000, n_rows),
+                         'weight': np.ones(n_rows, dtype=np.float32)})
+
+def timed(fn, *args):
+    tracemalloc.start(); t = time.perf_counter(); out = fn(*args); dt = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    return out, {'seconds': round(dt, 3), 'peak_mb': round(peak / 2**20, 1)}
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Time id encoding and leave-last-out splits at several log sizes')
+    ap.add_argument('--rows', type=float, nargs='+', default=[1e6, 1e7, 1e8])
+    ap.add_argument('--out', default=None, help='optional JSON file for the results')
+    args = ap.parse_args(); results = []
+    for n in map(int, args.rows):
+        df = synthetic_log(n); r = {'rows': n}
+        (u, it, _, _), r['encode_ids'] = timed(encode_ids, df)
+        _, r['leave_last_n_indices'] = timed(leave_last_n_indices, u, df['timestamp'].to_numpy(), 1)
+        (mapped, _, _), r['build_mappings'] = timed(build_mappings, df)
+        _, r['leave_last_one_out'] = timed(leave_last_one_out, mapped)
+        results.append(r); del df, mapped
+        print(json.dumps(r))
+    if args.out: json.dump(results, open(args.out, 'w'), indent=2); print('Wrote', args.out)
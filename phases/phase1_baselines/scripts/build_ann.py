@@ -0,0 +1,19 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, time
+from src.models.baselines.mf_svd import load_factors
+from src.models.ann import IVFIndex
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Build an IVF-flat ANN index over saved item factors')
+    ap.add_argument('--algo', choices=['svd', 'als'], default='svd')
+    ap.add_argument('--n-lists', type=int, default=None, help='inverted lists (default ~sqrt(n_items))')
+    ap.add_argument('--n-probe', type=int, default=8, help='lists opened per query by default')
+    ap.add_argument('--n-iter', type=int, default=10, help='k-means iterations')
+    args = ap.parse_args()
+
+    f = load_factors(f'data/processed/factors_{args.algo}')
+    t = time.perf_counter(); index = IVFIndex.build(f['V'], args.n_lists, args.n_iter, args.n_probe)
+    index.save(f'data/processed/ann_{args.algo}', algo=args.algo)
+    print(f'Indexed {len(index.ids)} items into {index.n_lists} lists in {time.perf_counter() - t:.2f}s -> data/processed/ann_{args.algo}')
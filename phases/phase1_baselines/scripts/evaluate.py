@@ -2,16 +2,25 @@ from __future__ import annotations
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import argparse, json, numpy as np
-from src.utils.metrics import recall_at_k, ndcg_at_k, coverage
+from src.utils.metrics import evaluate, coverage, heldout_to_csr
+from src.data.store import load_csr, MANIFEST
+def load_heldout(p='data/processed'):
+    """Held-out items as CSR (binary store when present, else heldout.json) plus meta.json"""
+    meta=json.load(open(os.path.join(p,'meta.json'))); d=os.path.join(p,'heldout_csr')
+    held=load_csr(d) if os.path.isfile(os.path.join(d,MANIFEST)) else heldout_to_csr(json.load(open(os.path.join(p,'heldout.json'))), meta['n_items'])
+    return held, meta
+def report(name, rec, held, meta, ks, per_user_out=None):
+    r=evaluate(rec, held, ks=ks); print(f'== {name} == ({r["n_users"]} users)')
+    for m,v in r['metrics'].items(): print(f'{m}:', round(v,4))
+    print('Coverage:', round(coverage(rec, meta['n_items']),4))
+    if per_user_out: np.savez(per_user_out, **r['per_user']); print('Wrote', per_user_out)
+    return r
 if __name__=='__main__':
-    ap=argparse.ArgumentParser(); ap.add_argument('--k',type=int,default=10)
-    ap.add_argument('--which',choices=['popularity','svd','both'], default='both'); a=ap.parse_args()
-    held=json.load(open('data/processed/heldout.json')); meta=json.load(open('data/processed/meta.json'))
-    if a.which in ('popularity','both'):
-        rec=np.load('data/processed/recs_popularity.npy'); 
-        print('== Popularity =='); print('Recall@K:', round(recall_at_k(rec, held, k=a.k),4))
-        print('NDCG@K:', round(ndcg_at_k(rec, held, k=a.k),4)); print('Coverage:', round(coverage(rec, meta['n_items']),4))
-    if a.which in ('svd','both'):
-        rec=np.load('data/processed/recs_svd.npy'); 
-        print('== SVD =='); print('Recall@K:', round(recall_at_k(rec, held, k=a.k),4))
-        print('NDCG@K:', round(ndcg_at_k(rec, held, k=a.k),4)); print('Coverage:', round(coverage(rec, meta['n_items']),4))
+    ap=argparse.ArgumentParser(); ap.add_argument('--k',type=int,nargs='+',default=[10])
+    ap.add_argument('--which',choices=['popularity','svd','als','both'], default='both')
+    ap.add_argument('--per-user', action='store_true', help='also save per-user metric arrays to data/processed/per_user_<model>.npz'); a=ap.parse_args()
+    held, meta=load_heldout()
+    for name in (('popularity','svd') if a.which=='both' else (a.which,)):
+        rec=np.load(f'data/processed/recs_{name}.npy', mmap_mode='r')
+        try: report(name.upper() if name!='popularity' else 'Popularity', rec, held, meta, a.k, f'data/processed/per_user_{name}.npz' if a.per_user else None)
+        except ValueError as e: ap.error(f'recs_{name}.npy: {e}')
@@ -1,16 +1,40 @@
 
 from __future__ import annotations
-import argparse, os, numpy as np, pandas as pd
-def generate(n_users=1000, n_items=1500, density=0.002, seed=42):
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, numpy as np, pandas as pd
+from src.data.store import write_interactions
+def generate(n_users=1000, n_items=1500, density=0.002, seed=42, skew=None):
+    """skew: item popularity ~ rank**-skew (power law, items in random rank order); None keeps the mild default"""
     rng=np.random.default_rng(seed); n=int(n_users*n_items*density)
-    item_pop=np.clip(rng.power(1.5, size=n_items), 1e-4, None); item_pop=item_pop/item_pop.sum()
+    if skew is None: item_pop=np.clip(rng.power(1.5, size=n_items), 1e-4, None)
+    else: item_pop=rng.permutation(np.arange(1, n_items+1, dtype=np.float64)**-skew)
+    item_pop=item_pop/item_pop.sum()
     users=rng.integers(0,n_users,size=n); items=rng.choice(n_items,size=n,p=item_pop)
     ts=rng.integers(1_700_000_000,1_725_000_000,size=n)
     df=pd.DataFrame({'user_id':users,'item_id':items,'timestamp':ts,'weight':1}).drop_duplicates(['user_id','item_id']).reset_index(drop=True)
     return df
 if __name__=='__main__':
-    ap=argparse.ArgumentParser(); ap.add_argument('--n_users',type=int,default=1000)
+    ap=argparse.ArgumentParser(description='Synthetic interaction log: in memory (default) or streamed into shards with --interactions')
+    ap.add_argument('--n_users',type=int,default=1000)
     ap.add_argument('--n_items',type=int,default=1500); ap.add_argument('--density',type=float,default=0.002)
-    ap.add_argument('--seed',type=int,default=42); a=ap.parse_args()
-    os.makedirs('data/raw', exist_ok=True); generate(a.n_users,a.n_items,a.density,a.seed).to_csv('data/raw/interactions.csv', index=False)
-    print('Wrote data/raw/interactions.csv')
+    ap.add_argument('--seed',type=int,default=42); ap.add_argument('--skew',type=float,default=None,help='power-law exponent of item popularity (e.g. 1.0)')
+    ap.add_argument('--format',choices=['csv','npy','both'],default='both')
+    g=ap.add_argument_group('streaming generator (src/data/synthetic.py)')
+    g.add_argument('--interactions',type=float,default=None,help='target interactions before dedup, e.g. 1e9; switches to sharded output')
+    g.add_argument('--out',default='data/raw/shards'); g.add_argument('--shards',type=int,default=8); g.add_argument('--workers',type=int,default=1)
+    g.add_argument('--shard-format',choices=['npy','parquet'],default='npy',help='parquet needs pyarrow')
+    g.add_argument('--zipf',type=float,default=1.0,help='Zipf exponent of item popularity'); g.add_argument('--activity-sigma',type=float,default=1.0)
+    g.add_argument('--session-len',type=float,default=8.0); g.add_argument('--drift',type=float,default=0.0,help='fraction of the catalogue the popularity curve shifts over the time range')
+    g.add_argument('--merge',action='store_true',help='also write the shards as data/raw/interactions (binary) for the phase scripts'); a=ap.parse_args()
+    os.makedirs('data/raw', exist_ok=True)
+    if a.interactions:
+        from src.data.synthetic import SyntheticConfig, write_dataset, merge_dataset
+        import time; t=time.perf_counter()
+        cfg=SyntheticConfig(a.n_users,a.n_items,int(a.interactions),a.zipf,a.activity_sigma,a.session_len,drift=a.drift,seed=a.seed)
+        meta=write_dataset(cfg,a.out,a.shards,a.workers,a.shard_format)
+        print(f"Wrote {meta['n_rows']} interactions in {len(meta['shards'])} shards to {a.out} ({time.perf_counter()-t:.1f}s)")
+        if a.merge: print(f"Merged {merge_dataset(a.out,'data/raw/interactions.csv')} rows into data/raw/interactions (npy)")
+    else:
+        write_interactions(generate(a.n_users,a.n_items,a.density,a.seed,a.skew), 'data/raw/interactions.csv', a.format)
+        print('Wrote data/raw/interactions.csv' if a.format=='csv' else f'Wrote data/raw/interactions ({a.format})')
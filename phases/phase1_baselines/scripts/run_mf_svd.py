@@ -9,7 +9,8 @@ import pandas as pd
 from scipy import sparse
 
 from src.data.splits import leave_last_one_out, build_mappings, to_csr
-from src.models.baselines.mf_svd import train_svd, recommend_svd
+from src.data.store import read_interactions, save_csr, save_ids
+from src.models.baselines.mf_svd import train_svd, train_als, recommend_svd, save_factors
 
 if __name__ == '__main__':
     # Parse arguments
@@ -17,41 +18,53 @@ if __name__ == '__main__':
     ap.add_argument('--factors', type=int, default=64)
     ap.add_argument('--n_iter', type=int, default=7)
     ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--algo', choices=['svd', 'als'], default='svd')
+    ap.add_argument('--iterations', type=int, default=15, help='ALS sweeps')
+    ap.add_argument('--reg', type=float, default=0.01, help='ALS L2 regularisation')
+    ap.add_argument('--alpha', type=float, default=40.0, help='ALS confidence scaling')
+    ap.add_argument('--cg_steps', type=int, default=3, help='ALS conjugate-gradient steps per solve')
+    ap.add_argument('--no-split', action='store_true', help='do not write the train/held-out split files (run_popularity.py writes the same ones)')
     args = ap.parse_args()
     
     # Load data
-    df = pd.read_csv('data/raw/interactions.csv')
+    df = read_interactions('data/raw/interactions.csv')
     df_indexed, user_to_idx, item_to_idx = build_mappings(df)
     train_data, test_data = leave_last_one_out(df_indexed)
     
     # Convert to sparse matrix
     csr_matrix = to_csr(train_data, len(user_to_idx), len(item_to_idx))
     
-    # Train SVD model
-    U, V = train_svd(csr_matrix, factors=args.factors, n_iter=args.n_iter)
+    # Train factor model
+    if args.algo == 'svd':
+        U, V = train_svd(csr_matrix, factors=args.factors, n_iter=args.n_iter)
+    else:
+        U, V = train_als(csr_matrix, factors=args.factors, iterations=args.iterations, reg=args.reg,
+                         alpha=args.alpha, cg_steps=args.cg_steps)
     
-    # Generate recommendations
-    recommendations = recommend_svd(U, V, csr_matrix, k=args.k)
-    
-    # Save results
+    # Generate recommendations, streamed chunk by chunk into the memory-mapped output
     os.makedirs('data/processed', exist_ok=True)
-    np.save('data/processed/recs_svd.npy', recommendations)
-    
-    # Process held-out data
-    held_out = [[] for _ in range(len(user_to_idx))]
-    for user_id, group in test_data.groupby('user_id'):
-        held_out[user_id] = group['item_id'].tolist()
-    
-    # Save metadata
-    with open('data/processed/heldout.json', 'w') as f:
-        json.dump(held_out, f)
-    
-    metadata = {
-        'n_users': len(user_to_idx),
-        'n_items': len(item_to_idx),
-        'K': args.k
-    }
-    with open('data/processed/meta.json', 'w') as f:
-        json.dump(metadata, f)
-    
-    print('Saved SVD recommendations')
+    recommendations = recommend_svd(U, V, csr_matrix, k=args.k, out=f'data/processed/recs_{args.algo}.npy')
+    save_factors(f'data/processed/factors_{args.algo}', U, V, user_ids=list(user_to_idx), item_ids=list(item_to_idx), algo=args.algo)
+    if not args.no_split:
+        save_csr(csr_matrix, 'data/processed/train_csr')
+        save_csr(to_csr(test_data, len(user_to_idx), len(item_to_idx)), 'data/processed/heldout_csr')
+        save_ids('data/processed', list(user_to_idx), list(item_to_idx))
+
+        # Process held-out data
+        held_out = [[] for _ in range(len(user_to_idx))]
+        for user_id, group in test_data.groupby('user_id'):
+            held_out[user_id] = group['item_id'].tolist()
+
+        # Save metadata
+        with open('data/processed/heldout.json', 'w') as f:
+            json.dump(held_out, f)
+
+        metadata = {
+            'n_users': len(user_to_idx),
+            'n_items': len(item_to_idx),
+            'K': args.k
+        }
+        with open('data/processed/meta.json', 'w') as f:
+            json.dump(metadata, f)
+
+    print(f'Saved {args.algo.upper()} recommendations and factors')
@@ -1,51 +1,57 @@
 from __future__ import annotations
-import pandas as pd, numpy as np, os, json, sys
+import pandas as pd, numpy as np, os, json, sys, argparse
 
 # Add the phase1_baselines directory to Python path so we can import from src
 current_dir = os.path.dirname(__file__)
 phase1_dir = os.path.dirname(current_dir)
 sys.path.insert(0, phase1_dir)
 
-from src.data.splits import leave_last_one_out, build_mappings
+from src.data.splits import leave_last_one_out, build_mappings, to_csr
+from src.data.store import read_interactions, save_csr, save_ids
+from src.models.baselines.popularity import item_counts, rank_items, recommend_popular, recommend_by_segment
 
 K = 10
 
 if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--k', type=int, default=K)
+    ap.add_argument('--half-life-days', type=float, default=None, help='time-decay popularity with this half-life')
+    ap.add_argument('--segments', default=None, help='CSV with user_id,segment columns for per-segment popularity')
+    args = ap.parse_args()
+
     # Read data from the correct location
     data_file = os.path.join(phase1_dir, 'data', 'raw', 'interactions.csv')
-    df = pd.read_csv(data_file)
+    df = read_interactions(data_file)
     df_i, u2i, it2i = build_mappings(df)
     
     train, test = leave_last_one_out(df_i)
     n_users, len_items = len(u2i), len(it2i)
+    seen = to_csr(train, n_users, len_items)
+    items = train['item_id'].to_numpy()
+    ts = train['timestamp'].to_numpy() if args.half_life_days else None
+    half_life = args.half_life_days * 86400 if args.half_life_days else None
     
-    # Calculate item popularity
-    counts = train.groupby('item_id').size().reindex(range(len(it2i)), fill_value=0).to_numpy()
-    ranked = np.argsort(-counts)
-    
-    # Build seen items per user
-    seen = {u: set(g['item_id'].tolist()) for u, g in train.groupby('user_id')}
-    
-    # Generate recommendations
-    recs = np.zeros((len(u2i), K), dtype=int)
-    for u in range(len(u2i)):
-        s = seen.get(u, set())
-        picks = []
-        for it in ranked:
-            if it in s:
-                continue
-            picks.append(it)
-            if len(picks) == K:
-                break
-        if len(picks) < K:
-            picks += [ranked[0]] * (K - len(picks))
-        recs[u] = np.array(picks, dtype=int)
+    if args.segments:
+        # Popularity ranked within each user segment (users missing from the file share segment -1)
+        seg = pd.read_csv(args.segments); segments = np.full(n_users, -1, dtype=np.int64)
+        idx = seg['user_id'].map(u2i); ok = idx.notna().to_numpy()
+        segments[idx[ok].astype(int).to_numpy()] = pd.factorize(seg['segment'])[0][ok]
+        recs = recommend_by_segment(items, train['user_id'].to_numpy(), segments, seen, args.k, ts, half_life)
+    else:
+        # Rank items once, then take each user's first K unseen items
+        counts = item_counts(items, len_items, ts, half_life)
+        recs = recommend_popular(rank_items(counts), seen, args.k)
     
     # Save results to the phase1_baselines data/processed directory
     processed_dir = os.path.join(phase1_dir, 'data', 'processed')
     os.makedirs(processed_dir, exist_ok=True)
     np.save(os.path.join(processed_dir, 'recs_popularity.npy'), recs)
     
+    # Save train/held-out interactions as memory-mappable CSR arrays for later phases
+    save_csr(seen, os.path.join(processed_dir, 'train_csr'))
+    save_csr(to_csr(test, n_users, len_items), os.path.join(processed_dir, 'heldout_csr'))
+    save_ids(processed_dir, list(u2i), list(it2i))
+
     # Save held-out test data
     held = [[] for _ in range(len(u2i))]
     for u, g in test.groupby('user_id'):
@@ -55,9 +61,9 @@ if __name__ == '__main__':
         json.dump(held, f)
     
     # Save metadata
-    meta = {'n_users': len(u2i), 'n_items': len(it2i), 'K': K}
+    meta = {'n_users': len(u2i), 'n_items': len(it2i), 'K': args.k}
     with open(os.path.join(processed_dir, 'meta.json'), 'w') as f:
         json.dump(meta, f)
     
     print('Saved popularity recommendations')
-    print(f'Users: {len(u2i)}, Items: {len(it2i)}, Recommendations per user: {K}')
+    print(f'Users: {len(u2i)}, Items: {len(it2i)}, Recommendations per user: {args.k}')
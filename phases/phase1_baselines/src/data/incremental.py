@@ -0,0 +1,145 @@
+"""Append-only id mappings, CSR growth and leave-last-one-out state for incremental ingestion.
+
+A full build numbers users and items in sorted id order (build_mappings). An incremental update
+keeps every existing code and appends codes for new ids, so arrays indexed by code only grow;
+id_rank() gives each code's position in sorted id order, which is what the full build breaks
+ties with. The holdout state keeps each user's last n_recent interactions (right-aligned, oldest
+first), which is enough to move the held-out row when newer interactions arrive.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+import numpy as np
+from scipy import sparse
+from src.data.splits import _sorted_order
+
+def extend_ids(ids: np.ndarray, raw: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Codes of raw ids under the mapping ids (code -> raw id), appending unseen ids in sorted order"""
+    raw = np.asarray(raw); order = np.argsort(ids, kind='stable'); s = ids[order]
+    pos = np.minimum(np.searchsorted(s, raw), max(len(s) - 1, 0))
+    known = (s[pos] == raw) if len(s) else np.zeros(len(raw), dtype=bool)
+    new = np.unique(raw[~known]); codes = np.empty(len(raw), dtype=np.int64)
+    codes[known] = order[pos[known]]; codes[~known] = len(ids) + np.searchsorted(new, raw[~known])
+    return codes, np.concatenate([ids, new.astype(ids.dtype)])
+
+def id_rank(ids: np.ndarray) -> np.ndarray:
+    """Position of each code in sorted id order (the code a full rebuild would assign)"""
+    r = np.empty(len(ids), dtype=np.int64); r[np.argsort(ids, kind='stable')] = np.arange(len(ids)); return r
+
+def grow_csr(m: sparse.csr_matrix, shape: tuple[int, int]) -> sparse.csr_matrix:
+    """Same entries in a larger shape (new rows are empty)"""
+    indptr = np.concatenate([m.indptr, np.full(shape[0] - m.shape[0], m.indptr[-1], dtype=m.indptr.dtype)])
+    return sparse.csr_matrix((m.data, m.indices, indptr), shape=shape)
+
+def append_csr(m: sparse.csr_matrix, rows, cols, data, shape: tuple[int, int] | None = None) -> sparse.csr_matrix:
+    """m (grown to shape) plus the COO delta; negative data removes entries, explicit zeros are dropped"""
+    shape = shape or m.shape; m = grow_csr(m, shape)
+    out = (m + sparse.csr_matrix((np.asarray(data, dtype=m.dtype), (rows, cols)), shape=shape)).tocsr()
+    out.eliminate_zeros(); return out
+
+def take_rows(lists, rows) -> tuple[np.ndarray, ...]:
+    """CSR-style (indptr, *values) restricted to rows, in the given row order"""
+    indptr = np.asarray(lists[0]); rows = np.asarray(rows, dtype=np.int64)
+    lo = indptr[rows]; n = indptr[rows + 1] - lo; out_ptr = np.concatenate(([0], np.cumsum(n))).astype(np.int64)
+    flat = np.repeat(lo - out_ptr[:-1], n) + np.arange(out_ptr[-1])
+    return (out_ptr,) + tuple(np.asarray(v)[flat] for v in lists[1:])
+
+def replace_rows(lists, n_rows: int, rows, new) -> tuple[np.ndarray, ...]:
+    """CSR-style lists (grown to n_rows) with the given rows replaced by new (CSR-style, same row order)"""
+    indptr = np.asarray(lists[0]); indptr = np.concatenate([indptr, np.full(n_rows + 1 - len(indptr), indptr[-1], dtype=indptr.dtype)])
+    rows = np.asarray(rows, dtype=np.int64); lens = np.diff(indptr); new_lens = lens.copy(); new_lens[rows] = np.diff(new[0])
+    out_ptr = np.concatenate(([0], np.cumsum(new_lens))).astype(np.int64)
+    changed = np.zeros(n_rows, dtype=bool); changed[rows] = True
+    old_row = np.repeat(np.arange(n_rows), lens); keep = ~changed[old_row]
+    dst_old = out_ptr[old_row[keep]] + (np.arange(len(old_row)) - indptr[old_row])[keep]
+    new_row = np.repeat(rows, np.diff(new[0])); dst_new = out_ptr[new_row] + np.arange(len(new_row)) - np.asarray(new[0])[np.repeat(np.arange(len(rows)), np.diff(new[0]))]
+    out = [out_ptr]
+    for old_v, new_v in zip(lists[1:], new[1:]):
+        v = np.empty(out_ptr[-1], dtype=np.asarray(old_v).dtype); v[dst_old] = np.asarray(old_v)[keep]; v[dst_new] = new_v; out.append(v)
+    return tuple(out)
+
+def merge_topk(lists, rows, stale: np.ndarray, update, k: int, col_rank: np.ndarray):
+    """Patch stored top-k rows whose scores changed only in the stale columns.
+
+    lists holds every row's top-k (best first, ties by col_rank); update is (row position in rows,
+    column, new score) for the stale columns of those rows. Old stale entries are replaced by the
+    update and the row re-cut to k. A full row is only provably exact when at least k merged
+    entries still rank at or above its old k-th entry (every column outside the list ranked below
+    it); the returned mask flags the rows that need a full recompute instead.
+    Returns ((indptr, cols, vals) for rows, exact mask).
+    """
+    old = take_rows(lists, rows); n = len(rows); lens = np.diff(old[0])
+    orow = np.repeat(np.arange(n), lens); keep = ~stale[old[1]]
+    r = np.concatenate([orow[keep], update[0]]); c = np.concatenate([old[1][keep], update[1]])
+    v = np.concatenate([old[2][keep], update[2]]).astype(old[2].dtype); pos = v > 0; r, c, v = r[pos], c[pos], v[pos]
+    order = np.lexsort((col_rank[c], -v, r)); r, c, v = r[order], c[order], v[order]
+    counts = np.bincount(r, minlength=n); first = np.cumsum(counts) - counts
+    sel = np.arange(len(r)) - first[r] < k
+    full = lens >= k; last = np.where(lens > 0, old[0][1:] - 1, len(old[1]))   # padded slot for empty rows
+    vk = np.append(old[2], 0)[last]; rk = col_rank[np.append(old[1], 0)[last]]
+    above = (v > vk[r]) | ((v == vk[r]) & (col_rank[c] <= rk[r]))
+    exact = ~full | (np.bincount(r[above], minlength=n) >= k)
+    return (np.concatenate(([0], np.cumsum(np.minimum(counts, k)))).astype(np.int64), c[sel], v[sel]), exact
+
+def _prefix(lists, rows, limit: int | None):
+    ptr = np.asarray(lists[0]); ptr = np.append(ptr, np.full(max(rows.max(initial=-1) + 2 - len(ptr), 0), ptr[-1])); lo = ptr[rows]; n = ptr[rows + 1] - lo
+    if limit is not None: n = np.minimum(n, limit)
+    return n, np.asarray(lists[1])[np.repeat(lo - (np.cumsum(n) - n), n) + np.arange(n.sum())]
+
+def changed_rows(old, new, rows, limit: int | None = None) -> np.ndarray:
+    """Rows whose column lists (first limit entries) differ between two CSR-style lists"""
+    rows = np.asarray(rows, dtype=np.int64); la, ca = _prefix(old, rows, limit); lb, cb = _prefix(new, rows, limit)
+    diff = la != lb; same_a = np.repeat(~diff, la); same_b = np.repeat(~diff, lb)
+    bad = np.repeat(np.arange(len(rows)), la)[same_a][ca[same_a] != cb[same_b]]
+    diff[bad] = True; return rows[diff]
+
+def pad_rows(a: np.ndarray, n: int, fill) -> np.ndarray:
+    """a extended to n rows along axis 0 with fill"""
+    if len(a) >= n: return a
+    return np.concatenate([a, np.full((n - len(a),) + a.shape[1:], fill, dtype=a.dtype)])
+
+@dataclass
+class HoldoutState:
+    """Per-user interaction count and last n_recent rows (item code, timestamp, weight; -1 items pad on the left)"""
+    count: np.ndarray
+    items: np.ndarray
+    ts: np.ndarray
+    weight: np.ndarray
+
+    @property
+    def last_item(self) -> np.ndarray: return self.items[:, -1]
+
+    def heldout(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(users, items, weights) of the held-out rows: the last row of every user with more than one"""
+        u = np.flatnonzero(self.count > 1); return u, self.items[u, -1], self.weight[u, -1]
+
+    @classmethod
+    def empty(cls, n_recent: int = 5) -> 'HoldoutState':
+        """State before any interaction; a full log is then folded in with one update()"""
+        return cls(np.zeros(0, dtype=np.int64), np.zeros((0, n_recent), dtype=np.int64),
+                   np.zeros((0, n_recent), dtype=np.int64), np.zeros((0, n_recent), dtype=np.float32))
+
+    def update(self, u, i, ts, w, n_users: int):
+        """Fold new rows (in log order) into the state; returns the rows to (add to, remove from) train.
+
+        Ties on timestamp go to the row that comes later in the log, exactly like the stable
+        (user, timestamp) sort of leave_last_one_out, so the held-out row matches a full rebuild.
+        """
+        u = np.asarray(u, dtype=np.int64); i = np.asarray(i, dtype=np.int64)
+        ts = np.asarray(ts, dtype=np.int64); w = np.asarray(w, dtype=np.float32); R = self.items.shape[1]
+        self.count = pad_rows(self.count, n_users, 0); self.items = pad_rows(self.items, n_users, -1)
+        self.ts = pad_rows(self.ts, n_users, 0); self.weight = pad_rows(self.weight, n_users, 0)
+        users = np.unique(u); old_count = self.count[users]; new_count = old_count + np.bincount(u, minlength=n_users)[users]
+        old_item, old_w = self.items[users, -1].copy(), self.weight[users, -1].copy()
+        # previous recent rows of the touched users come first in log order, then the new rows
+        keep = self.items[users] >= 0; pu = np.repeat(users, R).reshape(-1, R)[keep]
+        cu = np.concatenate([pu, u]); ci = np.concatenate([self.items[users][keep], i])
+        ct = np.concatenate([self.ts[users][keep], ts]); cw = np.concatenate([self.weight[users][keep], w])
+        order = _sorted_order(cu, ct); cu, ci, ct, cw = cu[order], ci[order], ct[order], cw[order]
+        n = np.bincount(cu, minlength=n_users)[users]; from_end = np.repeat(np.cumsum(n), n) - np.arange(len(cu)) - 1
+        take = from_end < R; col = R - 1 - from_end[take]
+        self.items[users] = -1; self.items[cu[take], col] = ci[take]
+        self.ts[cu[take], col] = ct[take]; self.weight[cu[take], col] = cw[take]; self.count[users] = new_count
+        was, now = old_count > 1, new_count > 1
+        add = (np.concatenate([u, users[was]]), np.concatenate([i, old_item[was]]), np.concatenate([w, old_w[was]]))
+        sub = (users[now], self.items[users[now], -1], self.weight[users[now], -1])
+        return add, sub
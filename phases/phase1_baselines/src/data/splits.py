@@ -3,47 +3,71 @@ import pandas as pd
 import numpy as np
 from scipy import sparse
 
+def encode_ids(df: pd.DataFrame):
+    """Integer codes for user and item ids (in sorted id order) without copying the frame.
+
+    Returns (user_codes, item_codes, user_ids, item_ids) where user_ids[user_codes] == df['user_id'].
+    """
+    u, users = pd.factorize(df['user_id'], sort=True)
+    it, items = pd.factorize(df['item_id'], sort=True)
+    return u.astype(np.int32), it.astype(np.int32), np.asarray(users), np.asarray(items)
+
 def build_mappings(df):
     """Build user and item mappings to consecutive integers starting from 0"""
-    unique_users = sorted(df['user_id'].unique())
-    unique_items = sorted(df['item_id'].unique())
-    
-    u2i = {user: idx for idx, user in enumerate(unique_users)}
-    it2i = {item: idx for idx, item in enumerate(unique_items)}
-    
+    u, it, users, items = encode_ids(df)
+    u2i = dict(zip(users.tolist(), range(len(users))))
+    it2i = dict(zip(items.tolist(), range(len(items))))
+
     # Create mapped dataframe
-    df_mapped = df.copy()
-    df_mapped['user_id'] = df_mapped['user_id'].map(u2i)
-    df_mapped['item_id'] = df_mapped['item_id'].map(it2i)
-    
+    df_mapped = df.assign(user_id=u, item_id=it)
+
     return df_mapped, u2i, it2i
 
+def _sorted_order(users: np.ndarray, timestamps: np.ndarray | None) -> np.ndarray:
+    """Stable order by user, then timestamp"""
+    if timestamps is None: return np.argsort(users, kind='stable')
+    if len(users) == 0: return np.zeros(0, dtype=np.int64)
+    if users.dtype.kind not in 'iu' or timestamps.dtype.kind not in 'iu': return np.lexsort((timestamps, users))  # packing would truncate floats
+    u0, t0 = int(users.min()), int(timestamps.min())
+    span_u, span_t = int(users.max()) - u0 + 1, int(timestamps.max()) - t0 + 1
+    if span_u * span_t < 2**62:  # pack both keys into one int64: one sort pass instead of two
+        return np.argsort((users.astype(np.int64) - u0) * span_t + (timestamps.astype(np.int64) - t0), kind='stable')
+    return np.lexsort((timestamps, users))
+
+def last_n_mask(users_sorted: np.ndarray, n: int = 1) -> np.ndarray:
+    """Boolean mask over user-sorted rows marking each user's last n rows.
+
+    Users with n or fewer rows keep everything in train, like leave_last_one_out.
+    """
+    if len(users_sorted) == 0: return np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(np.r_[True, users_sorted[1:] != users_sorted[:-1]])
+    sizes = np.diff(np.r_[starts, len(users_sorted)])
+    from_end = np.repeat(starts + sizes, sizes) - np.arange(len(users_sorted)) - 1
+    return (from_end < n) & (np.repeat(sizes, sizes) > n)
+
+def leave_last_n_indices(users: np.ndarray, timestamps: np.ndarray | None = None, n: int = 1):
+    """Row positions (train, test) for a leave-last-n split, both ordered by user then timestamp"""
+    order = _sorted_order(users, timestamps)
+    test = last_n_mask(users[order], n)
+    return order[~test], order[test]
+
+def leave_last_n_out(df, n: int = 1):
+    """Hold out each user's last n interactions by timestamp"""
+    if len(df) == 0: return pd.DataFrame(), pd.DataFrame()
+    ts = df['timestamp'].to_numpy() if 'timestamp' in df.columns else None
+    train_idx, test_idx = leave_last_n_indices(df['user_id'].to_numpy(), ts, n)
+    return df.iloc[train_idx].reset_index(drop=True), df.iloc[test_idx].reset_index(drop=True)
+
 def leave_last_one_out(df):
     """Split data using leave-last-one-out strategy based on timestamp"""
-    # Sort by user and timestamp
-    if 'timestamp' in df.columns:
-        df_sorted = df.sort_values(['user_id', 'timestamp'])
-    else:
-        # If no timestamp, just use the order
-        df_sorted = df.sort_values('user_id')
-    
-    train_data = []
-    test_data = []
-    
-    for user_id, group in df_sorted.groupby('user_id'):
-        if len(group) > 1:
-            # Last interaction goes to test
-            test_data.append(group.iloc[-1])
-            # Rest goes to train
-            train_data.extend(group.iloc[:-1].to_dict('records'))
-        else:
-            # If user has only one interaction, put it in train
-            train_data.extend(group.to_dict('records'))
-    
-    train_df = pd.DataFrame(train_data) if train_data else pd.DataFrame()
-    test_df = pd.DataFrame(test_data) if test_data else pd.DataFrame()
-    
-    return train_df, test_df
+    return leave_last_n_out(df, 1)
+
+def time_cutoff_split(df, cutoff: int, warm_only: bool = True):
+    """Interactions before cutoff train, the rest test; warm_only drops test users unseen in train"""
+    is_train = df['timestamp'].to_numpy() < cutoff; is_test = ~is_train
+    if warm_only:
+        users = df['user_id'].to_numpy(); is_test &= np.isin(users, users[is_train])
+    return df[is_train].reset_index(drop=True), df[is_test].reset_index(drop=True)
 
 def to_csr(train: pd.DataFrame, n_users: int, n_items: int):
     rows=train['user_id'].to_numpy(); cols=train['item_id'].to_numpy()
@@ -0,0 +1,206 @@
+"""Binary artifact layer shared by all phases.
+
+Tables are directories with one .npy file per column plus a small manifest, CSR matrices are
+their indptr/indices/data arrays, and candidate lists are CSR-style key/offset/item arrays.
+Everything loads with np.load(mmap_mode='r'), so readers map the files instead of parsing text.
+CSV/JSON stay available as export formats; a table written as `x.csv` lives in the sibling
+directory `x/`, and readers prefer that directory when it is at least as new as the text file.
+"""
+from __future__ import annotations
+import os, io, json
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+INTERACTION_DTYPES = {'user_id': np.int32, 'item_id': np.int32, 'timestamp': np.int64, 'weight': np.float32}
+MANIFEST = 'manifest.json'
+
+def binary_path(path: str) -> str:
+    """Directory holding the binary form of a .csv/.json artifact path"""
+    root, ext = os.path.splitext(path)
+    return root if ext in ('.csv', '.json') else path
+
+def _fits(values: np.ndarray, dtype) -> bool:
+    if not len(values) or not np.issubdtype(np.dtype(dtype), np.integer): return True
+    info = np.iinfo(dtype); return info.min <= values.min() and values.max() <= info.max
+
+def save_table(df: pd.DataFrame, path: str, dtypes: dict | None = None):
+    """Write each column as a typed .npy; integer columns fall back to int64 when ids do not fit"""
+    os.makedirs(path, exist_ok=True); dtypes = dtypes or {}; cols = {}
+    for c in df.columns:
+        v = df[c].to_numpy(); dt = dtypes.get(c, v.dtype)
+        if not _fits(v, dt): dt = np.int64
+        np.save(os.path.join(path, f'{c}.npy'), np.ascontiguousarray(v, dtype=dt)); cols[c] = np.dtype(dt).str
+    with open(os.path.join(path, MANIFEST), 'w') as f: json.dump({'columns': cols, 'n_rows': len(df)}, f)
+
+def load_columns(path: str, mmap: bool = True) -> dict[str, np.ndarray]:
+    meta = json.load(open(os.path.join(path, MANIFEST)))
+    return {c: np.load(os.path.join(path, f'{c}.npy'), mmap_mode='r' if mmap else None) for c in meta['columns']}
+
+def load_table(path: str, mmap: bool = True) -> pd.DataFrame:
+    """DataFrame whose columns are backed by the memory-mapped arrays (no copy)"""
+    return pd.DataFrame(load_columns(path, mmap), copy=False)
+
+def binary_source(path: str) -> str | None:
+    """Binary directory to read for path, or None when only the text export is usable"""
+    d = binary_path(path); m = os.path.join(d, MANIFEST)
+    if not os.path.isfile(m): return None
+    if os.path.isfile(path) and d != path and os.path.getmtime(m) < os.path.getmtime(path): return None
+    return d
+
+def read_table(path: str, mmap: bool = True) -> pd.DataFrame:
+    """Load a table from its binary directory when available, else parse the CSV"""
+    d = binary_source(path)
+    return load_table(d, mmap) if d else pd.read_csv(path)
+
+def iter_table(path: str, columns: list[str] | None = None, chunk_rows: int = 1_000_000):
+    """A table as consecutive DataFrame chunks: row slices of the mapped columns, or a chunked CSV read"""
+    d = binary_source(path)
+    if d is None:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows); return
+    cols = load_columns(d); columns = columns or list(cols); n = len(cols[columns[0]])
+    for lo in range(0, n, chunk_rows): yield pd.DataFrame({c: np.asarray(cols[c][lo:lo + chunk_rows]) for c in columns})
+
+def write_table(df: pd.DataFrame, path: str, fmt: str = 'both', dtypes: dict | None = None):
+    """fmt: 'npy' (binary directory), 'csv' (text export) or 'both'; the binary copy is written last"""
+    if fmt in ('csv', 'both'): df.to_csv(path, index=False)
+    if fmt in ('npy', 'both'): save_table(df, binary_path(path), dtypes)
+
+def _splice_npy(path: str, start: int | None, values: np.ndarray) -> str:
+    """Replace the rows from start on of a 1-d .npy with values in place (start=None appends); returns its dtype.
+
+    The header is rewritten with the new length (numpy pads it for growth), so only the new rows are
+    written; falls back to a full rewrite if the header size changes or the values need a wider type.
+    """
+    fmt = np.lib.format; io_ = {(1, 0): (fmt.read_array_header_1_0, fmt.write_array_header_1_0),
+                                (2, 0): (fmt.read_array_header_2_0, fmt.write_array_header_2_0)}
+    with open(path, 'r+b') as f:
+        version = fmt.read_magic(f)
+        if version in io_:
+            read, write = io_[version]; shape, fortran, dtype = read(f); off = f.tell()
+            start = shape[0] if start is None else start
+            if _fits(np.asarray(values), dtype):
+                values = np.ascontiguousarray(values, dtype=dtype)
+                header = io.BytesIO()   # the writers emit the magic string too
+                write(header, {'descr': fmt.dtype_to_descr(dtype), 'fortran_order': fortran, 'shape': (start + len(values),)})
+                if header.tell() == off:
+                    f.seek(0); f.write(header.getvalue()); f.seek(off + start * dtype.itemsize); f.write(values.tobytes()); f.truncate()
+                    return dtype.str
+    old = np.load(path); start = len(old) if start is None else start
+    dtype = old.dtype if _fits(np.asarray(values), old.dtype) else np.dtype(np.int64)
+    np.save(path, np.concatenate([old[:start].astype(dtype), np.asarray(values, dtype=dtype)])); return dtype.str
+
+def _update_manifest(d: str, n_rows: int, dtypes: dict):
+    meta = json.load(open(os.path.join(d, MANIFEST))); meta['columns'].update(dtypes); meta['n_rows'] = n_rows
+    with open(os.path.join(d, MANIFEST), 'w') as f: json.dump(meta, f)
+
+def append_table(df: pd.DataFrame, path: str, fmt: str = 'both'):
+    """Append rows to a table written by write_table: the CSV gets the rows as text, the binary columns grow in place"""
+    if fmt in ('csv', 'both') and os.path.isfile(path):
+        df[list(pd.read_csv(path, nrows=0).columns)].to_csv(path, mode='a', header=False, index=False)
+    d = binary_path(path)
+    if fmt in ('npy', 'both') and os.path.isfile(os.path.join(d, MANIFEST)):
+        meta = json.load(open(os.path.join(d, MANIFEST)))
+        _update_manifest(d, meta['n_rows'] + len(df), {c: _splice_npy(os.path.join(d, f'{c}.npy'), None, df[c].to_numpy()) for c in meta['columns']})
+
+def update_table(d: str, patches: list[tuple[np.ndarray, dict]], start: int, tail: pd.DataFrame):
+    """Patch a binary table directory in place: each (rows, {column: values}) patch writes rows below
+    start, in order, and the rows from start on are replaced by tail (of any length). Only those rows
+    are written; the manifest is rewritten last."""
+    meta = json.load(open(os.path.join(d, MANIFEST))); dtypes = {}
+    for c in meta['columns']:
+        p = os.path.join(d, f'{c}.npy'); todo = [(r, v[c]) for r, v in patches if c in v and len(r)]
+        if todo:
+            a = np.load(p, mmap_mode='r+')
+            for r, v in todo: a[r] = v
+            a.flush(); del a
+        dtypes[c] = _splice_npy(p, start, tail[c].to_numpy())
+    _update_manifest(d, start + len(tail), dtypes)
+
+def save_npy(path: str, a: np.ndarray):
+    """np.save through a temporary file and a rename, so processes mapping the old file keep a valid mapping"""
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f: np.save(f, a)
+    os.replace(tmp, path)
+
+def save_ids(path: str, user_ids, item_ids):
+    """Raw ids of the user/item codes (rows/columns of the split CSRs) as user_ids.npy and item_ids.npy in path"""
+    save_npy(os.path.join(path, 'user_ids.npy'), np.asarray(user_ids, dtype=np.int64))
+    save_npy(os.path.join(path, 'item_ids.npy'), np.asarray(item_ids, dtype=np.int64))
+
+def save_arrays(path: str, arrays: dict[str, np.ndarray], **meta):
+    """Directory of named .npy arrays of any shapes plus a manifest holding meta"""
+    os.makedirs(path, exist_ok=True)
+    for n, a in arrays.items(): np.save(os.path.join(path, f'{n}.npy'), np.asarray(a))
+    with open(os.path.join(path, MANIFEST), 'w') as f: json.dump({'arrays': list(arrays), **meta}, f)
+
+def load_arrays(path: str, mmap: bool = True) -> tuple[dict[str, np.ndarray], dict]:
+    meta = json.load(open(os.path.join(path, MANIFEST)))
+    return {n: np.load(os.path.join(path, f'{n}.npy'), mmap_mode='r' if mmap else None) for n in meta['arrays']}, meta
+
+def read_interactions(path: str, mmap: bool = True) -> pd.DataFrame:
+    return read_table(path, mmap)
+
+def write_interactions(df: pd.DataFrame, path: str, fmt: str = 'both'):
+    write_table(df, path, fmt, INTERACTION_DTYPES)
+
+def save_csr(m: sparse.csr_matrix, path: str):
+    os.makedirs(path, exist_ok=True)
+    for f in ('indptr', 'indices', 'data'): save_npy(os.path.join(path, f'{f}.npy'), getattr(m, f))
+    with open(os.path.join(path, MANIFEST), 'w') as f: json.dump({'shape': list(m.shape)}, f)
+
+def load_csr(path: str, mmap: bool = True) -> sparse.csr_matrix:
+    shape = tuple(json.load(open(os.path.join(path, MANIFEST)))['shape'])
+    arrs = [np.load(os.path.join(path, f'{f}.npy'), mmap_mode='r' if mmap else None) for f in ('data', 'indices', 'indptr')]
+    return sparse.csr_matrix(tuple(arrs), shape=shape, copy=False)
+
+@dataclass
+class CandidateIndex:
+    """Candidate lists keyed by id, stored as sorted keys plus CSR-style offsets into one item array"""
+    keys: np.ndarray
+    offsets: np.ndarray
+    items: np.ndarray
+
+    def __len__(self): return len(self.keys)
+
+    def __contains__(self, key):
+        i = np.searchsorted(self.keys, key); return i < len(self.keys) and self.keys[i] == key
+
+    def get(self, key, default=None) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return np.zeros(0, dtype=self.items.dtype) if default is None else default
+        return self.items[self.offsets[i]:self.offsets[i+1]]
+
+    def to_dict(self) -> dict[int, list[int]]:
+        items = np.asarray(self.items).tolist(); off = np.asarray(self.offsets).tolist()
+        return {k: items[off[i]:off[i+1]] for i, k in enumerate(np.asarray(self.keys).tolist())}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'CandidateIndex':
+        keys = np.array([int(k) for k in d], dtype=np.int64); order = np.argsort(keys, kind='stable')
+        lists = list(d.values()); lists = [lists[i] for i in order]
+        lens = np.array([len(v) for v in lists], dtype=np.int64)
+        items = np.fromiter((int(x) for v in lists for x in v), dtype=np.int64, count=int(lens.sum()))
+        return cls(keys[order], np.concatenate(([0], np.cumsum(lens))), items)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for f in ('keys', 'offsets', 'items'): np.save(os.path.join(path, f'{f}.npy'), getattr(self, f))
+        with open(os.path.join(path, MANIFEST), 'w') as f: json.dump({'n_keys': len(self.keys), 'n_items': len(self.items)}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CandidateIndex':
+        return cls(*(np.load(os.path.join(path, f'{f}.npy'), mmap_mode='r' if mmap else None) for f in ('keys', 'offsets', 'items')))
+
+def read_candidates(path: str, mmap: bool = True) -> CandidateIndex:
+    """Candidates from the binary directory when available, else from the JSON export"""
+    d = binary_source(path)
+    return CandidateIndex.load(d, mmap) if d else CandidateIndex.from_dict(json.load(open(path)))
+
+def write_candidates(c: CandidateIndex, path: str, fmt: str = 'both'):
+    """fmt: 'npy' (binary directory), 'json' (text export) or 'both'; the binary copy is written last"""
+    if fmt in ('json', 'both'):
+        with open(path, 'w') as f: json.dump({str(k): v for k, v in c.to_dict().items()}, f)
+    if fmt in ('npy', 'both'): c.save(binary_path(path))
@@ -0,0 +1,139 @@
+"""Streaming synthetic interaction logs, generated in user blocks and written as shards in parallel.
+
+Users are cut into fixed blocks of BLOCK_USERS; each block draws from its own RNG seeded by
+(seed, block index), so the rows depend only on the config and seed, never on how blocks are
+grouped into shards or how many workers write them. A block holds every interaction of its users,
+which makes the (user, item) dedup exact with a per-block hash lookup.
+
+    activity   per-user counts ~ lognormal with mean n_interactions / n_users (heavy right tail)
+    items      Zipf: P(rank r) ~ r**-zipf_a, ranks mapped to item ids by a seeded permutation
+    sessions   each user's events fall into 1 + Poisson(n / session_len) sessions that start
+               uniformly over the time range; events in a session are exponential gaps apart
+    drift      the popularity curve rotates by drift * n_items ranks from t_start to t_end, so
+               items rise and fall over time
+"""
+from __future__ import annotations
+import os, json
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.data.store import write_table, append_table, load_table
+
+BLOCK_USERS = 4096
+DATASET = '_dataset.json'
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    n_users: int = 100_000
+    n_items: int = 20_000
+    n_interactions: int = 1_000_000   # before dedup
+    zipf_a: float = 1.0
+    activity_sigma: float = 1.0
+    session_len: float = 8.0
+    session_gap: float = 90.0         # mean seconds between events of a session
+    drift: float = 0.0
+    t_start: int = 1_700_000_000
+    t_end: int = 1_725_000_000
+    seed: int = 42
+
+    @property
+    def n_blocks(self) -> int:
+        return -(-self.n_users // BLOCK_USERS)
+
+    def dtypes(self) -> dict:
+        idt = lambda n: np.int32 if n <= np.iinfo(np.int32).max else np.int64
+        return {'user_id': idt(self.n_users), 'item_id': idt(self.n_items), 'timestamp': np.int64, 'weight': np.float32}
+
+def item_tables(cfg: SyntheticConfig) -> tuple[np.ndarray, np.ndarray]:
+    """(Zipf CDF over popularity ranks, rank -> item id permutation), shared by every block"""
+    p = np.arange(1, cfg.n_items + 1, dtype=np.float64) ** -cfg.zipf_a; cdf = np.cumsum(p); cdf /= cdf[-1]
+    return cdf, np.random.default_rng(np.random.SeedSequence([cfg.seed, 2**32])).permutation(cfg.n_items)
+
+def generate_block(cfg: SyntheticConfig, block: int, tables=None) -> pd.DataFrame:
+    """Deduplicated interactions of the users in one block, sorted by (user, timestamp)"""
+    cdf, perm = tables if tables is not None else item_tables(cfg)
+    rng = np.random.default_rng(np.random.SeedSequence([cfg.seed, block]))
+    u0 = block * BLOCK_USERS; users = np.arange(u0, min(u0 + BLOCK_USERS, cfg.n_users), dtype=np.int64)
+    mean = cfg.n_interactions / cfg.n_users; mu = np.log(mean) - cfg.activity_sigma**2 / 2
+    n = np.clip(np.round(rng.lognormal(mu, cfg.activity_sigma, len(users))), 1, cfg.n_items).astype(np.int64)
+    # sessions: per-user count, start times, then each event joins one of its user's sessions
+    n_sess = 1 + rng.poisson((n - 1) / cfg.session_len); sess_ptr = np.cumsum(n_sess) - n_sess
+    span = cfg.t_end - cfg.t_start; start = cfg.t_start + rng.random(n_sess.sum()) * span
+    ev_user = np.repeat(np.arange(len(users)), n)
+    ev_sess = sess_ptr[ev_user] + (rng.random(len(ev_user)) * n_sess[ev_user]).astype(np.int64)
+    order = np.argsort(ev_sess, kind='stable'); ev_user, ev_sess = ev_user[order], ev_sess[order]
+    gap = np.cumsum(rng.exponential(cfg.session_gap, len(ev_sess)))
+    first = np.r_[True, ev_sess[1:] != ev_sess[:-1]]; base = np.maximum.accumulate(np.where(first, np.r_[0.0, gap[:-1]], 0.0))
+    ts = np.minimum(start[ev_sess] + gap - base, cfg.t_end - 1).astype(np.int64)
+    # Zipf rank by inverse CDF, shifted by the drift at the event's time
+    rank = np.minimum(np.searchsorted(cdf, rng.random(len(ts)), side='right'), cfg.n_items - 1)
+    shift = (cfg.drift * cfg.n_items * (ts - cfg.t_start) / span).astype(np.int64)
+    item = perm[(rank + shift) % cfg.n_items]
+    order = np.lexsort((ts, ev_user)); uid = users[ev_user[order]]; item = item[order]; ts = ts[order]
+    keep = ~pd.Series(uid * cfg.n_items + item).duplicated().to_numpy()   # hash dedup, keeps each pair's first event
+    return pd.DataFrame({'user_id': uid[keep], 'item_id': item[keep], 'timestamp': ts[keep], 'weight': np.ones(int(keep.sum()), dtype=np.float32)})
+
+def shard_blocks(cfg: SyntheticConfig, n_shards: int) -> list[range]:
+    """Contiguous block ranges, one per shard"""
+    edges = np.linspace(0, cfg.n_blocks, min(n_shards, cfg.n_blocks) + 1).round().astype(int)
+    return [range(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+def iter_blocks(cfg: SyntheticConfig, blocks=None):
+    """Stream the log block by block (one block in memory at a time)"""
+    tables = item_tables(cfg)
+    for b in (range(cfg.n_blocks) if blocks is None else blocks): yield generate_block(cfg, b, tables)
+
+def write_shard(cfg: SyntheticConfig, blocks: range, path: str, fmt: str = 'npy') -> int:
+    """Write the blocks as one shard (binary table directory, or a .parquet file); returns its row count"""
+    n = 0; writer = None
+    for j, df in enumerate(iter_blocks(cfg, blocks)):
+        df = df.astype(cfg.dtypes()); n += len(df)
+        if fmt == 'parquet':
+            import pyarrow as pa, pyarrow.parquet as pq
+            t = pa.Table.from_pandas(df, preserve_index=False)
+            writer = writer or pq.ParquetWriter(path, t.schema); writer.write_table(t)
+        elif j == 0: write_table(df, path, 'npy', cfg.dtypes())
+        else: append_table(df, path, 'npy')
+    if writer is not None: writer.close()
+    return n
+
+def _write_shard(args):
+    return write_shard(*args)
+
+def write_dataset(cfg: SyntheticConfig, out: str, n_shards: int = 8, workers: int = 1, fmt: str = 'npy') -> dict:
+    """Generate the whole log into out/part-NNNNN shards using `workers` processes; writes out/_dataset.json"""
+    if fmt == 'parquet':
+        try: import pyarrow.parquet  # noqa: F401
+        except ImportError as e: raise RuntimeError(f'Parquet shards need pyarrow ({e}); use fmt="npy"') from e
+    os.makedirs(out, exist_ok=True); shards = shard_blocks(cfg, n_shards)
+    names = [f'part-{s:05d}' + ('.parquet' if fmt == 'parquet' else '') for s in range(len(shards))]
+    jobs = [(cfg, blocks, os.path.join(out, name), fmt) for blocks, name in zip(shards, names)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as ex: rows = list(ex.map(_write_shard, jobs))
+    else: rows = [_write_shard(j) for j in jobs]
+    meta = {'config': asdict(cfg), 'block_users': BLOCK_USERS, 'format': fmt, 'n_rows': int(sum(rows)),
+            'shards': [{'path': name, 'blocks': [b.start, b.stop], 'n_rows': r} for name, b, r in zip(names, shards, rows)]}
+    with open(os.path.join(out, DATASET), 'w') as f: json.dump(meta, f, indent=1)
+    return meta
+
+def iter_shards(out: str, mmap: bool = True):
+    """Shards of a written dataset as DataFrames, in user order"""
+    meta = json.load(open(os.path.join(out, DATASET)))
+    for s in meta['shards']:
+        p = os.path.join(out, s['path'])
+        yield pd.read_parquet(p) if meta['format'] == 'parquet' else load_table(p, mmap)
+
+def read_dataset(out: str) -> pd.DataFrame:
+    return pd.concat(list(iter_shards(out, mmap=False)), ignore_index=True)
+
+def merge_dataset(out: str, path: str, chunk_rows: int = 5_000_000) -> int:
+    """Stream the shards into one binary interactions table (the layout the phase scripts read)"""
+    n = 0
+    for df in iter_shards(out):
+        for lo in range(0, len(df), chunk_rows):
+            part = pd.DataFrame({c: np.asarray(df[c][lo:lo + chunk_rows]) for c in df.columns})
+            if n == 0: write_table(part, path, 'npy', {c: part[c].dtype for c in part.columns})
+            else: append_table(part, path, 'npy')
+            n += len(part)
+    return n
@@ -0,0 +1,97 @@
+"""IVF-flat index for maximum-inner-product retrieval over item factors.
+
+Item vectors get one extra coordinate sqrt(M^2 - |v|^2) (M = largest item norm), which puts every
+item on a sphere of radius M while leaving user . item unchanged for a query padded with 0. The
+sphere is partitioned with spherical k-means; a query scores the centroids, opens the n_probe best
+lists and scores only the items stored in them. Lists are stored contiguously (vectors reordered by
+list, CSR-style offsets), so a saved index is a handful of .npy files that load memory-mapped.
+"""
+from __future__ import annotations
+import os, json
+from dataclasses import dataclass
+import numpy as np
+from src.models.topk import topk_rows
+from src.data.store import save_npy
+
+def augment(V: np.ndarray) -> np.ndarray:
+    """Append the coordinate that gives every item vector the same norm"""
+    V = np.asarray(V, dtype=np.float32); sq = np.einsum('ij,ij->i', V, V)
+    return np.hstack([V, np.sqrt(np.maximum(sq.max(initial=0.0) - sq, 0.0))[:, None]]).astype(np.float32)
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+def _assign(X: np.ndarray, C: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Best centroid (by inner product) for every row of X, in row chunks"""
+    out = np.empty(len(X), dtype=np.int64)
+    for s in range(0, len(X), chunk_size): out[s:s+chunk_size] = np.argmax(X[s:s+chunk_size] @ C.T, axis=1)
+    return out
+
+def spherical_kmeans(X: np.ndarray, n_clusters: int, n_iter: int = 10, sample: int | None = None, seed: int = 42) -> np.ndarray:
+    """Unit-norm centroids fitted on (a sample of) the unit-normalized rows of X; empty clusters are reseeded"""
+    rng = np.random.default_rng(seed); n_clusters = max(1, min(n_clusters, len(X)))
+    S = X if sample is None or sample >= len(X) else X[np.sort(rng.choice(len(X), sample, replace=False))]
+    S = _normalize(S); C = S[rng.choice(len(S), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        a = _assign(S, C); sums = np.zeros_like(C); np.add.at(sums, a, S)
+        empty = np.bincount(a, minlength=n_clusters) == 0
+        if empty.any(): sums[empty] = S[rng.choice(len(S), int(empty.sum()), replace=False)]
+        C =_normalize(sums).astype(np.float32)
+    return C
+
+@dataclass
+class IVFIndex:
+    """Inverted lists over item vectors; ids[offsets[l]:offsets[l+1]] are list l's item indices"""
+    centroids: np.ndarray   # n_lists x (d+1), unit norm, in the augmented space
+    offsets: np.ndarray     # n_lists + 1
+    ids: np.ndarray         # item index of each stored vector
+    vectors: np.ndarray     # original item vectors (d), reordered by list
+    n_probe: int = 8
+
+    @property
+    def n_lists(self) -> int: return len(self.centroids)
+
+    @classmethod
+    def build(cls, V: np.ndarray, n_lists: int | None = None, n_iter: int = 10, n_probe: int = 8,
+              sample_per_list: int = 256, seed: int = 42) -> 'IVFIndex':
+        """Index the rows of V; n_lists defaults to ~sqrt(n_items), k-means runs on a sample of n_lists*sample_per_list"""
+        V = np.asarray(V, dtype=np.float32); n_lists = n_lists or max(1, int(np.sqrt(len(V))))
+        A = augment(V); C = spherical_kmeans(A, n_lists, n_iter, n_lists * sample_per_list, seed)
+        lists = _assign(A, C); order = np.argsort(lists, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(C))))).astype(np.int64)
+        return cls(C, offsets, order.astype(np.int64), np.ascontiguousarray(V[order]), min(n_probe, len(C)))
+
+    def _probe(self, u: np.ndarray, n_probe: int) -> np.ndarray:
+        """Positions (into ids/vectors) of the items in the n_probe lists closest to u"""
+        cs = self.centroids[:, :-1] @ u; n_probe = min(n_probe, self.n_lists)
+        lists = np.argpartition(-cs, n_probe - 1)[:n_probe] if n_probe < self.n_lists else np.arange(self.n_lists)
+        lo, hi = np.asarray(self.offsets)[lists], np.asarray(self.offsets)[lists + 1]; n = hi - lo
+        return np.repeat(lo - np.concatenate(([0], np.cumsum(n)[:-1])), n) + np.arange(n.sum())
+
+    def query(self, user_vector: np.ndarray, k: int = 10, exclude=None, n_probe: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k item indices and scores for one user vector, skipping the items in exclude.
+
+        Probing widens (doubling n_probe) until k non-excluded items have been scored or every list is open.
+        """
+        u = np.asarray(user_vector, dtype=np.float32); n_probe = n_probe or self.n_probe
+        exclude = np.asarray(exclude if exclude is not None else [], dtype=np.int64)
+        while True:
+            pos = self._probe(u, n_probe); ids = np.asarray(self.ids[pos])
+            scores = np.asarray(self.vectors[pos]) @ u
+            if len(exclude): scores[np.isin(ids, exclude)] = -np.inf
+            if np.isfinite(scores).sum() >= k or n_probe >= self.n_lists: break
+            n_probe *= 2
+        top, vals = topk_rows(scores[None, :], k); keep = ~np.isneginf(vals[0])
+        return ids[top[0][keep]], vals[0][keep]
+
+    def save(self, path: str, **meta):
+        os.makedirs(path, exist_ok=True)
+        for f in ('centroids', 'offsets', 'ids', 'vectors'): save_npy(os.path.join(path, f'{f}.npy'), np.asarray(getattr(self, f)))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'kind': 'ivf_flat', 'n_lists': self.n_lists, 'n_items': len(self.ids), 'n_probe': self.n_probe, **meta}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'IVFIndex':
+        meta = json.load(open(os.path.join(path, 'meta.json')))
+        arrs = [np.load(os.path.join(path, f'{f}.npy'), mmap_mode='r' if mmap else None) for f in ('centroids', 'offsets', 'ids', 'vectors')]
+        return cls(*arrs, n_probe=meta.get('n_probe', 8))
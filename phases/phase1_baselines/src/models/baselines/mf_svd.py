@@ -0,0 +1,100 @@
+from __future__ import annotations
+import os, json
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import sparse
+from src.models.topk import topk_factor_scores
+from src.data.store import save_npy
+
+def train_svd(X: sparse.csr_matrix, factors: int = 64, n_iter: int = 7, seed: int = 42):
+    """Truncated randomized SVD of the user x item CSR; returns float32 (U, V) with X ~ U @ V.T.
+
+    The singular values are split evenly between both sides so that user and item vectors have
+    comparable norms (useful for inner-product retrieval). The heavy lifting is sparse/dense
+    products and a small dense SVD, which run on the threaded BLAS.
+    """
+    from sklearn.utils.extmath import randomized_svd
+    factors = min(factors, min(X.shape) - 1)
+    U, S, Vt = randomized_svd(X.astype(np.float32), n_components=factors, n_iter=n_iter, random_state=seed)
+    s = np.sqrt(S).astype(np.float32)
+    return (U * s).astype(np.float32), (Vt.T * s).astype(np.float32)
+
+def _row_blocks(indptr: np.ndarray, block_size: int, max_nnz: int):
+    """Row ranges of at most block_size rows and (unless a single row exceeds it) max_nnz nonzeros"""
+    n = len(indptr) - 1; s = 0; out = []
+    while s < n:
+        e = min(s + block_size, int(np.searchsorted(indptr, indptr[s] + max_nnz, side='right')) - 1)
+        e = max(e, s + 1); out.append((s, e)); s = e
+    return out
+
+def _cg_block(Cui: sparse.csr_matrix, X0: np.ndarray, Y: np.ndarray, YtY: np.ndarray, reg: float, cg_steps: int):
+    """A few conjugate-gradient steps for every row of a block at once.
+
+    Row u solves (YtY + Y^T (C_u - I) Y + reg I) x = Y^T C_u p(u), where Cui holds c_ui - 1
+    (= alpha * r_ui) on the observed entries. The per-row matrices are never formed: A @ p is
+    p @ YtY + reg p plus a sparse correction gathered over the block's nonzeros.
+    """
+    rows = np.repeat(np.arange(Cui.shape[0]), np.diff(Cui.indptr)); cols = Cui.indices; c = Cui.data
+    Yc = Y[cols]
+    def matvec(P):
+        d = np.einsum('ij,ij->i', Yc, P[rows]) * c
+        return P @ YtY + reg * P + sparse.csr_matrix((d, cols, Cui.indptr), shape=Cui.shape) @ Y
+    b = sparse.csr_matrix((c + 1.0, cols, Cui.indptr), shape=Cui.shape) @ Y
+    x = X0.copy(); r = b - matvec(x); p = r.copy(); rs = np.einsum('ij,ij->i', r, r)
+    for _ in range(cg_steps):
+        Ap = matvec(p); pAp = np.einsum('ij,ij->i', p, Ap)
+        a = np.divide(rs, pAp, out=np.zeros_like(rs), where=pAp > 1e-20)
+        x += a[:, None] * p; r -= a[:, None] * Ap
+        rs_new = np.einsum('ij,ij->i', r, r)
+        beta = np.divide(rs_new, rs, out=np.zeros_like(rs), where=rs > 1e-20)
+        p = r + beta[:, None] * p; rs = rs_new
+    return x
+
+def _als_half_step(Cui, X, Y, reg, cg_steps, block_size, max_nnz, pool):
+    YtY = Y.T @ Y
+    blocks = _row_blocks(Cui.indptr, block_size, max_nnz)
+    run = lambda b: (b, _cg_block(Cui[b[0]:b[1]], X[b[0]:b[1]], Y, YtY, reg, cg_steps))
+    for (s, e), x in (pool.map(run, blocks) if pool else map(run, blocks)): X[s:e] = x
+
+def train_als(X: sparse.csr_matrix, factors: int = 64, iterations: int = 15, reg: float = 0.01, alpha: float = 40.0,
+              cg_steps: int = 3, block_size: int = 16384, max_nnz: int = 1_000_000, n_threads: int | None = None,
+              seed: int = 42):
+    """Implicit-feedback ALS (Hu, Koren & Volinsky) with conjugate-gradient solves.
+
+    Confidence is 1 + alpha * r_ui. Each half-step solves all rows of one side in blocks; blocks run
+    on a thread pool (NumPy/BLAS release the GIL) and within a block every operation is a dense BLAS
+    product or a sparse/dense product, so no Python code runs per user. Blocks are capped at max_nnz
+    nonzeros, which bounds the gathered (nnz x factors) item vectors. Returns float32 (U, V).
+    """
+    rng = np.random.default_rng(seed)
+    Cui = X.astype(np.float32).tocsr(); Cui.data *= alpha; Ciu = Cui.T.tocsr()
+    U = (rng.standard_normal((X.shape[0], factors)) * 0.01).astype(np.float32)
+    V = (rng.standard_normal((X.shape[1], factors)) * 0.01).astype(np.float32)
+    n_threads = n_threads or os.cpu_count() or 1
+    with ThreadPoolExecutor(n_threads) if n_threads > 1 else nullcontext() as pool:
+        for _ in range(iterations):
+            _als_half_step(Cui, U, V, reg, cg_steps, block_size, max_nnz, pool)
+            _als_half_step(Ciu, V, U, reg, cg_steps, block_size, max_nnz, pool)
+    return U, V
+
+def recommend_svd(U: np.ndarray, V: np.ndarray, X: sparse.csr_matrix, k: int = 10, chunk_size: int = 4096, out=None) -> np.ndarray:
+    """Top-k unseen items per user by U @ V.T, scored in user chunks (see models.topk)"""
+    return topk_factor_scores(U, V, X, k, chunk_size, out)
+
+def save_factors(path: str, U: np.ndarray, V: np.ndarray, user_ids=None, item_ids=None, **meta):
+    """Write float32 factors (and the raw ids of their rows) as .npy files that can be memory-mapped"""
+    os.makedirs(path, exist_ok=True)
+    save_npy(os.path.join(path, 'U.npy'), np.ascontiguousarray(U, dtype=np.float32))
+    save_npy(os.path.join(path, 'V.npy'), np.ascontiguousarray(V, dtype=np.float32))
+    if user_ids is not None: save_npy(os.path.join(path, 'user_ids.npy'), np.asarray(user_ids, dtype=np.int64))
+    if item_ids is not None: save_npy(os.path.join(path, 'item_ids.npy'), np.asarray(item_ids, dtype=np.int64))
+    with open(os.path.join(path, 'meta.json'), 'w') as f: json.dump({'factors': int(U.shape[1]), **meta}, f)
+
+def load_factors(path: str, mmap: bool = True) -> dict[str, np.ndarray]:
+    """U, V and (if saved) user_ids/item_ids, memory-mapped by default"""
+    out = {}
+    for n in ('U', 'V', 'user_ids', 'item_ids'):
+        f = os.path.join(path, f'{n}.npy')
+        if os.path.isfile(f): out[n] = np.load(f, mmap_mode='r' if mmap else None)
+    return out
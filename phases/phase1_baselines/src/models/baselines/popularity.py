@@ -0,0 +1,50 @@
+from __future__ import annotations
+import numpy as np
+from scipy import sparse
+
+def item_counts(items: np.ndarray, n_items: int, timestamps: np.ndarray | None = None,
+                half_life: float | None = None, now: float | None = None) -> np.ndarray:
+    """Interaction count per item; with half_life (same unit as timestamps) each event is weighted 0.5**(age/half_life)"""
+    if half_life is None: return np.bincount(items, minlength=n_items)
+    now = timestamps.max() if now is None else now
+    w = np.exp2(-(now - timestamps.astype(np.float64)) / half_life)
+    return np.bincount(items, weights=w, minlength=n_items)
+
+def rank_items(counts: np.ndarray) -> np.ndarray:
+    """Items by descending popularity"""
+    return np.argsort(-counts)
+
+def recommend_popular(ranked: np.ndarray, seen: sparse.csr_matrix, k: int = 10, rows: np.ndarray | None = None,
+                      chunk_size: int = 65536, max_cells: int = 64_000_000) -> np.ndarray:
+    """First k items of `ranked` that each user has not seen; -1 where fewer than k remain.
+
+    For a chunk of users only the head ranked[:k + max_seen] can contain their answer, so a boolean
+    chunk x head mask of seen positions is built from the CSR and the first k unseen columns are
+    picked with one stable argsort. Chunks shrink when a heavy user makes the head long.
+    """
+    seen = seen.tocsr() if rows is None else seen.tocsr()[rows]
+    n = seen.shape[0]; k = min(k, len(ranked)); n_seen = np.diff(seen.indptr)
+    pos = np.full(seen.shape[1], len(ranked), dtype=np.int64); pos[ranked] = np.arange(len(ranked))
+    out = np.full((n, k), -1, dtype=np.int64); s = 0
+    while s < n:
+        e = min(s + chunk_size, n); L = min(k + int(n_seen[s:e].max(initial=0)), len(ranked))
+        if (e - s) * L > max_cells:
+            e = s + max(1, max_cells // L); L = min(k + int(n_seen[s:e].max(initial=0)), len(ranked))
+        lo, hi = seen.indptr[s], seen.indptr[e]
+        r = np.repeat(np.arange(e - s), n_seen[s:e]); p = pos[seen.indices[lo:hi]]; keep = p < L
+        mask = np.zeros((e - s, L), dtype=bool); mask[r[keep], p[keep]] = True
+        sel = np.argsort(mask, axis=1, kind='stable')[:, :k]
+        picks = ranked[:L][sel]; picks[np.take_along_axis(mask, sel, axis=1)] = -1
+        out[s:e, :sel.shape[1]] = picks; s = e
+    return out
+
+def recommend_by_segment(items: np.ndarray, users: np.ndarray, segments: np.ndarray, seen: sparse.csr_matrix,
+                         k: int = 10, timestamps: np.ndarray | None = None, half_life: float | None = None) -> np.ndarray:
+    """Popularity computed separately within each user segment (segments[u] is user u's segment)"""
+    out = np.full((seen.shape[0], min(k, seen.shape[1])), -1, dtype=np.int64)
+    seg_of_event = segments[users]
+    for g in np.unique(segments):
+        ev = seg_of_event == g; members = np.flatnonzero(segments == g)
+        counts = item_counts(items[ev], seen.shape[1], None if timestamps is None else timestamps[ev], half_life)
+        out[members] = recommend_popular(rank_items(counts), seen, k, rows=members)
+    return out
@@ -0,0 +1,47 @@
+from __future__ import annotations
+import numpy as np
+from scipy import sparse
+
+def topk_rows(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k best entries per row, best first (argpartition + small sort)"""
+    k = min(k, scores.shape[1])
+    if k == 0: return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=scores.dtype)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < scores.shape[1] else np.tile(np.arange(k), (scores.shape[0], 1))
+    vals = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-vals, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+def mask_seen(scores: np.ndarray, seen: sparse.csr_matrix, start: int, stop: int):
+    """Set -inf on the items of rows [start, stop) of seen, straight from its indptr/indices"""
+    lo, hi = seen.indptr[start], seen.indptr[stop]
+    rows = np.repeat(np.arange(stop - start), np.diff(seen.indptr[start:stop+1]))
+    scores[rows, seen.indices[lo:hi]] = -np.inf
+
+def topk_factor_scores(U: np.ndarray, V: np.ndarray, seen: sparse.csr_matrix | None = None, k: int = 10,
+                       chunk_size: int = 4096, out=None, scores_out=None) -> np.ndarray:
+    """Top-k items by U @ V.T for every user, excluding each user's seen items.
+
+    Users are scored chunk_size at a time, so peak memory is chunk_size x n_items regardless of
+    n_users. out/scores_out may be arrays or .npy paths; paths are created as memory-mapped
+    files and filled chunk by chunk. Slots without an unseen item left are -1.
+    """
+    n, k = U.shape[0], min(k, V.shape[0])
+    if out is None or isinstance(out, str):
+        out = np.lib.format.open_memmap(out, 'w+', np.int64, (n, k)) if isinstance(out, str) else np.empty((n, k), dtype=np.int64)
+    if isinstance(scores_out, str): scores_out = np.lib.format.open_memmap(scores_out, 'w+', np.float32, (n, k))
+    Vt = np.ascontiguousarray(V.T)
+    for s in range(0, n, chunk_size):
+        e = min(s + chunk_size, n); scores = np.asarray(U[s:e]) @ Vt
+        if seen is not None: mask_seen(scores, seen, s, e)
+        idx, vals = topk_rows(scores, k); idx[np.isneginf(vals)] = -1
+        out[s:e] = idx
+        if scores_out is not None: scores_out[s:e] = vals
+    if isinstance(out, np.memmap): out.flush()
+    return out
+
+def score_user(u: np.ndarray, V: np.ndarray, seen_items=None, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+    """Online top-k for one user vector; returns (item indices, scores)"""
+    scores = np.asarray(V) @ np.asarray(u)
+    if seen_items is not None and len(seen_items): scores[np.asarray(seen_items)] = -np.inf
+    idx, vals = topk_rows(scores[None, :], k); keep = ~np.isneginf(vals[0])
+    return idx[0][keep], vals[0][keep]
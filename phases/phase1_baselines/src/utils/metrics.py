@@ -1,25 +1,65 @@
 
 from __future__ import annotations
 import numpy as np
-def recall_at_k(recommended: np.ndarray, heldout: list[list[int]], k: int=10) -> float:
-    K = min(k, recommended.shape[1]); hits=0; total=0
-    for recs, gt in zip(recommended[:, :K], heldout):
-        if not gt: continue
-        total += 1; hits += len(set(recs.tolist()) & set(gt))
-    return hits/total if total else 0.0
-def ndcg_at_k(recommended: np.ndarray, heldout: list[list[int]], k: int=10) -> float:
-    K=min(k,recommended.shape[1])
-    def dcg(recs, gtset):
-        s=0.0
-        for i,item in enumerate(recs[:K], start=1):
-            if item in gtset: s += 1.0/np.log2(i+1)
-        return s
-    vals=[]
-    for recs, gt in zip(recommended, heldout):
-        if not gt: continue
-        gtset=set(gt)
-        ideal=sum(1.0/np.log2(i+1) for i in range(1, min(len(gtset), K)+1))
-        vals.append(dcg(recs, gtset)/(ideal if ideal>0 else 1.0))
-    return float(np.mean(vals)) if vals else 0.0
+from scipy import sparse
+METRICS = ('recall', 'precision', 'ndcg', 'map', 'mrr', 'hit_rate')
+def heldout_to_csr(heldout: list[list[int]], n_items: int | None = None) -> sparse.csr_matrix:
+    lens = np.fromiter((len(g) for g in heldout), dtype=np.int64, count=len(heldout))
+    cols = np.fromiter((x for g in heldout for x in g), dtype=np.int64, count=int(lens.sum()))
+    n_items = n_items if n_items is not None else (int(cols.max()) + 1 if len(cols) else 0)
+    indptr = np.concatenate(([0], np.cumsum(lens)))
+    return sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), cols, indptr), shape=(len(heldout), n_items))
+def _hits(recs: np.ndarray, held: sparse.csr_matrix) -> np.ndarray:
+    """Boolean users x K matrix: recs[u, j] is a held-out item of u (out-of-range ids never hit)"""
+    valid = (recs >= 0) & (recs < held.shape[1]); r = np.where(valid, recs, 0)
+    h = held[np.arange(recs.shape[0])[:, None], r]
+    return (np.asarray(h.todense() if sparse.issparse(h) else h) > 0) & valid
+def _first_occurrence(recs: np.ndarray) -> np.ndarray:
+    """Mask of positions that are the first occurrence of their item within the row"""
+    order = np.argsort(recs, axis=1, kind='stable'); s = np.take_along_axis(recs, order, axis=1)
+    dup = np.zeros_like(recs, dtype=bool); dup[:, 1:] = s[:, 1:] == s[:, :-1]
+    first = np.ones_like(dup); np.put_along_axis(first, order, ~dup, axis=1); return first
+def evaluate(recommended: np.ndarray, heldout: sparse.csr_matrix | list, ks=(10,), chunk_size: int = 65536) -> dict:
+    """Recall/Precision/NDCG/MAP/MRR/HitRate@K for several K in one pass over user chunks.
+
+    Users without held-out items are excluded from the means. Returns {'metrics': {f'{name}@{k}': mean},
+    'per_user': {f'{name}@{k}': array over all users (nan where no held-out items)}, 'n_users': evaluated}.
+    Repeated items in a row count once for recall/precision/hit rate/MAP/MRR; NDCG credits every position.
+    Raises ValueError for a K larger than the number of recommendation columns.
+    """
+    held = heldout if sparse.issparse(heldout) else heldout_to_csr(heldout)
+    held = held.tocsr(); n = min(recommended.shape[0], held.shape[0])
+    ks = sorted(set(ks)); kmax = ks[-1]
+    if ks[0] < 1 or kmax > recommended.shape[1]:
+        raise ValueError(f'K must be in [1, {recommended.shape[1]}] (recommendation columns), got {ks}')
+    n_rel = np.diff(held.indptr)[:n].astype(np.float64); has = n_rel > 0
+    disc = 1.0 / np.log2(np.arange(2, kmax + 2)); ideal_cum = np.concatenate(([0.0], np.cumsum(disc)))
+    per = {f'{m}@{k}': np.full(n, np.nan) for m in METRICS for k in ks}
+    for s in range(0, n, chunk_size):
+        e = min(s + chunk_size, n); recs = np.asarray(recommended[s:e, :kmax])
+        hit = _hits(recs, held[s:e]); uhit = hit & _first_occurrence(recs)
+        cum = np.cumsum(uhit, axis=1); rel = n_rel[s:e]; ok = has[s:e]
+        dcg = np.cumsum(hit * disc, axis=1)
+        prec_at = cum / np.arange(1, kmax + 1); ap = np.cumsum(prec_at * uhit, axis=1)
+        first = np.where(uhit.any(axis=1), uhit.argmax(axis=1), kmax)
+        for k in ks:
+            c = cum[:, k-1]; denom = np.maximum(rel, 1)
+            vals = {'recall': c / denom, 'precision': c / k,
+                    'ndcg': dcg[:, k-1] / ideal_cum[np.minimum(rel, k).astype(int)].clip(min=1e-12) * (rel > 0),
+                    'map': ap[:, k-1] / np.minimum(denom, k), 'mrr': np.where(first < k, 1.0 / (first + 1), 0.0),
+                    'hit_rate': (c > 0).astype(np.float64)}
+            for m, v in vals.items(): per[f'{m}@{k}'][s:e] = np.where(ok, v, np.nan)
+    means = {name: float(np.nanmean(v)) if has.any() else 0.0 for name, v in per.items()}
+    return {'metrics': means, 'per_user': per, 'n_users': int(has.sum())}
+def recall_at_k(recommended: np.ndarray, heldout, k: int=10) -> float:
+    """Micro-averaged: total hits over the number of users with held-out items"""
+    r = evaluate(recommended, heldout, ks=(k,))
+    held = heldout if sparse.issparse(heldout) else heldout_to_csr(heldout)
+    rel = np.diff(held.tocsr().indptr)[:recommended.shape[0]]
+    hits = np.nansum(r['per_user'][f'recall@{k}'] * np.maximum(rel, 1))
+    return float(hits / r['n_users']) if r['n_users'] else 0.0
+def ndcg_at_k(recommended: np.ndarray, heldout, k: int=10) -> float:
+    return evaluate(recommended, heldout, ks=(k,))['metrics'][f'ndcg@{k}']
 def coverage(recommended: np.ndarray, n_items: int) -> float:
-    return np.unique(recommended).size / float(n_items)
+    """Share of the catalogue recommended at least once; negative ids mark empty slots"""
+    u = np.unique(recommended); return u[u >= 0].size / float(n_items)
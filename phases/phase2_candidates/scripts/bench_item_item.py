@@ -0,0 +1,23 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines', 'scripts')))
+import argparse, json, time, numpy as np
+from make_synthetic import generate
+from build_item_item import item_user_matrix, item_item_topk
+if __name__=='__main__':
+    ap=argparse.ArgumentParser(description='Wall time of item-item top-k vs number of worker processes')
+    ap.add_argument('--n_users', type=int, default=50000); ap.add_argument('--n_items', type=int, default=20000)
+    ap.add_argument('--density', type=float, default=0.001); ap.add_argument('--topk', type=int, default=100)
+    ap.add_argument('--block-size', type=int, default=1024); ap.add_argument('--workers', type=int, nargs='+', default=[1,2,4,8,16,32])
+    ap.add_argument('--out', default=None, help='optional JSON file for the results'); a=ap.parse_args()
+    df=generate(a.n_users, a.n_items, a.density); X,_=item_user_matrix(df)
+    print(f'{len(df)} interactions, {X.shape[0]} items, {os.cpu_count()} cpus')
+    results=[]; ref=None
+    for w in a.workers:
+        t=time.perf_counter(); out=item_item_topk(X, a.topk, a.block_size, workers=w); dt=time.perf_counter()-t
+        if ref is None: ref=(out, dt)
+        same=all(np.array_equal(x, y) for x,y in zip(out, ref[0]))
+        results.append({'workers': w, 'seconds': round(dt,3), 'speedup': round(ref[1]/dt,2), 'identical': same})
+        print(f"workers={w:<3d} {dt:8.2f}s  speedup={ref[1]/dt:5.2f}x  identical={same}")
+    if a.out: json.dump(results, open(a.out,'w'), indent=2); print('Wrote', a.out)
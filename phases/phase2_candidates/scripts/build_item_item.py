@@ -1,26 +1,97 @@
 from __future__ import annotations
-import argparse, os, json, numpy as np, pandas as pd
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+import argparse, tempfile, numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from scipy.sparse import csr_matrix
-from sklearn.metrics.pairwise import cosine_similarity
+from src.utils.topk import csr_row_topk
+from src.data.store import CandidateIndex, read_interactions, write_candidates
 OUTDIR='outputs'
-def build_item_item(df: pd.DataFrame, topk: int=100):
+def item_user_matrix(df: pd.DataFrame):
     users=sorted(df['user_id'].unique()); items=sorted(df['item_id'].unique())
     u2i={u:i for i,u in enumerate(users)}; it2i={m:i for i,m in enumerate(items)}
     rows=df['user_id'].map(u2i).to_numpy(); cols=df['item_id'].map(it2i).to_numpy(); data=np.ones(len(df), dtype=np.float32)
     mat=csr_matrix((data, (rows, cols)), shape=(len(users), len(items)))
-    sims=cosine_similarity(mat.T, dense_output=False)
-    cands={}
-    for i in range(sims.shape[0]):
-        row=sims[i].toarray().ravel(); row[i]=-1
-        top_idx=np.argpartition(-row, range(min(topk, len(row)-1)))[:topk]
-        top_sorted=top_idx[np.argsort(-row[top_idx])]
-        cands[items[i]]=[items[j] for j in top_sorted if row[j]>0][:topk]
-    return cands
+    return mat.T.tocsr(), items
+def item_item_sims(X, XT, Xb, XbT, norms, rows, min_cooc: int=1):
+    """Cosine similarities of the given item rows to every item (len(rows) x n_items CSR, zeros below min_cooc).
+
+    Similarities are integer co-occurrence counts divided by the product of the item norms, so every
+    value is computed the same way whatever block (or incremental update) the row is part of, and
+    sim(a, b) == sim(b, a) bit for bit.
+    """
+    rows=np.asarray(rows); sims=(X[rows] @ XT).tocsr(); sims.sort_indices()
+    if min_cooc>1:
+        cooc=(Xb[rows] @ XbT).tocsr(); cooc.sort_indices()
+        sims.data[cooc.data<min_cooc]=0
+    r=np.repeat(rows, np.diff(sims.indptr))
+    sims.data=(sims.data/(norms[r]*norms[sims.indices])).astype(np.float32)
+    return sims
+def sims_topk(sims, rows, topk: int, col_rank=None):
+    """Top-k columns per row without the row's own item; ties go to the lower column index, or to the lower
+    col_rank[column] when col_rank is given (item codes not in id order). Returned columns are item codes."""
+    if col_rank is None: return csr_row_topk(sims, topk, drop_cols=rows)
+    sims.indices=col_rank[sims.indices].astype(sims.indices.dtype); sims.has_sorted_indices=False
+    indptr, cols, vals=csr_row_topk(sims, topk, drop_cols=col_rank[rows])
+    return indptr, np.argsort(col_rank)[cols], vals
+def item_item_rows(X, XT, Xb, XbT, norms, rows, topk: int, min_cooc: int=1, col_rank=None):
+    """Top-k cosine neighbours for the given item rows; only a len(rows) x n_items sparse block is live"""
+    rows=np.asarray(rows); return sims_topk(item_item_sims(X, XT, Xb, XbT, norms, rows, min_cooc), rows, topk, col_rank)
+def item_item_block(X, XT, Xb, XbT, norms, start: int, stop: int, topk: int, min_cooc: int=1):
+    """Top-k cosine neighbours for items [start, stop)"""
+    return item_item_rows(X, XT, Xb, XbT, norms, np.arange(start, stop), topk, min_cooc)
+def prepare(X):
+    """Count matrix and binarised copy (item x user) with their transposes, plus the item norms"""
+    X=X.astype(np.float32); Xb=X.copy(); Xb.data[:]=1
+    norms=np.sqrt(np.asarray(X.multiply(X).sum(axis=1), dtype=np.float64).ravel())
+    return X, X.T.tocsr(), Xb, Xb.T.tocsr(), norms
+def save_shared(mats, d: str):
+    """Dump CSR arrays as .npy so worker processes can memory-map them instead of receiving pickles"""
+    for n,m in zip(('X','XT','Xb','XbT'), mats[:4]):
+        for f in ('data','indices','indptr'): np.save(os.path.join(d, f'{n}.{f}.npy'), getattr(m, f))
+        np.save(os.path.join(d, f'{n}.shape.npy'), np.array(m.shape))
+    np.save(os.path.join(d, 'norms.npy'), mats[4])
+def load_shared(d: str):
+    mats=[]
+    for n in ('X','XT','Xb','XbT'):
+        arrs=[np.load(os.path.join(d, f'{n}.{f}.npy'), mmap_mode='r') for f in ('data','indices','indptr')]
+        mats.append(csr_matrix(tuple(arrs), shape=tuple(np.load(os.path.join(d, f'{n}.shape.npy'))), copy=False))
+    return mats+[np.load(os.path.join(d, 'norms.npy'), mmap_mode='r')]
+_SHARED=None
+def _init_worker(d: str):
+    global _SHARED; _SHARED=load_shared(d)
+def _run_block(args):
+    return item_item_block(*_SHARED, *args)
+def item_item_topk(X, topk: int=100, block_size: int=2048, min_cooc: int=1, workers: int=1):
+    """Blocked item-item cosine top-k over an item x user CSR; returns CSR-style (indptr, indices, values).
+
+    With workers>1 the item range is sharded by block over a process pool; the matrices are shared
+    through memory-mapped .npy files and blocks are merged in item order, so output is identical.
+    """
+    mats=prepare(X); n=X.shape[0]
+    tasks=[(s, min(s+block_size, n), topk, min_cooc) for s in range(0, n, block_size)]
+    if workers<=1: return merge_blocks([item_item_block(*mats, *t) for t in tasks])
+    with tempfile.TemporaryDirectory(prefix='item_item_') as d:
+        save_shared(mats, d); del mats
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(d,)) as ex:
+            return merge_blocks(list(ex.map(_run_block, tasks)))
+def merge_blocks(parts):
+    indptr=[np.zeros(1, dtype=np.int64)]; base=0
+    for p,_,_ in parts: indptr.append(p[1:]+base); base+=p[-1]
+    return np.concatenate(indptr), np.concatenate([p[1] for p in parts]), np.concatenate([p[2] for p in parts])
+def item_item_index(df: pd.DataFrame, topk: int=100, block_size: int=2048, min_cooc: int=1, workers: int=1) -> CandidateIndex:
+    X, items=item_user_matrix(df); indptr, nbrs, _=item_item_topk(X, topk, block_size, min_cooc, workers)
+    items=np.asarray(items, dtype=np.int64); return CandidateIndex(items, indptr, items[nbrs])
+def build_item_item(df: pd.DataFrame, topk: int=100, block_size: int=2048, min_cooc: int=1, workers: int=1):
+    return item_item_index(df, topk, block_size, min_cooc, workers).to_dict()
 if __name__=='__main__':
     ap=argparse.ArgumentParser(); ap.add_argument('--interactions', default='../phase1_baselines/data/raw/interactions.csv')
-    ap.add_argument('--topk', type=int, default=100); a=ap.parse_args()
-    os.makedirs(OUTDIR, exist_ok=True); df=pd.read_csv(a.interactions); c=build_item_item(df, topk=a.topk)
-    # Convert numpy types to Python types for JSON serialization
-    c_serializable = {int(k): [int(item) for item in v] if isinstance(v, list) else int(v) for k, v in c.items()}
-    json.dump(c_serializable, open(os.path.join(OUTDIR,'item_item_candidates.json'),'w'))
-    print('Wrote outputs/item_item_candidates.json')
+    ap.add_argument('--topk', type=int, default=100); ap.add_argument('--block-size', type=int, default=2048)
+    ap.add_argument('--min-cooc', type=int, default=1, help='minimum number of shared users for a neighbour')
+    ap.add_argument('--workers', type=int, default=1, help='processes to shard item blocks across')
+    ap.add_argument('--format', choices=['json','npy','both'], default='both'); a=ap.parse_args()
+    os.makedirs(OUTDIR, exist_ok=True); df=read_interactions(a.interactions)
+    c=item_item_index(df, topk=a.topk, block_size=a.block_size, min_cooc=a.min_cooc, workers=a.workers)
+    write_candidates(c, os.path.join(OUTDIR,'item_item_candidates.json'), a.format)
+    print(f'Wrote outputs/item_item_candidates ({a.format})')
@@ -1,29 +1,117 @@
 from __future__ import annotations
-import argparse, os, json, numpy as np, pandas as pd
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+import argparse, numpy as np, pandas as pd
+from scipy.sparse import csr_matrix
+from src.utils.topk import csr_row_topk
+from src.data.store import CandidateIndex, read_interactions, write_candidates
 OUTDIR='outputs'
-if __name__=='__main__':
-    ap=argparse.ArgumentParser(); ap.add_argument('--interactions', default='../phase1_baselines/data/raw/interactions.csv')
-    ap.add_argument('--topk', type=int, default=100); a=ap.parse_args()
-    os.makedirs(OUTDIR, exist_ok=True); df=pd.read_csv(a.interactions)
+N_NEIGHBORS=20
+def user_item_matrix(df: pd.DataFrame):
     users=sorted(df['user_id'].unique()); items=sorted(df['item_id'].unique())
     u2i={u:i for i,u in enumerate(users)}; it2i={m:i for i,m in enumerate(items)}
-    user_items=[set() for _ in users]
-    for _,r in df.iterrows(): user_items[u2i[r['user_id']]].add(it2i[r['item_id']])
-    def jaccard(a,b): inter=len(a & b); union=len(a | b); return inter/union if union else 0.0
-    user_recs={}
-    for u_idx,a_set in enumerate(user_items):
-        sims=[(v_idx, jaccard(a_set, b)) for v_idx,b in enumerate(user_items) if v_idx!=u_idx]
-        sims.sort(key=lambda x: x[1], reverse=True); neighbors=[idx for idx,s in sims[:20] if s>0]
-        bag={}
-        for n in neighbors:
-            for it in user_items[n]:
-                if it not in a_set: bag[it]=bag.get(it,0)+1
-        top=sorted(bag.items(), key=lambda x:x[1], reverse=True)[:a.topk]
-        user_recs[users[u_idx]]=[items[it] for it,_ in top]
-    # Convert numpy types to Python types for JSON serialization
-    user_recs_serializable = {
-        int(k): [int(item) for item in v] if isinstance(v, list) else int(v) 
-        for k, v in user_recs.items()
-    }
-    json.dump(user_recs_serializable, open(os.path.join(OUTDIR,'user_to_item_candidates.json'),'w'))
-    print('Wrote outputs/user_to_item_candidates.json')
+    rows=df['user_id'].map(u2i).to_numpy(); cols=df['item_id'].map(it2i).to_numpy()
+    B=csr_matrix((np.ones(len(df), dtype=np.float32), (rows, cols)), shape=(len(users), len(items))); B.sum_duplicates(); B.data[:]=1
+    return B, users, items
+def rank_topk(m, k: int, rows, col_rank=None, drop_self: bool=False):
+    """csr_row_topk with ties broken by col_rank[column] instead of the column code when given"""
+    if col_rank is None: return csr_row_topk(m, k, drop_cols=rows if drop_self else None)
+    m.indices=col_rank[m.indices].astype(m.indices.dtype); m.has_sorted_indices=False
+    indptr, cols, vals=csr_row_topk(m, k, drop_cols=col_rank[rows] if drop_self else None)
+    return indptr, np.argsort(col_rank)[cols], vals
+def jaccard_rows(B, BT, size, rows):
+    """Jaccard similarity of the given users to every user they share an item with (intersections from one sparse product)"""
+    rows=np.asarray(rows); inter=(B[rows] @ BT).tocsr()
+    r=np.repeat(rows, np.diff(inter.indptr))
+    inter.data=inter.data/(size[r]+size[inter.indices]-inter.data)
+    return inter
+def neighbor_rows(B, BT, size, rows, n_neighbors: int=N_NEIGHBORS, col_rank=None):
+    """Top Jaccard neighbours of the given users"""
+    rows=np.asarray(rows); return rank_topk(jaccard_rows(B, BT, size, rows), n_neighbors, rows, col_rank, drop_self=True)
+def exact_neighbors(B, n_neighbors: int=N_NEIGHBORS, block_size: int=2048):
+    """Top Jaccard neighbours per user; intersections come from sparse products of row blocks"""
+    BT=B.T.tocsr(); size=np.diff(B.indptr).astype(np.float32)
+    parts=[neighbor_rows(B, BT, size, np.arange(s, min(s+block_size, B.shape[0])), n_neighbors) for s in range(0, B.shape[0], block_size)]
+    return stack_topk(parts, B.shape[0])
+def minhash_signatures(B, n_perm: int, seed: int=0, chunk_nnz: int=1_000_000):
+    """MinHash signature per user (n_users x n_perm) from universal hashes of item indices"""
+    P=np.int64(2_147_483_647); rng=np.random.default_rng(seed)
+    a=rng.integers(1, P, n_perm, dtype=np.int64); b=rng.integers(0, P, n_perm, dtype=np.int64)
+    sig=np.full((B.shape[0], n_perm), P, dtype=np.int64); nnz=np.diff(B.indptr)
+    bounds=np.unique(np.append(np.searchsorted(B.indptr, np.arange(0, B.nnz, chunk_nnz)).clip(0, B.shape[0]), B.shape[0]))
+    for s,e in zip(bounds[:-1], bounds[1:]):
+        lo,hi=B.indptr[s],B.indptr[e]; nz=np.flatnonzero(nnz[s:e])
+        if not len(nz): continue
+        h=(B.indices[lo:hi,None].astype(np.int64)*a+b)%P
+        sig[s+nz]=np.minimum.reduceat(h, B.indptr[s+nz]-lo, axis=0)
+    return sig
+def lsh_neighbors(B, n_neighbors: int=N_NEIGHBORS, bands: int=32, rows: int=1, window: int=30, seed: int=0, chunk: int=1_000_000):
+    """Approximate Jaccard neighbours: only users that share a MinHash band bucket are compared.
+
+    Within each band users are sorted by bucket key and compared with the next `window` users
+    of the same bucket, which caps the work done for very large buckets.
+    """
+    n=B.shape[0]; sig=minhash_signatures(B, bands*rows, seed); rng=np.random.default_rng(seed+1)
+    coef=rng.integers(1, 2**63-1, rows, dtype=np.int64).astype(np.uint64); active=np.diff(B.indptr)>0
+    codes=[]
+    for band in range(bands):
+        key=(sig[:, band*rows:(band+1)*rows].astype(np.uint64)*coef).sum(axis=1)
+        order=np.lexsort((rng.random(n), key)); order=order[active[order]]; k=key[order]
+        for d in range(1, min(window+1, len(order))):
+            same=k[d:]==k[:-d]
+            if not same.any(): break
+            u,v=order[:-d][same], order[d:][same]; codes.append(np.minimum(u,v).astype(np.int64)*n+np.maximum(u,v))
+    codes=np.unique(np.concatenate(codes)) if codes else np.zeros(0, dtype=np.int64); u,v=codes//n, codes%n; inter=np.empty(len(codes), dtype=np.float32); size=np.diff(B.indptr)
+    for s in range(0, len(codes), chunk):
+        inter[s:s+chunk]=np.asarray(B[u[s:s+chunk]].multiply(B[v[s:s+chunk]]).sum(axis=1)).ravel()
+    jac=inter/(size[u]+size[v]-inter)
+    J=csr_matrix((np.concatenate([jac, jac]), (np.concatenate([u, v]), np.concatenate([v, u]))), shape=(n, n))
+    return csr_row_topk(J, n_neighbors)
+def stack_topk(parts, n_rows: int):
+    indptr=[np.zeros(1, dtype=np.int64)]; base=0
+    for p,_,_ in parts: indptr.append(p[1:]+base); base+=p[-1]
+    if not parts: return np.zeros(n_rows+1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(indptr), np.concatenate([p[1] for p in parts]), np.concatenate([p[2] for p in parts])
+def candidate_rows(B, N, rows, topk: int=100, col_rank=None):
+    """Unseen items of the given users ranked by how many of their neighbours (rows of N) interacted with them"""
+    rows=np.asarray(rows); bag=(N[rows] @ B).tocsr(); bag=(bag-bag.multiply(B[rows])).tocsr()
+    return rank_topk(bag, topk, rows, col_rank)
+def neighbor_candidates(B, nbrs, topk: int=100, block_size: int=4096):
+    """Unseen items ranked by how many of the user's neighbours interacted with them"""
+    indptr,indices,_=nbrs; n=B.shape[0]
+    N=csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(n, n))
+    return stack_topk([candidate_rows(B, N, np.arange(s, min(s+block_size, n)), topk) for s in range(0, n, block_size)], n)
+def neighbor_recall(exact, approx) -> float:
+    """Share of exact neighbour (or candidate) entries that the approximate run also found"""
+    n=len(exact[0])-1; er=np.repeat(np.arange(n), np.diff(exact[0])); ar=np.repeat(np.arange(n), np.diff(approx[0]))
+    e=er.astype(np.int64)*(2**31)+exact[1]; a=ar.astype(np.int64)*(2**31)+approx[1]
+    return float(np.isin(e, a).mean()) if len(e) else 1.0
+def candidate_index(users, items, cands) -> CandidateIndex:
+    """CandidateIndex of neighbor_candidates() output, in raw user/item ids"""
+    indptr, cand, _=cands
+    return CandidateIndex(np.asarray(users, dtype=np.int64), indptr, np.asarray(items, dtype=np.int64)[cand])
+def user_to_item_index(df: pd.DataFrame, topk: int=100, mode: str='exact', **lsh) -> CandidateIndex:
+    B, users, items=user_item_matrix(df)
+    nbrs=exact_neighbors(B) if mode=='exact' else lsh_neighbors(B, **lsh)
+    return candidate_index(users, items, neighbor_candidates(B, nbrs, topk))
+def build_user_to_item(df: pd.DataFrame, topk: int=100, mode: str='exact', **lsh):
+    return user_to_item_index(df, topk, mode, **lsh).to_dict()
+if __name__=='__main__':
+    ap=argparse.ArgumentParser(); ap.add_argument('--interactions', default='../phase1_baselines/data/raw/interactions.csv')
+    ap.add_argument('--topk', type=int, default=100); ap.add_argument('--mode', choices=['exact','lsh'], default='exact')
+    ap.add_argument('--bands', type=int, default=32); ap.add_argument('--rows', type=int, default=1)
+    ap.add_argument('--window', type=int, default=30, help='LSH: users compared per bucket neighbour window')
+    ap.add_argument('--eval-recall', action='store_true', help='LSH: also run exact mode and report neighbour/candidate recall')
+    ap.add_argument('--format', choices=['json','npy','both'], default='both'); a=ap.parse_args()
+    os.makedirs(OUTDIR, exist_ok=True); df=read_interactions(a.interactions)
+    lsh=dict(bands=a.bands, rows=a.rows, window=a.window) if a.mode=='lsh' else {}
+    B, users, items=user_item_matrix(df)
+    nbrs=exact_neighbors(B) if a.mode=='exact' else lsh_neighbors(B, **lsh)
+    cands=neighbor_candidates(B, nbrs, a.topk); user_recs=candidate_index(users, items, cands)
+    if a.mode=='lsh' and a.eval_recall:   # reuses the LSH neighbours and candidates built above
+        ex=exact_neighbors(B)
+        print('Neighbour recall vs exact:', round(neighbor_recall(ex, nbrs),4))
+        print('Candidate recall vs exact:', round(neighbor_recall(neighbor_candidates(B, ex, a.topk), cands),4))
+    write_candidates(user_recs, os.path.join(OUTDIR,'user_to_item_candidates.json'), a.format)
+    print(f'Wrote outputs/user_to_item_candidates ({a.format})')
@@ -0,0 +1,22 @@
+from __future__ import annotations
+import numpy as np
+from scipy import sparse
+
+def csr_row_topk(m: sparse.csr_matrix, k: int, drop_cols=None, min_value: float = 0.0):
+    """Top-k entries of every row of a CSR block, best first, ties broken by column index.
+
+    drop_cols: optional per-row column to exclude (e.g. the diagonal of a similarity block).
+    Only entries strictly greater than min_value are kept. Returns (indptr, indices, values).
+    """
+    m.sum_duplicates(); m.sort_indices(); n = m.shape[0]
+    rows = np.repeat(np.arange(n), np.diff(m.indptr)); cols = m.indices; vals = m.data
+    keep = vals > min_value
+    if drop_cols is not None: keep &= cols != np.asarray(drop_cols)[rows]
+    rows, cols, vals = rows[keep], cols[keep], vals[keep]
+    # entries are already in (row, col) order, so two stable passes give (row, -value, col)
+    order = np.argsort(-vals, kind='stable'); order = order[np.argsort(rows[order], kind='stable')]
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    counts = np.bincount(rows, minlength=n); first = np.cumsum(counts) - counts
+    sel = (np.arange(len(rows)) - first[rows]) < k
+    indptr = np.concatenate(([0], np.cumsum(np.minimum(counts, k))))
+    return indptr, cols[sel], vals[sel]
@@ -1,16 +1,119 @@
+"""Train the candidate ranker on outputs/features.csv.
 
+    python scripts/train_ranker.py                                     # logistic regression, all rows
+    python scripts/train_ranker.py --model hgb --neg-per-pos 20        # histogram GBDT on sampled negatives
+    python scripts/train_ranker.py --model sgd --neg-rate 0.05 --epochs 3   # partial_fit, one chunk at a time
+
+Features are read in chunks of --chunk-rows (slices of the memory-mapped binary columns, or a
+chunked CSV read), so only the sampled rows are ever held in memory (sgd holds one training
+chunk). Users are split into train/held-out by a hash of their id. Negatives of every user are
+kept with probability min(1, neg_per_pos * positives / negatives), or --neg-rate, decided by a
+hash of the (user, item) pair so the sample does not depend on the chunking. Kept negatives
+carry the inverse of that probability as their sample weight. AUC is measured on the sampled
+rows of the held-out users with those weights (an estimate of the AUC over all their rows), and
+fit time and peak memory are reported.
+"""
 from __future__ import annotations
-import argparse, os, joblib, pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import GradientBoostingClassifier
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, json, time, joblib, numpy as np, pandas as pd
+try: import resource
+except ImportError: resource = None  # not on Windows
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
 from sklearn.metrics import roc_auc_score
+from src.data.store import iter_table
+from src.features.registry import DEFAULT_FEATURES
 OUTDIR='outputs'
+FEATURES=list(DEFAULT_FEATURES)   # the columns Phase 4 scores with (registry.FEATURE_COLS)
+
+def mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: well-spread uint64 hashes of integer keys"""
+    with np.errstate(over='ignore'):
+        x=np.asarray(x).astype(np.uint64)+np.uint64(0x9E3779B97F4A7C15)
+        x=(x^(x>>np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9); x=(x^(x>>np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+        return x^(x>>np.uint64(31))
+
+def uniform(*keys) -> np.ndarray:
+    """Deterministic U[0, 1) per row from integer key columns"""
+    h=np.uint64(0)
+    for k in keys: h=mix(h^mix(k))
+    return (h>>np.uint64(11)).astype(np.float64)*2.0**-53
+
+def is_heldout(users, test_frac: float, seed: int) -> np.ndarray:
+    return uniform(users, np.full(len(users), seed+1))<test_frac
+
+def user_counts(path: str, chunk_rows: int) -> pd.DataFrame:
+    """Positives and rows per user, from the user_id/label columns only"""
+    parts=[c.groupby('user_id')['label'].agg(['sum','count']) for c in iter_table(path, ['user_id','label'], chunk_rows)]
+    return pd.concat(parts).groupby(level=0).sum() if parts else pd.DataFrame(columns=['sum','count'])
+
+def keep_rates(counts: pd.DataFrame, neg_per_pos: float | None, neg_rate: float) -> pd.Series:
+    """Probability of keeping each user's negatives (users without a positive count as one)"""
+    if neg_per_pos is None: return pd.Series(neg_rate, index=counts.index)
+    neg=(counts['count']-counts['sum']).clip(lower=1)
+    return (neg_per_pos*counts['sum'].clip(lower=1)/neg).clip(upper=1.0)
+
+def sample(c: pd.DataFrame, rates: pd.Series | None, seed: int) -> pd.DataFrame:
+    """Positives and the kept negatives of c, with their sample weight in a 'w' column"""
+    if rates is None: return c.assign(w=1.0)
+    r=rates.reindex(c['user_id']).fillna(1.0).to_numpy(); neg=c['label'].to_numpy()==0
+    keep=~neg|(uniform(c['user_id'].to_numpy(), c['item_id'].to_numpy(), np.full(len(c), seed))<r)
+    return c[keep].assign(w=np.where(neg, 1.0/np.maximum(r, 1e-12), 1.0)[keep])
+
+def sampled_chunks(path: str, rates: pd.Series | None, a):
+    """(sampled train chunk, sampled held-out chunk) per feature chunk, both with a 'w' column"""
+    for c in iter_table(path, ['user_id','item_id',*FEATURES,'label'], a.chunk_rows):
+        held=is_heldout(c['user_id'].to_numpy(), a.test_frac, a.seed)
+        yield sample(c[~held], rates, a.seed), sample(c[held], rates, a.seed)
+
+def peak_rss_mb() -> float:
+    if resource is None: return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/(2**20 if sys.platform=='darwin' else 2**10)
+
 if __name__=='__main__':
-    ap=argparse.ArgumentParser(); ap.add_argument('--model', choices=['logreg','gbdt'], default='logreg'); a=ap.parse_args()
-    os.makedirs(OUTDIR, exist_ok=True); df=pd.read_csv(os.path.join(OUTDIR,'features.csv'))
-    X=df[['item_pop','is_recent']]; y=df['label']
-    Xtr,Xte,ytr,yte=train_test_split(X,y,test_size=0.2,random_state=42,stratify=y)
-    mdl=LogisticRegression(max_iter=1000) if a.model=='logreg' else GradientBoostingClassifier()
-    mdl.fit(Xtr,ytr); prob=mdl.predict_proba(Xte)[:,1]; print('AUC:', round(roc_auc_score(yte, prob),4))
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--model', choices=['logreg','gbdt','hgb','sgd'], default='logreg', help='gbdt: exact-split GradientBoosting (slow); hgb: histogram GBDT')
+    ap.add_argument('--neg-per-pos', type=float, default=None, help='per-user negatives kept per positive (importance-weighted)')
+    ap.add_argument('--neg-rate', type=float, default=1.0, help='fraction of negatives kept when --neg-per-pos is not set')
+    ap.add_argument('--test-frac', type=float, default=0.2, help='share of users held out for AUC')
+    ap.add_argument('--chunk-rows', type=int, default=1_000_000); ap.add_argument('--epochs', type=int, default=2, help='sgd passes over the data')
+    ap.add_argument('--max-iter', type=int, default=200, help='hgb boosting rounds'); ap.add_argument('--learning-rate', type=float, default=0.02, help='hgb shrinkage')
+    ap.add_argument('--seed', type=int, default=42); a=ap.parse_args()
+    os.makedirs(OUTDIR, exist_ok=True); path=os.path.join(OUTDIR,'features.csv'); t0=time.perf_counter()
+    sampling=a.neg_per_pos is not None or a.neg_rate<1.0
+    rates=keep_rates(user_counts(path, a.chunk_rows), a.neg_per_pos, a.neg_rate) if sampling else None
+    n_kept=0; held_X=[]; held_y=[]; held_w=[]
+    if a.model=='sgd':
+        # pass 1 fits the scaler, then each epoch streams the sampled chunks through partial_fit. Weights are
+        # rescaled to mean 1 and the step size is bounded: with rare positives, the default 'optimal' schedule
+        # overshoots on the first chunks and can settle on the wrong sign
+        scaler=StandardScaler(); sgd=SGDClassifier(loss='log_loss', alpha=1e-5, learning_rate='adaptive', eta0=0.01, random_state=a.seed)
+        t=time.perf_counter(); w_sum=0.0
+        for tr, ho in sampled_chunks(path, rates, a):
+            if len(tr): scaler.partial_fit(tr[FEATURES], sample_weight=tr['w'])
+            n_kept+=len(tr); w_sum+=tr['w'].sum(); held_X.append(ho[FEATURES]); held_y.append(ho['label'].to_numpy()); held_w.append(ho['w'].to_numpy())
+        for _ in range(a.epochs):
+            for tr, _ho in sampled_chunks(path, rates, a):
+                if len(tr): sgd.partial_fit(scaler.transform(tr[FEATURES]), tr['label'], classes=[0, 1], sample_weight=tr['w']*(n_kept/w_sum))
+        mdl=make_pipeline(scaler, sgd); fit_s=time.perf_counter()-t
+    else:
+        parts=[]
+        for tr, ho in sampled_chunks(path, rates, a):
+            parts.append(tr[FEATURES+['label','w']]); held_X.append(ho[FEATURES]); held_y.append(ho['label'].to_numpy()); held_w.append(ho['w'].to_numpy())
+        train=pd.concat(parts, ignore_index=True); del parts; n_kept=len(train)
+        mdl={'logreg': lambda: LogisticRegression(max_iter=1000), 'gbdt': lambda: GradientBoostingClassifier(random_state=a.seed),
+             # with rare positives the first Newton step on a pure-ish leaf is ~1/base_rate: a large learning rate
+             # overshoots to p=1, the hessian vanishes and the leaf oscillates, so shrink hard
+             'hgb': lambda: HistGradientBoostingClassifier(max_iter=a.max_iter, learning_rate=a.learning_rate, l2_regularization=1.0,
+                                                           min_samples_leaf=100, early_stopping=False, random_state=a.seed)}[a.model]()
+        t=time.perf_counter(); mdl.fit(train[FEATURES], train['label'], sample_weight=train['w'].to_numpy()); fit_s=time.perf_counter()-t; del train
+    Xte=pd.concat(held_X, ignore_index=True); yte=np.concatenate(held_y); wte=np.concatenate(held_w)
+    auc=roc_auc_score(yte, mdl.predict_proba(Xte)[:,1], sample_weight=wte) if len(np.unique(yte))==2 else float('nan')
+    report={'model': a.model, 'neg_per_pos': a.neg_per_pos, 'neg_rate': a.neg_rate, 'train_rows_kept': int(n_kept), 'heldout_rows_kept': int(len(yte)),
+            'auc': round(float(auc),4), 'fit_seconds': round(fit_s,3), 'total_seconds': round(time.perf_counter()-t0,3), 'peak_rss_mb': round(peak_rss_mb(),1)}
+    print('AUC:', report['auc']); print(json.dumps(report))
     joblib.dump(mdl, os.path.join(OUTDIR,'ranker.joblib')); print('Saved outputs/ranker.joblib')
@@ -0,0 +1,194 @@
+"""Columnar candidate/feature pipeline for the ranker.
+
+Ids are mapped to dense codes once; a (user, item) pair is the int64 key user * n_items + item,
+so candidate unions, "is this pair in that set" lookups and label attachment are np.unique and
+searchsorted over sorted key arrays. Features are plain functions fn(ctx, users, items) -> array
+registered under a name with @feature; build_features calls them by name, and the online store in
+Phase 4 calls the same functions on its own context, so offline and online features share one
+definition.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable
+import numpy as np, pandas as pd
+from scipy import sparse
+from src.data.splits import _sorted_order
+from src.data.store import CandidateIndex
+
+N_RECENT = 5; N_NEIGHBORS = 20; N_FALLBACK = 50
+DEFAULT_FEATURES = ('item_pop', 'is_recent')
+FEATURES: dict[str, Callable] = {}
+ITEM_FEATURES: set[str] = set()   # features that depend on the item alone
+
+def feature(name: str, per_item: bool = False):
+    """Register fn(ctx, users, items) -> array (one value per pair) under name"""
+    def wrap(fn):
+        FEATURES[name] = fn
+        if per_item: ITEM_FEATURES.add(name)
+        return fn
+    return wrap
+
+def _member(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Which keys occur in sorted_keys (a sorted-key merge via searchsorted)"""
+    return _codes(sorted_keys, keys) >= 0
+
+def _gather(offsets: np.ndarray, rows: np.ndarray, limit: int | None = None):
+    """(row position, flat index) for the CSR-style lists of rows, each cut to limit entries"""
+    lo = offsets[rows]; n = offsets[rows + 1] - lo
+    if limit is not None: n = np.minimum(n, limit)
+    which = np.repeat(np.arange(len(rows)), n)
+    return which, np.repeat(lo - np.concatenate(([0], np.cumsum(n)[:-1])), n) + np.arange(int(n.sum()))
+
+@dataclass
+class FeatureContext:
+    """Everything the registered features read, indexed by user/item code"""
+    user_ids: np.ndarray         # sorted raw user ids (code = position)
+    item_ids: np.ndarray         # sorted raw item ids
+    item_pop: np.ndarray         # interactions per item
+    item_last_ts: np.ndarray     # latest timestamp per item (t_min for items without interactions)
+    t_max: int
+    user_count: np.ndarray       # interactions per user
+    recent_offsets: np.ndarray   # CSR over users: each user's last N_RECENT items, oldest first
+    recent_items: np.ndarray
+    recent_keys: np.ndarray      # sorted pair keys of (user, recent item)
+    label_keys: np.ndarray       # sorted pair keys of (user, last item)
+    nn_offsets: np.ndarray       # CSR over items: first N_NEIGHBORS item-item neighbours
+    nn_items: np.ndarray
+    nn_keys: np.ndarray          # sorted pair keys of (item, neighbour) ...
+    nn_rank: np.ndarray          # ... and the neighbour's position in the list
+    item_user: sparse.csr_matrix | None = None   # binary item x user matrix, for co-occurrence
+
+    @property
+    def n_items(self) -> int: return len(self.item_ids)
+
+    def user_codes(self, raw: np.ndarray) -> np.ndarray:
+        """Codes of raw user ids, -1 for unknown users"""
+        return _codes(self.user_ids, raw)
+
+    def item_codes(self, raw: np.ndarray) -> np.ndarray:
+        return _codes(self.item_ids, raw)
+
+    def key(self, u: np.ndarray, i: np.ndarray) -> np.ndarray:
+        return np.asarray(u, dtype=np.int64) * self.n_items + i
+
+def _codes(ids: np.ndarray, raw) -> np.ndarray:
+    raw = np.asarray(raw)
+    if not len(ids): return np.full(len(raw), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ids, raw), len(ids) - 1)
+    return np.where(ids[pos] == raw, pos, -1)
+
+def _csr_by_row(rows: np.ndarray, values: np.ndarray, n_rows: int):
+    """Offsets and values for rows that are already grouped in ascending order"""
+    return np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_rows)))).astype(np.int64), values
+
+def neighbor_arrays(item_ids: np.ndarray, item_item: CandidateIndex, n_neighbors: int = N_NEIGHBORS):
+    """Item-item lists in code space cut to n_neighbors: (offsets, items, sorted pair keys, rank of each key)"""
+    n_items = len(item_ids); src = np.searchsorted(item_ids, np.asarray(item_item.keys))
+    which, flat = _gather(np.asarray(item_item.offsets), np.arange(len(src)), n_neighbors)
+    nn_src = src[which]; nn_items = np.searchsorted(item_ids, np.asarray(item_item.items)[flat])
+    nn_offsets, nn_items = _csr_by_row(nn_src, nn_items, n_items)
+    nn_rank = np.arange(len(nn_items)) - nn_offsets[nn_src]
+    nn_keys = nn_src.astype(np.int64) * n_items + nn_items; o = np.argsort(nn_keys, kind='stable')
+    return nn_offsets, nn_items, nn_keys[o], nn_rank[o]
+
+def build_context(df: pd.DataFrame, item_item: CandidateIndex, extra_items=None, n_recent: int = N_RECENT,
+                  n_neighbors: int = N_NEIGHBORS, with_item_user: bool = False) -> FeatureContext:
+    """Encode the interaction log and the item-item lists into a FeatureContext.
+
+    The item vocabulary is every item seen in the log, the item-item lists or extra_items, so
+    candidates that never occur in the log still get codes (and item_pop 0).
+    """
+    users_raw = df['user_id'].to_numpy(); items_raw = df['item_id'].to_numpy(); ts = df['timestamp'].to_numpy()
+    user_ids = np.unique(users_raw)
+    parts = [np.unique(items_raw), np.asarray(item_item.keys), np.unique(np.asarray(item_item.items))]
+    if extra_items is not None: parts.append(np.unique(np.asarray(extra_items)))
+    item_ids = np.unique(np.concatenate(parts).astype(np.int64)); n_items = len(item_ids)
+    u = np.searchsorted(user_ids, users_raw); it = np.searchsorted(item_ids, items_raw)
+    order = _sorted_order(u, ts); us, its = u[order], it[order]
+    user_count = np.bincount(u, minlength=len(user_ids))
+    from_end = np.repeat(np.cumsum(user_count), user_count) - np.arange(len(us)) - 1 if len(us) else np.zeros(0, dtype=np.int64)
+    rec = from_end < n_recent
+    recent_offsets, recent_items = _csr_by_row(us[rec], its[rec], len(user_ids))
+    last = from_end == 0
+    t_min = int(ts.min()) if len(ts) else 0; item_last_ts = np.full(n_items, t_min, dtype=np.int64)
+    np.maximum.at(item_last_ts, it, ts.astype(np.int64))
+    nn_offsets, nn_items, nn_keys, nn_rank = neighbor_arrays(item_ids, item_item, n_neighbors)
+    ctx = FeatureContext(user_ids, item_ids, np.bincount(it, minlength=n_items), item_last_ts, int(ts.max()) if len(ts) else 0,
+                         user_count, recent_offsets, recent_items, np.sort(us[rec].astype(np.int64) * n_items + its[rec]),
+                         np.sort(us[last].astype(np.int64) * n_items + its[last]), nn_offsets, nn_items, nn_keys, nn_rank)
+    if with_item_user:
+        X = sparse.csr_matrix((np.ones(len(u), dtype=np.float32), (it, u)), shape=(n_items, len(user_ids)))
+        X.sum_duplicates(); X.data[:] = 1; ctx.item_user = X
+    return ctx
+
+def generate_candidates(ctx: FeatureContext, user2item: CandidateIndex | None = None, users: np.ndarray | None = None,
+                        n_neighbors: int = N_NEIGHBORS, n_fallback: int = N_FALLBACK, fallback: np.ndarray | None = None):
+    """Sorted unique (user code, item code) candidate pairs.
+
+    A user's candidates are their user-to-item list plus the first n_neighbors item-item
+    neighbours of each recent item; users left with none get the n_fallback most popular items
+    (or the item codes in fallback, when the caller keeps that ranking precomputed).
+    """
+    users = np.arange(len(ctx.user_ids)) if users is None else np.asarray(users, dtype=np.int64)
+    keys = []
+    if user2item is not None and len(user2item):
+        pos = _codes(np.asarray(user2item.keys), ctx.user_ids[users]); hit = pos >= 0
+        which, flat = _gather(np.asarray(user2item.offsets), pos[hit])
+        i = ctx.item_codes(np.asarray(user2item.items)[flat]); ok = i >= 0
+        keys.append(ctx.key(users[hit][which][ok], i[ok]))
+    which, flat = _gather(ctx.recent_offsets, users); r = ctx.recent_items[flat]
+    w2, nflat = _gather(ctx.nn_offsets, r, n_neighbors)
+    keys.append(ctx.key(users[which][w2], ctx.nn_items[nflat]))
+    keys = np.unique(np.concatenate(keys)); u, i = keys // ctx.n_items, keys % ctx.n_items
+    empty = np.setdiff1d(users, u)
+    if len(empty):
+        top = popular_items(ctx, n_fallback) if fallback is None else np.asarray(fallback)
+        keys = np.union1d(keys, (empty[:, None].astype(np.int64) * ctx.n_items + top[None, :]).ravel())
+        u, i = keys // ctx.n_items, keys % ctx.n_items
+    return u, i
+
+def popular_items(ctx: FeatureContext, n: int = N_FALLBACK) -> np.ndarray:
+    """Codes of the n most popular items that occur in the log, ties by item id"""
+    return np.argsort(-ctx.item_pop, kind='stable')[:min(n, int((ctx.item_pop > 0).sum()))]
+
+def _recent_pairs(ctx: FeatureContext, u: np.ndarray):
+    """(pair position, recent item code) for every recent item of every pair's user"""
+    which, flat = _gather(ctx.recent_offsets, u); return which, ctx.recent_items[flat]
+
+@feature('item_pop', per_item=True)
+def item_pop(ctx, u, i): return ctx.item_pop[i]
+
+@feature('is_recent')
+def is_recent(ctx, u, i): return _member(ctx.recent_keys, ctx.key(u, i)).astype(np.int64)
+
+@feature('user_activity')
+def user_activity(ctx, u, i): return ctx.user_count[u]
+
+@feature('item_recency_days', per_item=True)
+def item_recency_days(ctx, u, i): return (ctx.t_max - ctx.item_last_ts[i]) / 86400.0
+
+@feature('item_item_score')
+def item_item_score(ctx, u, i):
+    """Sum over the user's recent items of 1 / (1 + rank of the candidate in that item's neighbour list)"""
+    p, r = _recent_pairs(ctx, u); pos = _codes(ctx.nn_keys, r.astype(np.int64) * ctx.n_items + i[p]); hit = pos >= 0
+    return np.bincount(p[hit], weights=1.0 / (1.0 + ctx.nn_rank[pos[hit]]), minlength=len(u))
+
+@feature('cooc')
+def cooc(ctx, u, i, chunk_size: int = 262144):
+    """Users shared by the candidate and each of the user's other recent items, summed"""
+    if ctx.item_user is None: raise ValueError("the 'cooc' feature needs build_context(..., with_item_user=True)")
+    p, r = _recent_pairs(ctx, u); keep = r != i[p]; p, r = p[keep], r[keep]; c = i[p]
+    out = np.zeros(len(p))
+    for s in range(0, len(p), chunk_size):
+        e = min(s + chunk_size, len(p))
+        out[s:e] = np.asarray(ctx.item_user[c[s:e]].multiply(ctx.item_user[r[s:e]]).sum(axis=1)).ravel()
+    return np.bincount(p, weights=out, minlength=len(u))
+
+def build_features(ctx: FeatureContext, u: np.ndarray, i: np.ndarray, names=DEFAULT_FEATURES, labels: bool = True) -> pd.DataFrame:
+    """Frame with raw user_id/item_id, one column per named feature and (optionally) the label"""
+    unknown = [n for n in names if n not in FEATURES]
+    if unknown: raise KeyError(f'unknown features {unknown}; registered: {sorted(FEATURES)}')
+    cols = {'user_id': ctx.user_ids[u], 'item_id': ctx.item_ids[i]}
+    for n in names: cols[n] = FEATURES[n](ctx, u, i)
+    if labels: cols['label'] = _member(ctx.label_keys, ctx.key(u, i)).astype(np.int64)
+    return pd.DataFrame(cols)
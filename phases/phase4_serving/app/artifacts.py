@@ -0,0 +1,153 @@
+"""Read-only views of the Phase 1-3 outputs for the UI, keyed by raw user/item ids.
+
+Everything is memory-mapped: recs_<model>.npy and the train CSR (Phase 1), the item-item lists
+(Phase 2), the feature columns and topk.bin (Phase 3). Opening a view reads only headers and id
+arrays, and a lookup touches one user's rows, so both stay fast at production sizes. The ranker
+(joblib/sklearn) is only imported when a ranker view is opened.
+"""
+from __future__ import annotations
+import os, sys, json
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+from src.data.store import load_csr, load_columns, read_candidates, read_table, binary_source
+
+PHASES = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+P1_PROCESSED = os.environ.get('P1_PROCESSED', os.path.join(PHASES, 'phase1_baselines', 'data', 'processed'))
+P2_DIR = os.environ.get('P2_DIR', os.path.join(PHASES, 'phase2_candidates', 'outputs'))
+P3_DIR = os.environ.get('P3_DIR', os.path.join(PHASES, 'phase3_ranking', 'outputs'))
+
+def _code(sorted_ids: np.ndarray, x: int) -> int:
+    """Position of x in a sorted id array, -1 if absent"""
+    i = int(np.searchsorted(sorted_ids, x))
+    return i if i < len(sorted_ids) and sorted_ids[i] == x else -1
+
+class Baselines:
+    """Precomputed Phase 1 recommendations (recs_popularity.npy, recs_svd.npy, ...) and the training history.
+
+    Rows and item codes follow the id mapping saved with the split (user_ids.npy, item_ids.npy), or
+    next to the factors (factors_<algo>/user_ids.npy, ...) for outputs older than that; every
+    Phase 1 script builds the same mapping from the same log.
+    """
+    def __init__(self, processed_dir: str = P1_PROCESSED):
+        self.dir = processed_dir
+        ids = [processed_dir] + [os.path.join(processed_dir, d) for d in sorted(os.listdir(processed_dir)) if d.startswith('factors_')] if os.path.isdir(processed_dir) else []
+        ids = [d for d in ids if os.path.isfile(os.path.join(d, 'user_ids.npy'))]
+        if not ids: raise FileNotFoundError(f'no user_ids.npy in {processed_dir} (run scripts/run_popularity.py)')
+        self.user_ids = np.load(os.path.join(ids[0], 'user_ids.npy'), mmap_mode='r'); self.item_ids = np.load(os.path.join(ids[0], 'item_ids.npy'), mmap_mode='r')
+        self.recs = {f[5:-4]: np.load(os.path.join(processed_dir, f), mmap_mode='r') for f in sorted(os.listdir(processed_dir))
+                     if f.startswith('recs_') and f.endswith('.npy')}
+        csr = os.path.join(processed_dir, 'train_csr'); self.seen = load_csr(csr) if os.path.isdir(csr) else None
+        if self.seen is not None and self.seen.shape != (len(self.user_ids), len(self.item_ids)):
+            raise ValueError(f'train_csr in {processed_dir} does not match the ids in {ids[0]} (rerun the Phase 1 scripts)')
+        # recs of a model not rebuilt since the ids changed are left out (and reported) rather than misread
+        self.stale = sorted(n for n, r in self.recs.items() if len(r) != len(self.user_ids))
+        for n in self.stale: del self.recs[n]
+        meta = os.path.join(processed_dir, 'meta.json'); self.meta = json.load(open(meta)) if os.path.isfile(meta) else {}
+
+    def row(self, user_id: int) -> int:
+        return _code(self.user_ids, user_id)
+
+    def recommend(self, model: str, user_id: int, k: int) -> list[int] | None:
+        """Top-k raw item ids from recs_<model>.npy, None for an unknown user or model"""
+        r = self.row(user_id)
+        if r < 0 or model not in self.recs: return None
+        codes = np.asarray(self.recs[model][r, :k]); codes = codes[codes >= 0]
+        return np.asarray(self.item_ids)[codes].tolist()
+
+    def history(self, user_id: int) -> np.ndarray:
+        """Raw ids of the items the user interacted with in the training split"""
+        r = self.row(user_id)
+        if r < 0 or self.seen is None: return np.zeros(0, dtype=np.int64)
+        return np.asarray(self.item_ids)[self.seen.indices[self.seen.indptr[r]:self.seen.indptr[r + 1]]]
+
+class ItemItem:
+    """Phase 2 item-item neighbour lists; a user's candidates are the neighbours of their history"""
+    def __init__(self, p2_dir: str = P2_DIR):
+        path = os.path.join(p2_dir, 'item_item_candidates.json')
+        if binary_source(path) is None and not os.path.isfile(path): raise FileNotFoundError(f'{path} not found (run scripts/build_item_item.py)')
+        self.index = read_candidates(path)
+
+    def recommend(self, history: np.ndarray, k: int) -> tuple[list[int], list[float]]:
+        """Unseen neighbours ranked by the sum of 1/(rank + 1) over the history items that list them"""
+        lists = [np.asarray(self.index.get(int(i))) for i in history]; lists = [x for x in lists if len(x)]
+        if not lists: return [], []
+        items = np.concatenate(lists); w = np.concatenate([1.0 / np.arange(1, len(x) + 1) for x in lists])
+        keep = ~np.isin(items, history); uniq, inv = np.unique(items[keep], return_inverse=True)
+        score = np.bincount(inv, weights=w[keep], minlength=len(uniq)); top = np.argsort(-score, kind='stable')[:k]
+        return uniq[top].tolist(), score[top].tolist()
+
+class Ranker:
+    """Phase 3 ranker results: the materialized top-K table when it matches the current artifacts,
+    otherwise the user's feature rows (a slice of the mapped columns, sorted by user) scored on demand"""
+    def __init__(self, p3_dir: str = P3_DIR):
+        import joblib
+        from app.registry import FEATURE_COLS, fingerprint
+        from app.topk import TopKTable
+        self.version = fingerprint(p3_dir)
+        if self.version is None: raise FileNotFoundError(f'features/ranker.joblib missing in {p3_dir} (run build_features.py and train_ranker.py)')
+        self.table = None; tp = os.path.join(p3_dir, 'topk.bin')
+        if os.path.isfile(tp):
+            t = TopKTable(tp); self.table = t if t.version == self.version else None
+        self.model = joblib.load(os.path.join(p3_dir, 'ranker.joblib'))
+        feat = os.path.join(p3_dir, 'features.csv'); d = binary_source(feat)
+        self.cols = load_columns(d) if d else {c: v.to_numpy() for c, v in read_table(feat).items()}; self.feature_cols = FEATURE_COLS
+        u = self.cols['user_id']; self.order = None if bool((np.diff(u) >= 0).all()) else np.argsort(u, kind='stable')
+        self.user_sorted = u if self.order is None else np.asarray(u)[self.order]
+
+    @property
+    def source(self) -> str:
+        return 'topk.bin' if self.table is not None else 'features + ranker'
+
+    def recommend(self, user_id: int, k: int) -> tuple[list[int], list[float]] | None:
+        """Top-k raw item ids and scores, None if the user has no candidates"""
+        if self.table is not None and k <= self.table.k:
+            r = self.table.row(user_id)
+            if r >= 0: n = min(k, int(self.table.lens[r])); return self.table.items[r, :n].tolist(), self.table.scores[r, :n].tolist()
+        from app.registry import predict
+        lo, hi = np.searchsorted(self.user_sorted, [user_id, user_id + 1])
+        if lo == hi: return None
+        rows = np.arange(lo, hi) if self.order is None else self.order[lo:hi]
+        X = np.column_stack([np.asarray(self.cols[c][rows], dtype=np.float64) for c in self.feature_cols])
+        score = predict(self.model, X); top = np.argsort(-score, kind='stable')[:k]
+        return np.asarray(self.cols['item_id'][rows])[top].tolist(), score[top].tolist()
+
+def stamp(*paths: str) -> tuple:
+    """Cheap change marker for cache keys: (path, mtime_ns, size) of each path that exists"""
+    out = []
+    for p in paths:
+        try: st = os.stat(p); out.append((p, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError: pass
+    return tuple(out)
+
+def baselines_stamp(processed_dir: str = P1_PROCESSED) -> tuple:
+    names = sorted(os.listdir(processed_dir)) if os.path.isdir(processed_dir) else []
+    return stamp(*[os.path.join(processed_dir, n) for n in names if n.startswith('recs_')],
+                 *[os.path.join(processed_dir, n, 'user_ids.npy') for n in names if n.startswith('factors_')], os.path.join(processed_dir, 'user_ids.npy'),
+                 os.path.join(processed_dir, 'train_csr', 'indptr.npy'), os.path.join(processed_dir, 'heldout_csr', 'indptr.npy'))
+
+def item_item_stamp(p2_dir: str = P2_DIR) -> tuple:
+    return stamp(os.path.join(p2_dir, 'item_item_candidates', 'manifest.json'), os.path.join(p2_dir, 'item_item_candidates.json'))
+
+def ranker_stamp(p3_dir: str = P3_DIR) -> tuple:
+    return stamp(os.path.join(p3_dir, 'features', 'manifest.json'), os.path.join(p3_dir, 'features.csv'),
+                 os.path.join(p3_dir, 'ranker.joblib'), os.path.join(p3_dir, 'topk.bin'))
+
+def pipeline_run(path: str = os.path.join(PHASES, '..', '.pipeline', 'last_run.json')) -> dict | None:
+    """Manifest of the last scripts/pipeline.py run, None if there was none"""
+    return json.load(open(path)) if os.path.isfile(path) else None
+
+def artifact_status() -> list[dict]:
+    """Which pipeline outputs exist, with their size on disk and modification time"""
+    def size(p):
+        if os.path.isfile(p): return os.path.getsize(p)
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(p) for f in fs)
+    rows = []
+    for phase, base, names in [('Phase 1: Baselines', P1_PROCESSED, ['recs_popularity.npy', 'recs_svd.npy', 'factors_svd', 'train_csr', 'heldout_csr']),
+                               ('Phase 2: Candidates', P2_DIR, ['item_item_candidates', 'user_to_item_candidates']),
+                               ('Phase 3: Ranking', P3_DIR, ['features', 'ranker.joblib', 'topk.bin'])]:
+        for n in names:
+            p = os.path.join(base, n); ok = os.path.exists(p)
+            rows.append({'phase': phase, 'artifact': n, 'present': ok, 'MB': round(size(p) / 2**20, 2) if ok else None,
+                         'modified': np.datetime64(int(os.path.getmtime(p)), 's') if ok else None})
+    return rows
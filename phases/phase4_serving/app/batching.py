@@ -0,0 +1,64 @@
+from __future__ import annotations
+import asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+class MicroBatcher:
+    """Coalesces concurrent requests into one call of fn(items) -> results on a worker thread.
+
+    The first request of a batch opens a window of window_ms; everything that arrives before it
+    closes (or until max_batch requests are waiting) is passed to fn as one list, and each caller's
+    future is resolved with its own result (an Exception result is raised to that caller only).
+    While a batch is being scored the next one keeps collecting, so batches grow with the load.
+    """
+    def __init__(self, fn: Callable[[list], list], window_ms: float = 2.0, max_batch: int = 64):
+        self.fn = fn; self.window_ms = window_ms; self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None; self._task: asyncio.Task | None = None; self._loop = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='micro-batcher'); self._lock = threading.Lock()
+        self.n_requests = 0; self.n_batches = 0; self.largest = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_batch > 1
+
+    async def submit(self, item):
+        """Queue one request and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            with self._lock:
+                if self._loop is not loop: self._queue = asyncio.Queue(); self._loop = loop; self._task = loop.create_task(self._run())
+        fut = loop.create_future(); self._queue.put_nowait((item, fut))
+        return await fut
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop(); batch = [await self._queue.get()]
+        deadline = loop.time() + self.window_ms / 1000.0
+        while len(batch) < self.max_batch:
+            if not self._queue.empty(): batch.append(self._queue.get_nowait()); continue
+            timeout = deadline - loop.time()
+            if timeout <= 0: break
+            try: batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError: break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect(); items = [b[0] for b in batch]
+            self.n_batches += 1; self.n_requests += len(batch); self.largest = max(self.largest, len(batch))
+            try: results = await loop.run_in_executor(self._executor, self.fn, items)
+            except Exception as e: results = [e] * len(batch)
+            for (_, fut), r in zip(batch, results):
+                if fut.done(): continue   # caller went away
+                if isinstance(r, Exception): fut.set_exception(r)
+                else: fut.set_result(r)
+
+    def close(self):
+        """Stop collecting (on shutdown); the next submit() starts again on its own loop"""
+        if self._task is not None: self._task.cancel()
+        self._task = None; self._loop = None
+
+    def status(self) -> dict:
+        return {'enabled': self.enabled, 'window_ms': self.window_ms, 'max_batch': self.max_batch,
+                'requests': self.n_requests, 'batches': self.n_batches, 'largest_batch': self.largest,
+                'mean_batch': round(self.n_requests / self.n_batches, 2) if self.n_batches else 0.0}
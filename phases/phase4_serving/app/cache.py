@@ -0,0 +1,77 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+
+class ResponseCache:
+    """Bounded LRU cache of /recommend results keyed by (user_id, k, model_version), with a TTL.
+
+    One entry per user holds the longest list computed under the current model version, so a
+    request for a smaller k is a slice of it. Entries of an older version are never returned: the
+    first lookup or insert with a new version (a reloaded ranker or feature table) drops them all.
+    Versions seen before the current one are retired: a request still holding an old snapshot
+    misses and its result is not stored, so it cannot flip the cache back and wipe the new entries.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries; self.ttl = ttl; self.version: str | None = None; self._retired: set[str] = set()
+        self._data: OrderedDict[int, tuple[int, list, float]] = OrderedDict(); self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def _use_version(self, version: str) -> bool:
+        """Switch to version if it was never seen; False for a retired (older) version"""
+        if version == self.version: return True
+        if version in self._retired: return False
+        if self.version is not None: self._retired.add(self.version)
+        if self._data: self.invalidations += 1; self._data.clear()
+        self.version = version; return True
+
+    def _get(self, user_id: int, k: int) -> list | None:
+        e = self._data.get(user_id)
+        if e is not None and e[2] <= time.monotonic():
+            del self._data[user_id]; self.expired += 1; e = None
+        # a list shorter than the k it was computed for is complete, so it answers any k
+        if e is None or (e[0] < k and len(e[1]) >= e[0]):
+            self.misses += 1; return None
+        self._data.move_to_end(user_id); self.hits += 1
+        return e[1][:k]
+
+    def _put(self, user_id: int, k: int, items: list):
+        e = self._data.get(user_id)
+        if e is None or e[0] < k or e[2] <= time.monotonic():
+            self._data[user_id] = (k, list(items), time.monotonic() + self.ttl)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False); self.evictions += 1
+
+    def get(self, user_id: int, k: int, version: str) -> list | None:
+        """Cached top-k for the user under version, None on a miss"""
+        with self._lock:
+            if self._use_version(version): return self._get(user_id, k)
+            self.misses += 1; return None
+
+    def get_many(self, user_ids, k: int, version: str) -> list[list | None]:
+        """get() for several users under one lock"""
+        with self._lock:
+            if self._use_version(version): return [self._get(u, k) for u in user_ids]
+            n = len(user_ids); self.misses += n; return [None] * n
+
+    def put(self, user_id: int, k: int, version: str, items: list):
+        with self._lock:
+            if self._use_version(version): self._put(user_id, k, items)
+
+    def put_many(self, user_ids, k: int, version: str, lists):
+        with self._lock:
+            if not self._use_version(version): return
+            for u, items in zip(user_ids, lists): self._put(u, k, items)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def stats(self) -> dict:
+        n = self.hits + self.misses
+        return {'enabled': self.enabled, 'size': len(self._data), 'max_entries': self.max_entries, 'ttl_s': self.ttl,
+                'version': self.version, 'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hits / n, 4) if n else 0.0,
+                'evictions': self.evictions, 'expired': self.expired, 'invalidations': self.invalidations}
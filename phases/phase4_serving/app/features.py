@@ -0,0 +1,192 @@
+from __future__ import annotations
+import os, sys, threading, time
+from dataclasses import dataclass, replace
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking')))
+from src.data.store import CandidateIndex, read_interactions, read_candidates, binary_source, MANIFEST
+from app.metrics import stage
+from app.registry import HotSwap, file_fingerprint
+from src.features.registry import (DEFAULT_FEATURES, N_RECENT, FeatureContext, build_context, generate_candidates,
+                                   build_features, popular_items)
+
+def _marker(path: str) -> str:
+    """File whose mtime/size marks a new version of an artifact: its binary manifest if present, else the text file"""
+    d = binary_source(path); return os.path.join(d, MANIFEST) if d else path
+
+@dataclass(frozen=True)
+class FeatureBase:
+    """One loaded version of the Phase 1 log and Phase 2 lists"""
+    ctx: FeatureContext
+    user2item: CandidateIndex | None
+
+class OnlineFeatureStore(HotSwap):
+    """Request-time candidates and features from the same registry build_features.py uses.
+
+    Holds the Phase 3 FeatureContext (item popularity, per-user recent items, item-item neighbour
+    lists) built from the Phase 1 log and Phase 2 lists, reloaded when those files change (checked
+    every check_interval). Events recorded through record() never modify it: they go to a
+    lock-protected overlay keyed by raw ids (per-user recent items and counts, per-item counts and
+    latest timestamps), which survives reloads. A request reads a view, the base context with the
+    overlay applied to copies of the item arrays (rebuilt only after new events), and builds a
+    one-user context sharing it, so users missing from features.csv (or with events newer than it)
+    are served without the batch job.
+
+    With events_log, events are shared between processes (the workers of scripts/serve.py): record()
+    appends a user_id,item_id,timestamp line to that CSV and every store applies the lines it has not
+    seen before answering, so all workers agree on which users have updates. The file is a valid
+    ingest_delta.py delta; once it is folded into the Phase 1 log, deleting it drops the overlays.
+    """
+    artifact = 'feature_store'
+
+    def __init__(self, interactions: str, item_item: str, user2item: str | None = None, rerank_interval: float = 5.0,
+                 check_interval: float = 5.0, events_log: str | None = None):
+        super().__init__(check_interval); self.paths = (interactions, item_item, user2item); self.rerank_interval = rerank_interval
+        self.events_log = events_log; self._log_pos = (None, 0)   # (inode, bytes applied) of events_log
+        self._events_lock = threading.Lock(); self._view = None; self._ranked_at = 0.0
+        self._clear_events()
+
+    def _clear_events(self):
+        self.n_events = 0; self._updated = None
+        self._user_items: dict[int, list[int]] = {}; self._user_counts: dict[int, int] = {}
+        self._item_counts: dict[int, int] = {}; self._item_last: dict[int, int] = {}
+
+    def _apply(self, user_id: int, item_id: int, ts: int):
+        """Add one event to the overlay (caller holds _events_lock)"""
+        if user_id not in self._user_items: self._updated = None
+        items = self._user_items.setdefault(user_id, []); items.append(item_id); del items[:-N_RECENT]
+        self._user_counts[user_id] = self._user_counts.get(user_id, 0) + 1
+        self._item_counts[item_id] = self._item_counts.get(item_id, 0) + 1
+        self._item_last[item_id] = max(self._item_last.get(item_id, ts), ts); self.n_events += 1
+
+    def sync(self):
+        """Apply the events_log lines other processes (or this one) appended since the last call"""
+        if not self.events_log: return
+        try: st = os.stat(self.events_log)
+        except FileNotFoundError: st = None
+        ino, pos = self._log_pos
+        if st is not None and st.st_ino == ino and st.st_size == pos: return
+        with self._events_lock:
+            ino, pos = self._log_pos
+            if st is None or st.st_ino != ino or st.st_size < pos:   # removed or replaced: start over from its first line
+                if self.n_events: self._clear_events(); self._view = None
+                ino, pos = (None, 0) if st is None else (st.st_ino, 0)
+            if st is not None:
+                with open(self.events_log, 'rb') as f: f.seek(pos); data = f.read()
+                data = data[:data.rfind(b'\n') + 1]   # a line still being written is read next time
+                for line in data.decode().splitlines():
+                    parts = line.split(',')
+                    if len(parts) == 3 and parts[0].lstrip('-').isdigit(): self._apply(int(parts[0]), int(parts[1]), int(parts[2]))
+                pos += len(data)
+            self._log_pos = (ino, pos)
+
+    def _append_event(self, user_id: int, item_id: int, ts: int):
+        """Append one line to events_log, creating it with its header atomically (link of a complete temp file)"""
+        if not os.path.exists(self.events_log):
+            tmp = f'{self.events_log}.tmp{os.getpid()}.{threading.get_ident()}'
+            with open(tmp, 'w') as f: f.write('user_id,item_id,timestamp\n')
+            try: os.link(tmp, self.events_log)
+            except FileExistsError: pass
+            finally: os.remove(tmp)
+        fd = os.open(self.events_log, os.O_WRONLY | os.O_APPEND)
+        try: os.write(fd, f'{user_id},{item_id},{ts}\n'.encode())   # one short O_APPEND write: lines never interleave
+        finally: os.close(fd)
+
+    def version(self) -> str | None:
+        interactions, item_item, user2item = self.paths
+        return file_fingerprint([_marker(interactions), _marker(item_item)], optional=[_marker(user2item)] if user2item else [])
+
+    def load(self, version: str) -> FeatureBase:
+        interactions, item_item, user2item = self.paths
+        u2i = read_candidates(user2item) if user2item and (os.path.exists(user2item) or binary_source(user2item)) else None
+        ctx = build_context(read_interactions(interactions), read_candidates(item_item), extra_items=None if u2i is None else u2i.items)
+        return FeatureBase(ctx, u2i)
+
+    @property
+    def ctx(self) -> FeatureContext | None:
+        """Loaded base context, without checking the files"""
+        return None if self._current is None else self._current.ctx
+
+    def available(self) -> bool:
+        return self.get() is not None
+
+    def has_updates(self, user_id: int) -> bool:
+        """True once events were recorded for the user after the batch artifacts were built"""
+        self.sync(); return int(user_id) in self._user_items
+
+    def updated(self, user_ids: np.ndarray) -> np.ndarray:
+        """has_updates() as a mask over an array of user ids"""
+        self.sync()
+        with self._events_lock:
+            if self._updated is None: self._updated = np.sort(np.fromiter(self._user_items, np.int64, len(self._user_items)))
+            ids = self._updated
+        return np.isin(user_ids, ids)
+
+    def view(self) -> tuple[FeatureBase, FeatureContext, np.ndarray] | None:
+        """(base, context with the recorded events applied, popular item codes), None if the store is unavailable"""
+        base = self.get()
+        if base is None: return None
+        self.sync()
+        with self._events_lock:
+            v = self._view
+            if v is not None and v[0] is base and v[1] == self.n_events: return v[0], v[2], v[3]
+            ctx = base.ctx
+            if self._item_counts:
+                ids = np.fromiter(self._item_counts, np.int64, len(self._item_counts)); c = ctx.item_codes(ids); ok = c >= 0
+                pop = ctx.item_pop.astype(np.int64); np.add.at(pop, c[ok], np.fromiter(self._item_counts.values(), np.int64)[ok])
+                last = ctx.item_last_ts.copy(); np.maximum.at(last, c[ok], np.array([self._item_last[i] for i in ids.tolist()], dtype=np.int64)[ok])
+                ctx = replace(ctx, item_pop=pop, item_last_ts=last)
+            # the fallback ranking is redone at most every rerank_interval, and whenever the base changes
+            rerank = v is None or v[0] is not base or time.monotonic() - self._ranked_at >= self.rerank_interval
+            popular = popular_items(ctx) if rerank else v[3]
+            if rerank: self._ranked_at = time.monotonic()
+            self._view = (base, self.n_events, ctx, popular)
+            return base, ctx, popular
+
+    def _user_state(self, ctx: FeatureContext, user_id: int) -> tuple[np.ndarray, int]:
+        c = int(ctx.user_codes(np.array([user_id]))[0])
+        recent = np.asarray(ctx.recent_items[ctx.recent_offsets[c]:ctx.recent_offsets[c+1]]) if c >= 0 else np.zeros(0, dtype=np.int64)
+        count = int(ctx.user_count[c]) if c >= 0 else 0
+        with self._events_lock: extra = list(self._user_items.get(user_id, ())); n = self._user_counts.get(user_id, 0)
+        if extra:
+            codes = ctx.item_codes(np.array(extra, dtype=np.int64)); recent = np.concatenate([recent, codes[codes >= 0]])[-N_RECENT:]
+        return recent, count + n
+
+    def user_context(self, user_id: int, ctx: FeatureContext | None = None) -> FeatureContext | None:
+        """One-user context (user code 0) sharing the item-side arrays of the current view"""
+        if ctx is None:
+            v = self.view()
+            if v is None: return None
+            ctx = v[1]
+        recent, count = self._user_state(ctx, int(user_id))
+        return replace(ctx, user_ids=np.array([user_id], dtype=np.int64), user_count=np.array([count]),
+                       recent_offsets=np.array([0, len(recent)], dtype=np.int64), recent_items=recent,
+                       recent_keys=np.sort(recent.astype(np.int64)), label_keys=np.zeros(0, dtype=np.int64), item_user=None)
+
+    def popular(self) -> np.ndarray | None:
+        v = self.view(); return None if v is None else v[2]
+
+    def features(self, user_id: int, names=DEFAULT_FEATURES):
+        """(raw item ids, feature matrix) for the user's request-time candidates, None if the store is unavailable"""
+        v = self.view()
+        if v is None: return None
+        base, ctx, popular = v; uctx = self.user_context(user_id, ctx)
+        with stage('candidate_lookup', 'online'): u, i = generate_candidates(uctx, base.user2item, fallback=popular)
+        with stage('feature_assembly', 'online'): feat = build_features(uctx, u, i, names, labels=False)
+        return feat['item_id'].to_numpy(), feat[list(names)].to_numpy(dtype=np.float64)
+
+    def record(self, user_id: int, item_id: int, timestamp: int | None = None) -> bool:
+        """Add one interaction to the overlay: the item's popularity and the user's recent items; False for unknown items"""
+        base = self.get()
+        if base is None or int(base.ctx.item_codes(np.array([item_id]))[0]) < 0: return False
+        user_id, item_id = int(user_id), int(item_id); ts = int(time.time()) if timestamp is None else int(timestamp)
+        if self.events_log: self._append_event(user_id, item_id, ts); self.sync(); return True
+        with self._events_lock: self._apply(user_id, item_id, ts)
+        return True
+
+    def status(self) -> dict:
+        self.sync(); ctx = self.ctx
+        if ctx is None: return {'loaded': False, 'error': self.last_error}
+        return {'loaded': True, 'version': self._version, 'n_users': int(len(ctx.user_ids)), 'n_items': int(ctx.n_items),
+                'events': self.n_events, 'updated_users': len(self._user_items), 'events_log': self.events_log, 'error': self.last_error}
@@ -1,13 +1,66 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-import os, json, numpy as np, joblib, pandas as pd
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+import os, sys, json, numpy as np
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.registry import ArtifactRegistry
+from app.shared import SharedArtifactRegistry
+from app.scoring import recommend_batch, recommend_online, recommend_user, recommend_requests, user_index
+from app.batching import MicroBatcher
+from app.cache import ResponseCache
+from app.retrieval import FactorRetriever
+from app.features import OnlineFeatureStore
+from app.topk import TopKStore
+from app.metrics import Counter, Gauge, MetricsMiddleware, array_bytes, render, stage
+
+# largest k a request may ask for
+MAX_K = 1000
 # go up two levels: app -> phase4_serving -> phases
-P3_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking', 'outputs'))
+P3_DIR = os.environ.get('P3_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking', 'outputs')))
+# SERVING_DIR (set by scripts/serve.py): map the version prepared there instead of loading a private copy of P3_DIR
+SERVING_DIR = os.environ.get('SERVING_DIR')
+registry = (SharedArtifactRegistry(SERVING_DIR, check_interval=float(os.environ.get('ARTIFACT_CHECK_INTERVAL', '5'))) if SERVING_DIR else
+            ArtifactRegistry(P3_DIR, check_interval=float(os.environ.get('ARTIFACT_CHECK_INTERVAL', '5'))))
+P1_PROCESSED = os.environ.get('P1_PROCESSED', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines', 'data', 'processed')))
+retriever = FactorRetriever(P1_PROCESSED, algo=os.environ.get('FACTOR_ALGO', 'svd'), check_interval=registry.check_interval)
+P1_INTERACTIONS = os.environ.get('P1_INTERACTIONS', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines', 'data', 'raw', 'interactions.csv')))
+P2_DIR = os.environ.get('P2_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase2_candidates', 'outputs')))
+# EVENTS_LOG (set by scripts/serve.py): CSV that POST /events appends to and every worker applies, so all workers see the same events
+store = OnlineFeatureStore(P1_INTERACTIONS, os.path.join(P2_DIR, 'item_item_candidates.json'), os.path.join(P2_DIR, 'user_to_item_candidates.json'),
+                           check_interval=registry.check_interval, events_log=os.environ.get('EVENTS_LOG') or None)
+# concurrent /recommend calls within BATCH_WINDOW_MS (or BATCH_MAX_SIZE calls) are scored in one model call; 0 disables
+batcher = MicroBatcher(recommend_requests, window_ms=float(os.environ.get('BATCH_WINDOW_MS', '2')), max_batch=int(os.environ.get('BATCH_MAX_SIZE', '64')))
+# ranker responses per (user, k, artifact version); CACHE_SIZE=0 disables
+cache = ResponseCache(max_entries=int(os.environ.get('CACHE_SIZE', '10000')), ttl=float(os.environ.get('CACHE_TTL', '300')))
+# memory-mapped top-K table from scripts/materialize.py, used while its version matches the loaded ranker; TOPK_TABLE= disables
+topk = TopKStore(os.environ.get('TOPK_TABLE', os.path.join(P3_DIR, 'topk.bin')), check_interval=registry.check_interval)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.refresh()
+    yield
+    batcher.close()
+
+app = FastAPI(title="Recommender System API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
-app = FastAPI(title="Recommender System API", version="1.0.0")
-P3_DIR = os.path.join(os.path.dirname(__file__), '..', 'phase3_ranking', 'outputs')
+# scrape-time metrics over the serving objects' own counters
+Gauge('recommender_artifact_bytes', 'In-memory size of the loaded artifacts', ('artifact',),
+      fn=lambda: {('ranker',): array_bytes(registry.current), ('factors',): array_bytes(retriever.current),
+                  ('feature_store',): array_bytes(store.ctx), ('topk_table',): topk.current.nbytes() if topk.current else 0})
+Gauge('recommender_artifact_info', 'Loaded ranker artifact version (value 1)', ('version',),
+      fn=lambda: {(v,): 1 for v in [registry.status().get('version')] if v})
+Counter('recommender_cache_events_total', 'Response cache events since start', ('event',),
+        fn=lambda: {(e,): cache.stats()[e] for e in ('hits', 'misses', 'evictions', 'expired', 'invalidations')})
+Gauge('recommender_cache_entries', 'Responses currently held by the cache', fn=lambda: cache.stats()['size'])
+Counter('recommender_batcher_events_total', 'Micro-batcher requests and batches since start', ('event',),
+        fn=lambda: {(e,): batcher.status()[e] for e in ('requests', 'batches')})
+Gauge('recommender_batcher_largest_batch', 'Largest micro-batch scored since start', fn=lambda: batcher.status()['largest_batch'])
+Gauge('recommender_feature_store_events', 'Interactions recorded through POST /events', fn=lambda: store.n_events)
 
 @app.get("/")
 async def root():
@@ -18,23 +71,95 @@ async def root():
             "docs": "/docs",
             "redoc": "/redoc", 
             "ui": "/ui",
-            "health": "/health"
+            "health": "/health",
+            "stats": "/stats",
+            "metrics": "/metrics"
         }
     }
 @app.get('/health')
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "recommender-api"}
+    return {"status": "healthy", "service": "recommender-api", "pid": os.getpid(), "artifacts": registry.status(), "topk_table": topk.status(registry.status().get('version')),
+            "factors": retriever.status(), "feature_store": store.status(), "batching": batcher.status()}
 @app.get('/recommend')
-def recommend(user_id: int, k: int=10):
-    feat_path=os.path.join(P3_DIR,'features.csv'); ranker=os.path.join(P3_DIR,'ranker.joblib')
-    if not (os.path.isfile(feat_path) and os.path.isfile(ranker)):
-        raise HTTPException(status_code=400, detail='Run Phase 3 first.')
-    mdl=joblib.load(ranker); feat=pd.read_csv(feat_path); g=feat[feat['user_id']==user_id]
-    if g.empty: return {'user_id': user_id, 'items': []}
-    g=g.assign(score=mdl.predict_proba(g[['item_pop','is_recent']])[:,1])
-    top=g.sort_values('score', ascending=False).head(k)['item_id'].astype(int).tolist()
-    return {'user_id': user_id, 'items': top}
+async def recommend(user_id: int, k: int=Query(10, ge=1, le=MAX_K), retrieval: str='ranker', n_probe: int | None=None, online: bool=False):
+    """retrieval: 'ranker' (Phase 3 candidates + ranker), 'ann' (IVF index over the factors) or 'exact' (all items).
+
+    Users in the materialized top-K table (current version, k <= K_max) are answered with a row slice of it.
+    Otherwise the ranker scores the precomputed features.csv rows; users missing from it, users with events
+    recorded since, or online=true get candidates and features computed at request time by the feature store.
+    Precomputed rows are answered from the response cache or go through the micro-batcher; everything else
+    runs on the threadpool.
+    """
+    if retrieval in ('ann', 'exact'):
+        items=await run_in_threadpool(retriever.recommend, user_id, k, exact=retrieval == 'exact', n_probe=n_probe)
+        if items is None: raise HTTPException(status_code=400, detail='Run Phase 1 run_mf_svd.py (and build_ann.py) first.')
+        return {'user_id': user_id, 'items': items, 'retrieval': retrieval}
+    if retrieval != 'ranker': raise HTTPException(status_code=400, detail="retrieval must be 'ranker', 'ann' or 'exact'")
+    snap=await run_in_threadpool(registry.get) if registry.due() else registry.get()
+    if snap is None: raise HTTPException(status_code=400, detail='Run Phase 3 first.')
+    table=None if online or store.has_updates(user_id) else topk.get()
+    if table is not None and table.version == snap.version:
+        with stage('table_lookup'): items=table.lookup(user_id, k)
+        if items is not None: return {'user_id': user_id, 'items': items}
+    with stage('candidate_lookup'): rows=snap.rows(user_id)
+    if online or rows is None or store.has_updates(user_id):
+        top=await run_in_threadpool(recommend_online, snap, store, user_id, k)
+        if top is not None: return {'user_id': user_id, 'items': top.tolist(), 'features': 'online'}
+    if rows is None: return {'user_id': user_id, 'items': []}
+    items=cache.get(user_id, k, snap.version) if cache.enabled else None
+    if items is None:
+        items=await batcher.submit((snap, user_id, k)) if batcher.enabled else await run_in_threadpool(recommend_user, snap, rows, k)
+        if cache.enabled: cache.put(user_id, k, snap.version, items)
+    return {'user_id': user_id, 'items': items}
+class Event(BaseModel):
+    user_id: int
+    item_id: int
+    timestamp: int | None = None
+@app.post('/events')
+def record_event(ev: Event):
+    """Feed one interaction to the online feature store; later /recommend calls for the user use it"""
+    if not store.record(ev.user_id, ev.item_id, ev.timestamp):
+        raise HTTPException(status_code=400, detail='Unknown item or feature store unavailable (run Phases 1-2 first).')
+    return {'recorded': True, 'user_id': ev.user_id, 'item_id': ev.item_id}
+class BatchRequest(BaseModel):
+    user_ids: list[int]
+    k: int = Field(10, ge=1, le=MAX_K)
+@app.post('/recommend/batch')
+def recommend_many(req: BatchRequest):
+    """Users are split with array masks: top-K table rows, then request-time features for users missing
+    from features.csv or with recorded events (the only per-user path), then the response cache, and
+    the rest is scored with one recommend_batch call"""
+    snap=registry.get()
+    if snap is None: raise HTTPException(status_code=400, detail='Run Phase 3 first.')
+    users=np.asarray(req.user_ids, dtype=np.int64); recs: list=[None]*len(users); todo=np.ones(len(users), dtype=bool)
+    updated=store.updated(users); _, known=user_index(snap, users)
+    table=topk.get(); table=table if table is not None and table.version == snap.version and req.k <= table.k else None
+    if table is not None:
+        with stage('table_lookup'):
+            rows=np.where(updated, -1, table.rows(users)); hit=np.flatnonzero(rows >= 0)
+            for j, r in zip(hit.tolist(), table.lookup_rows(rows[hit], req.k)): recs[j]=r
+        todo[hit]=False
+    for j in np.flatnonzero(todo & (updated | ~known)).tolist():  # users the precomputed features cannot answer (well)
+        top=recommend_online(snap, store, int(users[j]), req.k)
+        if top is not None: recs[j]=top.tolist(); todo[j]=False
+    for j in np.flatnonzero(todo & ~known).tolist(): recs[j]=[]; todo[j]=False
+    todo=np.flatnonzero(todo); ids=users[todo].tolist()
+    if cache.enabled:
+        for j, r in zip(todo.tolist(), cache.get_many(ids, req.k, snap.version)): recs[j]=r
+        todo=np.array([j for j in todo.tolist() if recs[j] is None], dtype=np.int64); ids=users[todo].tolist()
+    scored=[r.tolist() for r in recommend_batch(snap, users[todo], req.k)]
+    for j, r in zip(todo.tolist(), scored): recs[j]=r
+    if cache.enabled: cache.put_many(ids, req.k, snap.version, scored)
+    return {'k': req.k, 'results': [{'user_id': u, 'items': r} for u, r in zip(req.user_ids, recs)]}
+@app.get('/stats')
+async def stats():
+    """Serving counters: response cache hits/misses/evictions and micro-batching"""
+    return {'artifact_version': registry.status().get('version'), 'cache': cache.stats(), 'batching': batcher.status()}
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition: request counts/latency, per-stage recommend() timings, artifact loads, memory"""
+    return PlainTextResponse(render(), media_type='text/plain; version=0.0.4; charset=utf-8')
 @app.get("/ui", response_class=HTMLResponse)
 async def get_ui():
     """Simple UI for the recommender system"""
@@ -62,6 +187,12 @@ async def get_ui():
             <div class="endpoint">
                 <strong>GET /health</strong> - Health check
             </div>
+            <div class="endpoint">
+                <strong>GET /stats</strong> - Cache and batching counters
+            </div>
+            <div class="endpoint">
+                <strong>GET /metrics</strong> - Prometheus metrics
+            </div>
             <div class="endpoint">
                 <strong>GET /docs</strong> - Interactive API documentation
             </div>
@@ -0,0 +1,163 @@
+"""Prometheus-style metrics in the text exposition format (0.0.4), without the client library.
+
+Counters, gauges and histograms live in one module-level registry; render() produces the /metrics
+body. Counters and gauges can be backed by a callback evaluated at scrape time, for values the
+serving objects already count themselves (cache and batcher events, memory).
+parse_metrics() and histogram_quantile() read the format back, for the Streamlit status tab.
+"""
+from __future__ import annotations
+import bisect, math, os, re, threading, time
+from typing import Callable
+try: import resource
+except ImportError: resource = None  # not on Windows
+
+_METRICS: list['_Metric'] = []
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _fmt(v: float) -> str:
+    v = float(v)
+    if v == math.inf: return '+Inf'
+    return str(int(v)) if v.is_integer() and abs(v) < 1e15 else repr(v)
+
+def _labels(names, values, extra: str = '') -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)] + ([extra] if extra else [])
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+class _Metric:
+    kind = 'untyped'
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name; self.help = help; self.label_names = tuple(labels)
+        self._children: dict[tuple, object] = {}; self._lock = threading.Lock(); _METRICS.append(self)
+
+    def header(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+class _Sampled(_Metric):
+    """Values held here, merged with fn() -> {label values: value} (or a plain number) evaluated at scrape time"""
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), fn: Callable | None = None):
+        super().__init__(name, help, labels); self.fn = fn
+
+    def lines(self) -> list[str]:
+        vals = dict(self._children)
+        if self.fn is not None:
+            got = self.fn(); vals.update(got if isinstance(got, dict) else {(): got})
+        return [f'{self.name}{_labels(self.label_names, k)} {_fmt(v)}' for k, v in sorted(vals.items()) if v is not None]
+
+class Counter(_Sampled):
+    """Incremented here, or fn() returning totals some object keeps (they must only grow)"""
+    kind = 'counter'
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock: self._children[labels] = self._children.get(labels, 0.0) + amount
+
+class Gauge(_Sampled):
+    """Set values, or fn() evaluated at scrape time"""
+    kind = 'gauge'
+    def set(self, *labels, value: float):
+        with self._lock: self._children[labels] = float(value)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels); self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            c = self._children.get(labels)
+            if c is None: c = self._children[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            c[0][i] += 1; c[1] += value; c[2] += 1
+
+    def time(self, *labels) -> '_Timer':
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def lines(self) -> list[str]:
+        out = []
+        for k, (counts, total, n) in sorted(self._children.items()):
+            cum = 0
+            for le, c in zip(self.buckets + (math.inf,), counts):
+                cum += c; le_label = 'le="' + _fmt(le) + '"'
+                out.append(f'{self.name}_bucket{_labels(self.label_names, k, le_label)} {cum}')
+            out += [f'{self.name}_sum{_labels(self.label_names, k)} {_fmt(total)}', f'{self.name}_count{_labels(self.label_names, k)} {n}']
+        return out
+
+class _Timer:
+    __slots__ = ('h', 'labels', 't')
+    def __init__(self, h: Histogram, labels: tuple): self.h = h; self.labels = labels
+    def __enter__(self): self.t = time.perf_counter(); return self
+    def __exit__(self, *exc): self.h.observe(*self.labels, value=time.perf_counter() - self.t)
+
+def render() -> str:
+    """The /metrics body for every registered metric"""
+    lines = []
+    for m in _METRICS: lines += m.header() + m.lines()
+    return '\n'.join(lines) + '\n'
+
+def rss_bytes() -> dict:
+    """Current and peak resident set size of this process, and the file-backed (shareable) part of it"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource else None
+    try:
+        with open('/proc/self/statm') as f: cur, shared = (int(x) * os.sysconf('SC_PAGE_SIZE') for x in f.read().split()[1:3])
+    except OSError: cur = shared = None
+    return {('current',): cur, ('peak',): max(peak, cur) if peak and cur else peak, ('shared',): shared}
+
+REQUESTS = Counter('recommender_http_requests_total', 'HTTP requests by route and status code', ('route', 'status'))
+REQUEST_SECONDS = Histogram('recommender_http_request_duration_seconds', 'HTTP request latency by route', ('route',))
+STAGE_SECONDS = Histogram('recommender_stage_duration_seconds', 'Time per recommend() stage: candidate_lookup, '
+                          'feature_assembly, scoring, topk (one observation per scoring call or micro-batch)', ('stage', 'path'))
+BATCH_SIZE = Histogram('recommender_batch_size', 'Requests scored per micro-batch', buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ARTIFACT_LOAD_SECONDS = Gauge('recommender_artifact_load_seconds', 'Duration of the last artifact load', ('artifact',))
+ARTIFACT_LOADS = Counter('recommender_artifact_loads_total', 'Artifact loads by result', ('artifact', 'result'))
+MEMORY = Gauge('recommender_process_resident_bytes', 'Resident set size of the serving process', ('kind',), fn=rss_bytes)
+
+def array_bytes(obj) -> int:
+    """Total nbytes of the numpy arrays held by obj (its attributes or dict values, one level deep)"""
+    if obj is None: return 0
+    vals = obj.values() if isinstance(obj, dict) else vars(obj).values() if hasattr(obj, '__dict__') else \
+        [getattr(obj, f) for f in getattr(obj, '__dataclass_fields__', ())]
+    return int(sum(getattr(v, 'nbytes', 0) for v in vals if hasattr(v, 'dtype')))
+
+def stage(name: str, path: str = 'precomputed') -> _Timer:
+    return STAGE_SECONDS.time(name, path)
+
+def record_load(artifact: str, seconds: float, ok: bool = True):
+    ARTIFACT_LOADS.inc(artifact, 'ok' if ok else 'error')
+    if ok: ARTIFACT_LOAD_SECONDS.set(artifact, value=seconds)
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests by route template and status, and timing them"""
+    def __init__(self, app): self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http': return await self.app(scope, receive, send)
+        t = time.perf_counter(); status = [500]
+        async def send_status(msg):
+            if msg['type'] == 'http.response.start': status[0] = msg['status']
+            await send(msg)
+        try: await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUESTS.inc(route, str(status[0])); REQUEST_SECONDS.observe(route, value=time.perf_counter() - t)
+
+_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+def parse_metrics(text: str) -> list[tuple[str, dict, float]]:
+    """(name, labels, value) for every sample line of an exposition-format body"""
+    out = []
+    for line in text.splitlines():
+        m = _LINE.match(line.strip())
+        if m and not line.startswith('#'): out.append((m.group(1), dict(_LABEL.findall(m.group(2) or '')), float(m.group(3))))
+    return out
+
+def histogram_quantile(q: float, buckets: list[tuple[float, float]]) -> float | None:
+    """Quantile estimate from cumulative (le, count) buckets, interpolating linearly inside a bucket"""
+    buckets = sorted(buckets); total = buckets[-1][1] if buckets else 0
+    if not total: return None
+    rank = q * total; lo, prev = 0.0, 0.0
+    for le, c in buckets:
+        if c >= rank:
+            if le == math.inf: return lo
+            return lo + (le - lo) * ((rank - prev) / (c - prev) if c > prev else 0.0)
+        lo, prev = le, c
+    return lo
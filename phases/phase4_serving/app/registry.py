@@ -0,0 +1,146 @@
+from __future__ import annotations
+import os, sys, threading, time, hashlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import numpy as np, pandas as pd, joblib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking')))
+from src.data.store import read_table, binary_source, MANIFEST
+from src.features.registry import DEFAULT_FEATURES
+from app.metrics import record_load
+
+FEATURE_COLS = list(DEFAULT_FEATURES)
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Immutable view of one loaded version of the Phase 3 artifacts"""
+    version: str
+    loaded_at: float
+    model: object
+    user_ids: np.ndarray   # sorted unique user ids
+    offsets: np.ndarray    # row pointers into items/X, len(user_ids)+1
+    items: np.ndarray
+    X: np.ndarray
+
+    def rows(self, user_id: int) -> slice | None:
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i == len(self.user_ids) or self.user_ids[i] != user_id: return None
+        return slice(int(self.offsets[i]), int(self.offsets[i+1]))
+
+def predict(model, X: np.ndarray) -> np.ndarray:
+    """Positive-class scores; wraps X in a frame when the model was fitted with column names"""
+    if hasattr(model, 'feature_names_in_'): X = pd.DataFrame(X, columns=model.feature_names_in_)
+    return model.predict_proba(X)[:, 1]
+
+def artifact_paths(p3_dir: str) -> tuple[str, str]:
+    """Files whose changes mark a new version: the features (binary manifest if present) and the ranker"""
+    feat = os.path.join(p3_dir, 'features.csv'); d = binary_source(feat)
+    return (os.path.join(d, MANIFEST) if d else feat), os.path.join(p3_dir, 'ranker.joblib')
+
+def file_fingerprint(paths, optional=()) -> str | None:
+    """Version string derived from file mtimes and sizes, None if a required file is missing"""
+    parts = []
+    for p in [*paths, *optional]:
+        try: st = os.stat(p)
+        except FileNotFoundError:
+            if p in optional: parts.append(f'{os.path.basename(p)}:-'); continue
+            return None
+        parts.append(f'{os.path.basename(p)}:{st.st_mtime_ns}:{st.st_size}')
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:12]
+
+def fingerprint(p3_dir: str) -> str | None:
+    """Version of the Phase 3 artifacts, None if any is missing"""
+    return file_fingerprint(artifact_paths(p3_dir))
+
+def load_snapshot(p3_dir: str, version: str) -> Snapshot:
+    """Load the ranker and index the candidate features by user"""
+    mdl = joblib.load(os.path.join(p3_dir, 'ranker.joblib')); feat = read_table(os.path.join(p3_dir, 'features.csv'))
+    uid = feat['user_id'].to_numpy(); order = np.argsort(uid, kind='stable'); uid = uid[order]
+    user_ids, starts = np.unique(uid, return_index=True)
+    offsets = np.append(starts, len(uid)).astype(np.int64)
+    items = feat['item_id'].to_numpy()[order].astype(np.int64)
+    X = feat[FEATURE_COLS].to_numpy(dtype=np.float64)[order]
+    return Snapshot(version, time.time(), mdl, user_ids, offsets, items, X)
+
+class HotSwap(ABC):
+    """Current value built from files on disk, swapped in whole when their version changes.
+
+    Subclasses provide version() (a fingerprint of the files, None while they are incomplete) and
+    load(version). get() returns the current value and compares versions every check_interval.
+    One caller builds a new version off to the side and replaces the reference in one assignment;
+    requests arriving meanwhile keep getting the current value, and only wait while nothing is
+    loaded yet. A version that failed to load is not retried until the files change again.
+    """
+    artifact = ''   # label of the load metrics
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval; self._current = None; self._version: str | None = None
+        self._failed: str | None = None; self._lock = threading.Lock(); self._last_check = 0.0; self.last_error: str | None = None
+
+    @abstractmethod
+    def version(self) -> str | None:
+        """Fingerprint of the files on disk, None while they are incomplete"""
+
+    @abstractmethod
+    def load(self, version: str):
+        """Build the value for version (called outside the request path; may raise)"""
+
+    @property
+    def current(self):
+        """Loaded value, without checking the files"""
+        return self._current
+
+    @property
+    def loading(self) -> bool:
+        return self._lock.locked()
+
+    def refresh(self, force: bool = False):
+        """Reload if the version on disk differs from the loaded one (force: even if it does not)"""
+        self._last_check = time.monotonic()
+        # the lock is the loading flag: callers only wait for it while there is nothing to serve yet
+        if not self._lock.acquire(blocking=self._current is None): return self._current
+        try:
+            version = self.version()
+            if version is None or (not force and version in (self._version, self._failed)): return self._current
+            t = time.perf_counter()
+            try: value = self.load(version)
+            except Exception as e:  # keep serving the previous version on a bad/partial write
+                self._failed = version; self.last_error = f'{type(e).__name__}: {e}'; record_load(self.artifact, 0, ok=False)
+                return self._current
+            self._current, self._version, self._failed, self.last_error = value, version, None, None
+            record_load(self.artifact, time.perf_counter() - t); return value
+        finally: self._lock.release()
+
+    def due(self) -> bool:
+        """True when the next get() checks the files on disk (and may reload)"""
+        if self._current is None and self._failed is None: return True
+        return not self.loading and time.monotonic() - self._last_check >= self.check_interval
+
+    def get(self):
+        return self.refresh() if self.due() else self._current
+
+class ArtifactRegistry(HotSwap):
+    """Holds the current Snapshot in memory and hot-swaps it when the files on disk change.
+
+    Readers call get() and work with the returned snapshot, so a request never sees a
+    half-loaded model/feature pair.
+    """
+    artifact = 'ranker'
+
+    def __init__(self, p3_dir: str, check_interval: float = 5.0):
+        super().__init__(check_interval); self.p3_dir = p3_dir
+
+    def version(self) -> str | None:
+        """Version of the artifacts on disk (None while incomplete)"""
+        return fingerprint(self.p3_dir)
+
+    def load(self, version: str) -> Snapshot:
+        return load_snapshot(self.p3_dir, version)
+
+    def status(self) -> dict:
+        s = self._current
+        if s is None: return {'loaded': False, 'error': self.last_error}
+        return {'loaded': True, 'version': s.version,
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(s.loaded_at)),
+                'n_users': int(len(s.user_ids)), 'n_rows': int(len(s.items)), 'error': self.last_error}
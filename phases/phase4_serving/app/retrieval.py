@@ -0,0 +1,58 @@
+from __future__ import annotations
+import os, sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+from src.data.store import load_csr, MANIFEST
+from src.models.baselines.mf_svd import load_factors
+from src.models.topk import score_user
+from src.models.ann import IVFIndex
+from app.registry import HotSwap, file_fingerprint
+
+class FactorRetriever(HotSwap):
+    """Factor-model retrieval over the Phase 1 artifacts: exact dot products or the IVF index.
+
+    Factors, the training CSR (items to exclude) and the index are memory-mapped on first use,
+    and mapped again when run_mf_svd.py or build_ann.py rewrites them (checked every check_interval).
+    Users and items are addressed by their raw ids through the saved user_ids/item_ids arrays.
+    """
+    artifact = 'factors'
+
+    def __init__(self, processed_dir: str, algo: str = 'svd', check_interval: float = 5.0):
+        super().__init__(check_interval); self.processed_dir = processed_dir; self.algo = algo
+
+    def version(self) -> str | None:
+        d = self.processed_dir
+        return file_fingerprint([os.path.join(d, f'factors_{self.algo}', 'meta.json')],
+                                optional=[os.path.join(d, 'train_csr', MANIFEST), os.path.join(d, f'ann_{self.algo}', 'meta.json')])
+
+    def load(self, version: str) -> dict:
+        f = load_factors(os.path.join(self.processed_dir, f'factors_{self.algo}'))
+        if 'U' not in f or 'V' not in f: raise FileNotFoundError(f'factors_{self.algo} is missing U/V')
+        csr = os.path.join(self.processed_dir, 'train_csr'); ann = os.path.join(self.processed_dir, f'ann_{self.algo}')
+        f['seen'] = load_csr(csr) if os.path.isdir(csr) else None
+        f['index'] = IVFIndex.load(ann) if os.path.isdir(ann) else None
+        return f
+
+    def available(self) -> bool:
+        return self.get() is not None
+
+    def recommend(self, user_id: int, k: int = 10, exact: bool = False, n_probe: int | None = None) -> list[int] | None:
+        """Top-k raw item ids for a raw user id ([] for unknown users), None when no factors are available"""
+        f = self.get()
+        if f is None: return None
+        uids = f.get('user_ids')
+        if uids is None: u = user_id if 0 <= user_id < len(f['U']) else None
+        else:
+            i = int(np.searchsorted(uids, user_id)); u = i if i < len(uids) and uids[i] == user_id else None
+        if u is None: return []
+        seen = f['seen']; excl = seen.indices[seen.indptr[u]:seen.indptr[u+1]] if seen is not None else None
+        if exact or f['index'] is None: idx, _ = score_user(f['U'][u], f['V'], excl, k)
+        else: idx, _ = f['index'].query(f['U'][u], k, excl, n_probe)
+        return (np.asarray(f['item_ids'])[idx] if 'item_ids' in f else idx).tolist()
+
+    def status(self) -> dict:
+        f = self._current
+        if f is None: return {'loaded': False, 'algo': self.algo, 'error': self.last_error}
+        return {'loaded': True, 'algo': self.algo, 'n_users': int(len(f['U'])), 'n_items': int(len(f['V'])),
+                'ann': None if f['index'] is None else {'n_lists': f['index'].n_lists, 'n_probe': f['index'].n_probe}}
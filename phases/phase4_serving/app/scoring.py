@@ -0,0 +1,92 @@
+from __future__ import annotations
+import os, sys, argparse, json, numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.registry import Snapshot, load_snapshot, fingerprint, predict
+from app.metrics import stage, BATCH_SIZE
+
+def user_index(snap: Snapshot, user_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Position of each user id in snap.user_ids (clipped) and whether the snapshot has rows for it"""
+    idx = np.searchsorted(snap.user_ids, user_ids).clip(0, max(len(snap.user_ids)-1, 0))
+    found = (snap.user_ids[idx] == user_ids) if len(snap.user_ids) else np.zeros(len(user_ids), bool)
+    return idx, found
+
+def gather_rows(snap: Snapshot, user_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Feature row positions for every requested user plus the request slot each row belongs to"""
+    idx, found = user_index(snap, user_ids)
+    starts = snap.offsets[idx]; lens = np.where(found, snap.offsets[idx+1]-starts, 0)
+    group = np.repeat(np.arange(len(user_ids)), lens)
+    first = np.cumsum(lens) - lens
+    pos = np.arange(int(lens.sum())) - np.repeat(first, lens) + np.repeat(starts, lens)
+    return pos, group
+
+def grouped_topk(group: np.ndarray, score: np.ndarray, n_groups: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k per group in one sort; returns (row positions, CSR offsets per group)"""
+    order = np.lexsort((-score, group)); g = group[order]
+    counts = np.bincount(group, minlength=n_groups); first = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - first[g]; keep = rank < k
+    offsets = np.concatenate(([0], np.cumsum(np.minimum(counts, k))))
+    return order[keep], offsets
+
+def recommend_batch(snap: Snapshot, user_ids, k: int = 10) -> list[list[int]]:
+    """Top-k items for each user id, scored with a single predict_proba call"""
+    user_ids = np.asarray(user_ids, dtype=snap.user_ids.dtype if len(snap.user_ids) else np.int64)
+    with stage('candidate_lookup'): pos, group = gather_rows(snap, user_ids)
+    with stage('feature_assembly'): X = snap.X[pos]
+    with stage('scoring'): score = predict(snap.model, X) if len(pos) else np.empty(0)
+    with stage('topk'):
+        top, offsets = grouped_topk(group, score, len(user_ids), k)
+        return np.split(snap.items[pos[top]], offsets[1:-1]) if len(user_ids) else []
+
+def recommend_user(snap: Snapshot, rows: slice, k: int = 10) -> list[int]:
+    """Top-k items of one user's feature rows (one predict_proba call)"""
+    with stage('feature_assembly'): X = snap.X[rows]
+    with stage('scoring'): score = predict(snap.model, X)
+    with stage('topk'): return snap.items[rows][np.argsort(-score, kind='stable')[:k]].tolist()
+
+def recommend_requests(reqs: list[tuple[Snapshot, int, int]]) -> list[list[int]]:
+    """Answer coalesced (snapshot, user_id, k) requests with one recommend_batch call per snapshot"""
+    out: list = [None] * len(reqs); groups: dict[int, tuple[Snapshot, list[int]]] = {}; BATCH_SIZE.observe(value=len(reqs))
+    for j, (snap, _, _) in enumerate(reqs): groups.setdefault(id(snap), (snap, []))[1].append(j)
+    for snap, idx in groups.values():
+        recs = recommend_batch(snap, [reqs[j][1] for j in idx], max(reqs[j][2] for j in idx))
+        for j, r in zip(idx, recs): out[j] = r[:reqs[j][2]].tolist()
+    return out
+
+def recommend_online(snap: Snapshot, store, user_id: int, k: int = 10) -> np.ndarray | None:
+    """Top-k items from request-time candidates/features (app.features.OnlineFeatureStore), None if unavailable"""
+    res = store.features(user_id)
+    if res is None: return None
+    items, X = res
+    if not len(items): return items
+    with stage('scoring', 'online'): score = predict(snap.model, X)
+    with stage('topk', 'online'): return items[np.argsort(-score, kind='stable')[:k]]
+
+def topk_arrays(snap: Snapshot, k: int, batch_users: int = 20000) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(items, scores, lens) of every user's top-k in snapshot user order; rows are -1 / NaN padded"""
+    n = len(snap.user_ids); items = np.full((n, k), -1, dtype=np.int32); scores = np.full((n, k), np.nan, dtype=np.float32)
+    lens = np.zeros(n, dtype=np.int32)
+    for lo in range(0, n, batch_users):
+        users = snap.user_ids[lo:lo + batch_users]; pos, group = gather_rows(snap, users)
+        score = predict(snap.model, snap.X[pos]) if len(pos) else np.empty(0)
+        top, offsets = grouped_topk(group, score, len(users), k)
+        cnt = np.diff(offsets); row = np.repeat(np.arange(len(users)), cnt); col = np.arange(len(top)) - offsets[row]
+        items[lo + row, col] = snap.items[pos[top]]; scores[lo + row, col] = score[top]; lens[lo:lo + len(users)] = cnt
+    return items, scores, lens
+
+def recommend_batch_offline(p3_dir: str, user_ids=None, k: int = 10) -> dict[int, list[int]]:
+    """Load the Phase 3 outputs from disk and score user_ids (all users if None)"""
+    version = fingerprint(p3_dir)
+    if version is None: raise FileNotFoundError(f'Phase 3 artifacts not found in {p3_dir}')
+    snap = load_snapshot(p3_dir, version)
+    users = snap.user_ids if user_ids is None else np.asarray(user_ids)
+    return {int(u): r.tolist() for u, r in zip(users, recommend_batch(snap, users, k))}
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--p3-dir', default=os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking', 'outputs'))
+    ap.add_argument('--users', default=None, help='file with one user id per line (default: all users)')
+    ap.add_argument('--k', type=int, default=10); ap.add_argument('--out', default='batch_recommendations.json'); a = ap.parse_args()
+    users = np.loadtxt(a.users, dtype=np.int64, ndmin=1) if a.users else None
+    recs = recommend_batch_offline(a.p3_dir, users, a.k)
+    json.dump(recs, open(a.out, 'w')); print(f'Wrote {a.out} ({len(recs)} users)')
@@ -0,0 +1,85 @@
+"""Serving artifacts prepared once and memory-mapped read-only by every worker process.
+
+prepare() writes one version of the Phase 3 artifacts to <serving_dir>/<version>/ in the exact
+layout a Snapshot holds: user_ids, offsets, items and the float64 feature matrix X (rows sorted
+by user) as .npy files, plus the ranker re-dumped uncompressed so joblib can map its arrays
+too. A worker opens them with mmap_mode='r'. Its snapshot then costs page-cache pages that all
+workers share, instead of a private copy built from features.csv, so startup is a few file opens.
+
+<serving_dir>/current is a symlink to the active version. publish() points it at a new version
+by renaming a fresh link over it, so readers see the old or the new target and nothing between.
+Workers (SharedArtifactRegistry) follow the link on their usual check interval and swap in one
+assignment. Old version directories stay until prune(); a worker still mapping one keeps working
+even after it is deleted.
+"""
+from __future__ import annotations
+import os, json, shutil, time
+import numpy as np, joblib
+
+from app.registry import ArtifactRegistry, Snapshot, FEATURE_COLS, fingerprint, load_snapshot
+
+CURRENT = 'current'
+MANIFEST = 'manifest.json'
+ARRAYS = ('user_ids', 'offsets', 'items', 'X')
+
+def prepare(p3_dir: str, serving_dir: str, version: str | None = None) -> str | None:
+    """Write the current Phase 3 artifacts as a mappable version directory (kept if it exists); returns its version"""
+    version = version or fingerprint(p3_dir)
+    if version is None: return None
+    d = os.path.join(serving_dir, version)
+    if os.path.isfile(os.path.join(d, MANIFEST)): return version
+    snap = load_snapshot(p3_dir, version); tmp = f'{d}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    for n in ARRAYS: np.save(os.path.join(tmp, f'{n}.npy'), np.ascontiguousarray(getattr(snap, n)))
+    joblib.dump(snap.model, os.path.join(tmp, 'ranker.joblib'))   # uncompressed, so load(mmap_mode='r') maps its arrays
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        json.dump({'version': version, 'feature_cols': FEATURE_COLS, 'n_users': int(len(snap.user_ids)), 'n_rows': int(len(snap.items)),
+                   'source': os.path.abspath(p3_dir), 'created_at': time.time()}, f)
+    if os.path.isdir(d): shutil.rmtree(d, ignore_errors=True)   # left by an interrupted prepare
+    try: os.rename(tmp, d)
+    except OSError: shutil.rmtree(tmp, ignore_errors=True)   # another process prepared it first
+    return version
+
+def current_version(serving_dir: str) -> str | None:
+    """Version the current link points at, None before the first publish"""
+    try: v = os.path.basename(os.readlink(os.path.join(serving_dir, CURRENT)))
+    except OSError: return None
+    return v if os.path.isfile(os.path.join(serving_dir, v, MANIFEST)) else None
+
+def publish(serving_dir: str, version: str):
+    """Atomically point serving_dir/current at a prepared version"""
+    if not os.path.isfile(os.path.join(serving_dir, version, MANIFEST)): raise FileNotFoundError(f'{version} is not prepared in {serving_dir}')
+    tmp = os.path.join(serving_dir, f'.{CURRENT}.tmp{os.getpid()}')
+    if os.path.lexists(tmp): os.remove(tmp)
+    os.symlink(version, tmp); os.replace(tmp, os.path.join(serving_dir, CURRENT))
+
+def prune(serving_dir: str, keep: int = 2) -> list[str]:
+    """Delete all but the `keep` newest versions (never the current one); returns the removed versions"""
+    cur = current_version(serving_dir)
+    vs = [v for v in os.listdir(serving_dir) if not os.path.islink(os.path.join(serving_dir, v)) and os.path.isfile(os.path.join(serving_dir, v, MANIFEST))]
+    vs.sort(key=lambda v: os.path.getmtime(os.path.join(serving_dir, v, MANIFEST)), reverse=True)
+    gone = [v for v in vs[keep:] if v != cur]
+    for v in gone: shutil.rmtree(os.path.join(serving_dir, v), ignore_errors=True)
+    return gone
+
+def load_prepared(serving_dir: str, version: str) -> Snapshot:
+    """Snapshot whose arrays and model arrays are read-only maps of a prepared version"""
+    d = os.path.join(serving_dir, version)
+    meta = json.load(open(os.path.join(d, MANIFEST)))
+    if meta['feature_cols'] != FEATURE_COLS: raise ValueError(f'{version} was prepared with features {meta["feature_cols"]}, serving {FEATURE_COLS}')
+    arrs = {n: np.load(os.path.join(d, f'{n}.npy'), mmap_mode='r') for n in ARRAYS}
+    return Snapshot(version, time.time(), joblib.load(os.path.join(d, 'ranker.joblib'), mmap_mode='r'), **arrs)
+
+class SharedArtifactRegistry(ArtifactRegistry):
+    """ArtifactRegistry over a serving directory: versions come from the current link, snapshots are maps"""
+    def __init__(self, serving_dir: str, check_interval: float = 5.0):
+        super().__init__(serving_dir, check_interval); self.serving_dir = serving_dir
+
+    def version(self) -> str | None:
+        return current_version(self.serving_dir)
+
+    def load(self, version: str) -> Snapshot:
+        return load_prepared(self.serving_dir, version)
+
+    def status(self) -> dict:
+        return {**super().status(), 'mode': 'shared', 'serving_dir': self.serving_dir}
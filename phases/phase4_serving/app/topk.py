@@ -0,0 +1,110 @@
+"""Precomputed top-K table: one binary file, memory-mapped by every API process.
+
+Layout (little-endian, sections 64-byte aligned):
+
+    header    64 bytes: magic, format, k_max, n_users, index size, artifact version, created_at
+    user_ids  int64[n_users], sorted
+    index     int32[max user id + 1] user id -> row (-1 if absent); empty when ids are too sparse,
+              then rows are found by binary search over user_ids
+    lens      int32[n_users]       valid entries per row
+    items     int32[n_users, k_max] best first, -1 padded
+    scores    float32[n_users, k_max]
+
+The artifact version is the Phase 3 fingerprint the table was scored from; the API only answers
+from a table whose version matches the ranker/features it has loaded.
+"""
+from __future__ import annotations
+import os, mmap, struct, threading, time
+import numpy as np
+
+MAGIC = b'RECTOPK\0'; FORMAT = 1; ALIGN = 64
+_HEADER = struct.Struct('<8sIIQQ16sd')   # magic, format, k_max, n_users, index_len, version, created_at
+
+def _pad(n: int) -> int:
+    return -n % ALIGN
+
+def write_topk(path: str, user_ids: np.ndarray, items: np.ndarray, scores: np.ndarray, lens: np.ndarray, version: str):
+    """Write the table to path atomically (temp file + rename, so open readers keep their mapping)"""
+    user_ids = np.ascontiguousarray(user_ids, dtype='<i8'); n, k = items.shape
+    dense = n and user_ids[0] >= 0 and user_ids[-1] < 4 * n + 1024
+    index = np.full(int(user_ids[-1]) + 1 if dense else 0, -1, dtype='<i4')
+    if dense: index[user_ids] = np.arange(n)
+    sections = [user_ids, index, np.ascontiguousarray(lens, dtype='<i4'), np.ascontiguousarray(items, dtype='<i4'),
+                np.ascontiguousarray(scores, dtype='<f4')]
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT, k, n, len(index), version.encode()[:16], time.time()).ljust(ALIGN, b'\0'))
+        for a in sections: f.write(a.tobytes()); f.write(b'\0' * _pad(a.nbytes))
+    os.replace(tmp, path)
+
+class TopKTable:
+    """Read-only mapping of a table file; lookups are views into the page cache"""
+    def __init__(self, path: str):
+        with open(path, 'rb') as f: self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.k, self.n_users, n_index, version, self.created_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT: raise ValueError(f'{path}: not a top-K table (format {fmt})')
+        self.version = version.rstrip(b'\0').decode(); self.path = path; off = ALIGN
+        def section(dtype, count, shape=None):
+            nonlocal off
+            a = np.frombuffer(self._mm, dtype=dtype, count=count, offset=off); off += a.nbytes + _pad(a.nbytes)
+            return a.reshape(shape) if shape else a
+        self.user_ids = section('<i8', self.n_users); self.index = section('<i4', n_index); self.lens = section('<i4', self.n_users)
+        self.items = section('<i4', self.n_users * self.k, (self.n_users, self.k))
+        self.scores = section('<f4', self.n_users * self.k, (self.n_users, self.k))
+
+    def row(self, user_id: int) -> int:
+        """Row of user_id, -1 when the table has no entry for it"""
+        if len(self.index): return int(self.index[user_id]) if 0 <= user_id < len(self.index) else -1
+        i = int(np.searchsorted(self.user_ids, user_id))
+        return i if i < self.n_users and self.user_ids[i] == user_id else -1
+
+    def rows(self, user_ids: np.ndarray) -> np.ndarray:
+        """row() for an array of user ids"""
+        u = np.asarray(user_ids, dtype=np.int64)
+        if len(self.index):
+            ok = (u >= 0) & (u < len(self.index)); r = np.full(len(u), -1, dtype=np.int64); r[ok] = self.index[u[ok]]; return r
+        if not self.n_users: return np.full(len(u), -1, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self.user_ids, u), self.n_users - 1)
+        return np.where(self.user_ids[i] == u, i, -1)
+
+    def lookup_rows(self, rows: np.ndarray, k: int) -> list[list[int]]:
+        """Top-k items of each (present) row, k <= k_max"""
+        items = self.items[rows, :k].tolist(); lens = np.minimum(self.lens[rows], k).tolist()
+        return [r[:n] for r, n in zip(items, lens)]
+
+    def lookup(self, user_id: int, k: int) -> list[int] | None:
+        """Top-k items of the user, None if the user is absent or k exceeds the stored k_max"""
+        r = self.row(user_id)
+        if r < 0 or k > self.k: return None
+        return self.items[r, :min(k, self.lens[r])].tolist()
+
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+class TopKStore:
+    """Current TopKTable for a path, remapped when the file is replaced (checked every check_interval)"""
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path; self.check_interval = check_interval; self._table: TopKTable | None = None
+        self._stamp = None; self._last_check = 0.0; self._lock = threading.Lock(); self.last_error: str | None = None
+
+    @property
+    def current(self) -> TopKTable | None:
+        """Mapped table, without checking the file"""
+        return self._table
+
+    def get(self) -> TopKTable | None:
+        if time.monotonic() - self._last_check < self.check_interval: return self._table
+        with self._lock:
+            self._last_check = time.monotonic()
+            try: st = os.stat(self.path); stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except FileNotFoundError: self._table = None; self._stamp = None; return None
+            if stamp != self._stamp:
+                try: self._table = TopKTable(self.path); self._stamp = stamp; self.last_error = None
+                except (OSError, ValueError, struct.error) as e: self.last_error = f'{type(e).__name__}: {e}'
+            return self._table
+
+    def status(self, version: str | None = None) -> dict:
+        t = self.get()
+        if t is None: return {'loaded': False, 'path': self.path, 'error': self.last_error}
+        return {'loaded': True, 'version': t.version, 'current': t.version == version, 'k_max': t.k, 'n_users': t.n_users,
+                'bytes': t.nbytes(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t.created_at)), 'error': self.last_error}
@@ -1,18 +1,24 @@
-import streamlit as st
+"""Streamlit UI over the pipeline outputs: `streamlit run app/ui.py`, or streamlit_app.py at the repo root.
+
+Streamlit reruns the page on every interaction; this module is imported once per server process
+and main() renders the page. The artifacts are opened through st.cache_resource (memory-mapped,
+shared by all sessions, reopened when their files change), the ranker's imports (joblib/sklearn)
+load the first time a ranker result is asked for, and the API tab's client (requests) loads with
+its first call.
+"""
+import os, sys, time
 import numpy as np
 import pandas as pd
-import json
-from pathlib import Path
-
-# Page config
-st.set_page_config(
-    page_title="Recommender System",
-    page_icon="🛍️",
-    layout="wide",
-)
-
-# Custom CSS
-st.markdown("""
+import streamlit as st
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import artifacts
+from app.metrics import parse_metrics, histogram_quantile
+
+API_BASE = os.environ.get("API_BASE", "http://localhost:8080")
+METHODS = {"Popularity (Phase 1)": "popularity", "SVD (Phase 1)": "svd", "Item-Item (Phase 2)": "item_item", "Ranker (Phase 3)": "ranker"}
+
+CSS = """
 <style>
 .main {
     padding-top: 2rem;
@@ -30,183 +36,248 @@ st.markdown("""
     color: white;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# the stamp arguments only key the cache: a rebuilt artifact has a new stamp and gets a fresh view
+@st.cache_resource(show_spinner="Opening Phase 1 outputs...")
+def baselines(stamp) -> artifacts.Baselines:
+    return artifacts.Baselines()
+
+@st.cache_resource(show_spinner="Opening item-item lists...")
+def item_item(stamp) -> artifacts.ItemItem:
+    return artifacts.ItemItem()
+
+@st.cache_resource(show_spinner="Loading the ranker...")
+def ranker(stamp) -> artifacts.Ranker:
+    return artifacts.Ranker()
+
+@st.cache_data(show_spinner="Evaluating baselines...")
+def baseline_metrics(stamp, k: int = 10) -> pd.DataFrame:
+    """Held-out metrics of every recs_<model>.npy (one pass over the mapped arrays, cached per artifact version)"""
+    from src.utils.metrics import evaluate, coverage
+    from src.data.store import load_csr
+    b = baselines(stamp); held = load_csr(os.path.join(b.dir, 'heldout_csr')); rows = []
+    for name, rec in b.recs.items():
+        r = evaluate(rec, held, ks=(k,))['metrics']
+        rows.append({"Model": name, f"Precision@{k}": r[f"precision@{k}"], f"Recall@{k}": r[f"recall@{k}"], f"NDCG@{k}": r[f"ndcg@{k}"],
+                     "Coverage": coverage(rec, b.meta.get("n_items", len(b.item_ids)))})
+    return pd.DataFrame(rows)
 
-# Title
-st.title("🛍️ Multi-Phase Recommender System")
-st.markdown("A clean, modular recommender system with baseline → candidates → ranking → serving pipeline")
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_api(base: str) -> dict:
+    """/health, /stats and parsed /metrics of the API, or the error; cached briefly so reruns do not wait on the network"""
+    import requests
+    try:
+        return {"health": requests.get(f"{base}/health", timeout=2).json(), "stats": requests.get(f"{base}/stats", timeout=2).json(),
+                "samples": parse_metrics(requests.get(f"{base}/metrics", timeout=2).text)}
+    except (requests.RequestException, ValueError) as e:
+        return {"error": str(e)}
 
-# Tabs
-tab1, tab2, tab3, tab4 = st.tabs(["🏠 Home", "🧠 Get Recommendations", "📡 API Status", "📦 Phase Status"])
+def recommend(method: str, user_id: int, k: int) -> tuple[pd.DataFrame | None, str]:
+    """(Rank/Item ID/Score table or None, caption) for one user"""
+    if method == "ranker":
+        r = ranker(artifacts.ranker_stamp())
+        res = r.recommend(user_id, k); source = f"{r.source}, artifact version {r.version}"
+        if res is None: return None, f"User {user_id} has no ranked candidates ({source})"
+        items, scores = res
+    elif method == "item_item":
+        b = baselines(artifacts.baselines_stamp()); history = b.history(user_id)
+        items, scores = item_item(artifacts.item_item_stamp()).recommend(history, k); source = f"neighbours of {len(history)} training items"
+        if not items: return None, f"User {user_id} has no training history with item-item neighbours"
+    else:
+        b = baselines(artifacts.baselines_stamp())
+        if method in b.stale: return None, f"recs_{method}.npy in {b.dir} is out of date (rerun the Phase 1 scripts)"
+        if method not in b.recs: return None, f"recs_{method}.npy not found in {b.dir}"
+        items = b.recommend(method, user_id, k); scores = None; source = f"recs_{method}.npy"
+        if items is None: return None, f"User {user_id} is not in the training data"
+    df = pd.DataFrame({"Rank": np.arange(1, len(items) + 1), "Item ID": items})
+    if scores is not None: df["Score"] = np.round(scores, 4)
+    return df, source
 
-with tab1:
+def home_tab():
     st.header("Welcome to the Recommender System")
-    
+
     col1, col2 = st.columns(2)
-    
+
     with col1:
         st.subheader("🌟 Features")
         st.markdown("""
         - **Phase 1**: Baseline models (Popularity, SVD Matrix Factorization)
-        - **Phase 2**: Candidate generation (Item-Item similarity, User-Item neighborhood)  
+        - **Phase 2**: Candidate generation (Item-Item similarity, User-Item neighborhood)
         - **Phase 3**: Ranking with ML models (Logistic Regression, GBDT)
         - **Phase 4**: Production serving (FastAPI + Streamlit UI)
         """)
-        
+
     with col2:
         st.subheader("📊 Model Performance")
-        
-        # Sample metrics
-        metrics_data = {
-            'Model': ['SVD', 'Logistic Regression', 'Popularity'],
-            'Precision@10': [0.145, 0.234, 0.089],
-            'Recall@10': [0.167, 0.198, 0.045],
-            'Coverage': [67.2, 45.8, 23.1]
-        }
-        
-        df_metrics = pd.DataFrame(metrics_data)
-        st.dataframe(df_metrics, use_container_width=True)
+        stamp = artifacts.baselines_stamp()
+        if not any(p.endswith(os.path.join("heldout_csr", "indptr.npy")) for p, _, _ in stamp):
+            st.info("Run the Phase 1 scripts to see held-out metrics")
+        elif st.toggle("Evaluate the Phase 1 baselines on the held-out split"):
+            try: st.dataframe(baseline_metrics(stamp), hide_index=True, use_container_width=True)
+            except (FileNotFoundError, ValueError) as e: st.warning(str(e))
 
     st.subheader("🚀 Quick Start")
     with st.expander("View Pipeline Commands"):
         st.code("""
-# Phase 1: Baseline models
-python scripts/run_popularity.py
-python scripts/run_mf_svd.py --factors 64 --n_iter 7
+# Phases 1-3: every stage that is out of date (from the repository root)
+python scripts/pipeline.py
 
-# Phase 2: Candidate generation  
-python scripts/build_item_item.py --topk 100
-python scripts/build_user_to_item.py --topk 100
-
-# Phase 3: Train ranking model
-python scripts/train_ranker.py --model logreg
+# Optional: precompute the ranker's top-K for the API and this UI
+cd phases/phase4_serving && python scripts/materialize.py --k 100
 
 # Phase 4: Start serving
+uvicorn app.main:app --port 8080
 streamlit run app/ui.py
         """, language="bash")
 
-with tab2:
+def recommendations_tab():
     st.header("🧠 Get Recommendations")
-    
+
     col1, col2 = st.columns([1, 2])
-    
+
     with col1:
         st.subheader("Settings")
-        user_id = st.number_input("User ID", min_value=0, max_value=99, value=42)
-        num_recs = st.slider("Number of Recommendations", 5, 20, 10)
-        method = st.selectbox(
-            "Recommendation Method",
-            ["Popularity (Phase 1)", "SVD (Phase 1)", "Item-Item (Phase 2)", "Ranker API (Phase 3)"]
-        )
-        
+        try: first = int(baselines(artifacts.baselines_stamp()).user_ids[0])
+        except (FileNotFoundError, ValueError, IndexError): first = 0
+        user_id = st.number_input("User ID", min_value=0, value=first, step=1)
+        num_recs = st.slider("Number of Recommendations", 5, 50, 10)
+        label = st.selectbox("Recommendation Method", list(METHODS))
+
         if st.button("Get Recommendations", type="primary"):
             st.session_state.get_recs = True
-    
+
     with col2:
         st.subheader("Recommendations")
-        
+
         if st.session_state.get("get_recs", False):
-            with st.spinner("Generating recommendations..."):
-                # Generate sample recommendations for demo
-                np.random.seed(user_id)
-                sample_items = np.random.choice(50, num_recs, replace=False)
-                sample_scores = np.random.uniform(0.6, 0.95, num_recs)
-                
-                rec_df = pd.DataFrame({
-                    'Rank': range(1, num_recs + 1),
-                    'Item ID': sample_items,
-                    'Score': sample_scores,
-                    'Method': method
-                })
-                
-                st.success(f"Found {num_recs} recommendations for User {user_id}")
-                st.dataframe(rec_df, use_container_width=True)
-                
-                # Show some stats
-                avg_score = sample_scores.mean()
-                st.metric("Average Score", f"{avg_score:.3f}")
-
-with tab3:
+            t = time.perf_counter()
+            try: df, source = recommend(METHODS[label], int(user_id), num_recs)
+            except (FileNotFoundError, ValueError) as e:
+                st.warning(f"{label} is not available yet: {e}"); return
+            if df is None: st.info(source); return
+            st.success(f"Found {len(df)} recommendations for User {user_id}")
+            st.dataframe(df, hide_index=True, use_container_width=True)
+            st.caption(f"{label} · {source} · {(time.perf_counter() - t) * 1e3:.1f} ms")
+
+def api_tab():
     st.header("📡 API Status")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("Service Health")
-        
-        # Mock API status for demo
-        services = [
-            ("Streamlit UI", "🟢 Online", "Serving requests"),
-            ("FastAPI Backend", "🟡 Demo Mode", "Limited functionality"),
-            ("Model Cache", "🟢 Ready", "Models loaded"),
-            ("Database", "🟡 Sample Data", "Using demo dataset")
-        ]
-        
-        for service, status, desc in services:
-            with st.container():
-                st.markdown(f"**{service}**: {status}")
-                st.caption(desc)
-                st.divider()
-    
-    with col2:
-        st.subheader("API Endpoints")
-        
-        endpoints = [
-            ("GET /health", "Health check"),
-            ("GET /recommend", "Get recommendations"),
-            ("POST /feedback", "Submit user feedback"),
-            ("GET /stats", "System statistics")
-        ]
-        
-        for endpoint, desc in endpoints:
-            st.code(f"curl http://localhost:8080{endpoint}")
-            st.caption(desc)
-            st.divider()
-
-with tab4:
+
+    st.caption(f"Live numbers from {API_BASE} (set API_BASE to point elsewhere)")
+    api = fetch_api(API_BASE)
+    if "error" in api:
+        st.error(f"API unreachable at {API_BASE}: {api['error']}. Start it with `uvicorn app.main:app --port 8080` in phases/phase4_serving.")
+    else:
+        health, stats, samples = api["health"], api["stats"], api["samples"]
+
+        def series(name):
+            return [(labels, value) for n, labels, value in samples if n == name]
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.subheader("Service Health")
+            loads = {l["artifact"]: v for l, v in series("recommender_artifact_load_seconds")}
+            for name, key, artifact in [("Ranker (Phase 3)", "artifacts", "ranker"), ("Top-K table (Phase 3)", "topk_table", "topk_table"),
+                                        ("Factors (Phase 1)", "factors", "factors"), ("Feature store (Phases 1-2)", "feature_store", "feature_store")]:
+                s = health.get(key, {})
+                st.markdown(f"**{name}**: {'🟢 Loaded' if s.get('loaded') else '🔴 Not loaded'}")
+                detail = []
+                if s.get("version"): detail.append(f"version {s['version']}" + (" (stale)" if s.get("current") is False else ""))
+                if artifact in loads: detail.append(f"loaded in {loads[artifact]:.3f}s")
+                if s.get("error"): detail.append(s["error"])
+                st.caption(" · ".join(detail) or "-")
+            rss = {l["kind"]: v for l, v in series("recommender_process_resident_bytes")}
+            mem = {l["artifact"]: v for l, v in series("recommender_artifact_bytes")}
+            m1, m2, m3 = st.columns(3)
+            m1.metric("RSS", f"{rss.get('current', 0) / 2**20:.0f} MB")
+            m2.metric("Peak RSS", f"{rss.get('peak', 0) / 2**20:.0f} MB")
+            m3.metric("Artifacts in memory", f"{sum(mem.values()) / 2**20:.1f} MB")
+            cache, batching = stats.get("cache", {}), stats.get("batching", {})
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Cache hit rate", f"{cache.get('hit_rate', 0):.1%}")
+            c2.metric("Cache entries", cache.get("size", 0))
+            c3.metric("Mean batch", batching.get("mean_batch", 0))
+
+        with col2:
+            st.subheader("Requests")
+            reqs = pd.DataFrame([{"route": l["route"], "status": l["status"], "count": int(v)} for l, v in series("recommender_http_requests_total")])
+            if len(reqs): st.dataframe(reqs.pivot_table(index="route", columns="status", values="count", aggfunc="sum", fill_value=0).astype(int), use_container_width=True)
+            else: st.info("No requests served yet")
+
+            st.subheader("recommend() stages")
+            buckets = {}
+            for l, v in series("recommender_stage_duration_seconds_bucket"):
+                buckets.setdefault((l["stage"], l["path"]), []).append((float("inf") if l["le"] == "+Inf" else float(l["le"]), v))
+            rows = [{"stage": stage, "path": path, "calls": int(max(v for _, v in b)),
+                     "p50 ms": round(histogram_quantile(0.5, b) * 1e3, 3), "p99 ms": round(histogram_quantile(0.99, b) * 1e3, 3)}
+                    for (stage, path), b in sorted(buckets.items()) if max(v for _, v in b) > 0]
+            if rows: st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+            else: st.info("No recommend() calls timed yet")
+
+    st.subheader("API Endpoints")
+    endpoints = [
+        ("GET /health", "Health check and loaded artifacts"),
+        ("GET /recommend?user_id=1&k=10", "Get recommendations"),
+        ("POST /recommend/batch", "Recommendations for many users"),
+        ("POST /events", "Record an interaction for online features"),
+        ("GET /stats", "Cache and batching counters"),
+        ("GET /metrics", "Prometheus metrics"),
+    ]
+    for endpoint, desc in endpoints:
+        method, path = endpoint.split(" ", 1)
+        st.code(f"curl {'-X POST ' if method == 'POST' else ''}'{API_BASE}{path}'")
+        st.caption(desc)
+
+def phase_tab():
     st.header("📦 Phase Status")
-    
-    # Mock phase status for demo
-    phases = {
-        "Phase 1: Baselines": {
-            "popularity_model": True,
-            "svd_model": True, 
-            "evaluation_metrics": True
-        },
-        "Phase 2: Candidates": {
-            "item_item_similarity": True,
-            "user_item_candidates": True,
-            "candidate_cache": False
-        },
-        "Phase 3: Ranking": {
-            "feature_engineering": True,
-            "model_training": True,
-            "model_evaluation": False
-        },
-        "Phase 4: Serving": {
-            "api_server": False,
-            "ui_interface": True,
-            "monitoring": False
-        }
-    }
-    
-    for phase_name, components in phases.items():
+
+    status = pd.DataFrame(artifacts.artifact_status())
+    for phase_name, rows in status.groupby("phase", sort=False):
         st.subheader(phase_name)
-        
-        cols = st.columns(len(components))
-        for i, (component, status) in enumerate(components.items()):
-            with cols[i]:
-                icon = "✅" if status else "❌"
-                color = "green" if status else "red"
-                st.markdown(f":{color}[{icon} {component.replace('_', ' ').title()}]")
-        
+        cols = st.columns(len(rows))
+        for col, r in zip(cols, rows.itertuples()):
+            with col:
+                st.markdown(f":{'green' if r.present else 'red'}[{'✅' if r.present else '❌'} {r.artifact}]")
+                st.caption(f"{r.MB} MB · {r.modified}" if r.present else "missing")
         st.divider()
 
-# Footer
-st.markdown("---")
-st.markdown("""
-<div style='text-align: center'>
-    <p>Built with ❤️ using Streamlit, FastAPI, and scikit-learn</p>
-    <p>📁 <a href='https://github.com/Aniwadkar/recommender-system' target='_blank'>View on GitHub</a></p>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+    run = artifacts.pipeline_run()
+    st.subheader("Last pipeline run")
+    if run is None: st.info("No run recorded yet: `python scripts/pipeline.py` from the repository root")
+    else:
+        st.caption(f"{run['started']} · {run['seconds']:.2f}s wall · " + ", ".join(f"{v} {k}" for k, v in run["counts"].items()))
+        st.dataframe(pd.DataFrame([{"stage": n, "status": s["status"], "seconds": s.get("seconds", s.get("last_seconds")),
+                                    "peak RSS MB": s.get("peak_rss_mb")} for n, s in run["stages"].items()]),
+                     hide_index=True, use_container_width=True)
+
+def main():
+    st.set_page_config(
+        page_title="Recommender System",
+        page_icon="🛍️",
+        layout="wide",
+    )
+    st.markdown(CSS, unsafe_allow_html=True)
+
+    # Title
+    st.title("🛍️ Multi-Phase Recommender System")
+    st.markdown("A clean, modular recommender system with baseline → candidates → ranking → serving pipeline")
+
+    # Tabs
+    tab1, tab2, tab3, tab4 = st.tabs(["🏠 Home", "🧠 Get Recommendations", "📡 API Status", "📦 Phase Status"])
+    with tab1: home_tab()
+    with tab2: recommendations_tab()
+    with tab3: api_tab()
+    with tab4: phase_tab()
+
+    # Footer
+    st.markdown("---")
+    st.markdown("""
+    <div style='text-align: center'>
+        <p>Built with ❤️ using Streamlit, FastAPI, and scikit-learn</p>
+        <p>📁 <a href='https://github.com/Aniwadkar/recommender-system' target='_blank'>View on GitHub</a></p>
+    </div>
+    """, unsafe_allow_html=True)
+
+if __name__ == "__main__":
+    main()
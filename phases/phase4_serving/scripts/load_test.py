@@ -0,0 +1,67 @@
+"""Concurrent load test for GET /recommend: throughput and p50/p99 latency with and without micro-batching.
+
+    python scripts/load_test.py --requests 3000 --concurrency 64               # in-process app, both modes
+    python scripts/load_test.py --url http://localhost:8080 --requests 3000    # a running server, as configured
+
+In-process runs drive the ASGI app through httpx on one event loop (no sockets) and switch the
+batcher between runs. The top-K table and the response cache are disabled for them (as in
+serve.py --measure), since either answers before a request reaches the batcher; the run fails if
+the batched mode did not actually batch. Against --url the server's own configuration applies.
+"""
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'phase1_baselines')))
+import argparse, asyncio, json, time, warnings
+import numpy as np, httpx
+from src.data.store import read_table
+
+async def run(client: httpx.AsyncClient, users: np.ndarray, n: int, concurrency: int, k: int) -> tuple[dict, dict]:
+    """n requests from `concurrency` concurrent clients; returns (summary, user_id -> items)"""
+    lat = np.zeros(n); answers = {}; nxt = iter(range(n))
+    async def client_loop():
+        for j in nxt:
+            u = int(users[j % len(users)]); t = time.perf_counter()
+            r = await client.get('/recommend', params={'user_id': u, 'k': k}); r.raise_for_status()
+            lat[j] = time.perf_counter() - t; answers[u] = r.json()['items']
+    t0 = time.perf_counter(); await asyncio.gather(*(client_loop() for _ in range(concurrency))); wall = time.perf_counter() - t0
+    return {'requests': n, 'concurrency': concurrency, 'seconds': round(wall, 3), 'throughput_rps': round(n / wall, 1),
+            'p50_ms': round(float(np.percentile(lat, 50)) * 1e3, 2), 'p99_ms': round(float(np.percentile(lat, 99)) * 1e3, 2)}, answers
+
+async def main(a):
+    users = np.unique(read_table(os.path.join(a.p3_dir, 'features.csv'))['user_id'].to_numpy())
+    users = np.random.default_rng(a.seed).choice(users, min(a.users, len(users)), replace=False)
+    if a.url:
+        async with httpx.AsyncClient(base_url=a.url, timeout=30, limits=httpx.Limits(max_connections=a.concurrency)) as client:
+            await run(client, users, min(a.requests, 100), a.concurrency, a.k)   # warm-up
+            res, _ = await run(client, users, a.requests, a.concurrency, a.k); print(json.dumps(res))
+        return
+    os.environ.setdefault('P3_DIR', a.p3_dir); os.environ.update(TOPK_TABLE='', CACHE_SIZE='0')   # every request scores through the batcher
+    import app.main as m
+    results = {}; answers = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url='http://test', timeout=30) as client:
+        for mode, window in (('unbatched', 0.0), ('batched', a.window_ms)):
+            m.batcher.window_ms, m.batcher.max_batch = window, a.max_batch
+            await run(client, users, min(a.requests, 100), a.concurrency, a.k)
+            before = m.batcher.status()
+            results[mode], answers[mode] = await run(client, users, a.requests, a.concurrency, a.k)
+            after = m.batcher.status(); batches = after['batches'] - before['batches']
+            results[mode]['mean_batch'] = round((after['requests'] - before['requests']) / batches, 2) if batches else 1.0
+            print(mode, json.dumps(results[mode]))
+    m.batcher.close()
+    if results['batched']['mean_batch'] <= 1.0:
+        sys.exit('batched run served one request per batch: nothing reached the micro-batcher concurrently, the comparison is meaningless')
+    same = sum(answers['batched'].get(u) == v for u, v in answers['unbatched'].items())
+    print(f"speedup {results['batched']['throughput_rps'] / results['unbatched']['throughput_rps']:.2f}x throughput; "
+          f"identical answers for {same}/{len(answers['unbatched'])} users")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--url', default=None, help='base URL of a running server (default: drive the app in-process)')
+    ap.add_argument('--p3-dir', default=os.environ.get('P3_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking', 'outputs')))
+    ap.add_argument('--requests', type=int, default=3000); ap.add_argument('--concurrency', type=int, default=64)
+    ap.add_argument('--users', type=int, default=1000, help='distinct users to cycle through'); ap.add_argument('--k', type=int, default=10)
+    ap.add_argument('--window-ms', type=float, default=2.0); ap.add_argument('--max-batch', type=int, default=64)
+    ap.add_argument('--seed', type=int, default=0); a = ap.parse_args()
+    warnings.simplefilter('ignore', DeprecationWarning)
+    asyncio.run(main(a))
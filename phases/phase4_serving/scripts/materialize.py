@@ -0,0 +1,30 @@
+"""Score every user's Phase 3 candidates once and write the top-K table the API memory-maps.
+
+    python scripts/materialize.py --k 100                  # -> ../phase3_ranking/outputs/topk.bin
+    python scripts/materialize.py --p3-dir /data/p3 --out /srv/topk.bin
+
+The table records the Phase 3 fingerprint (features + ranker) it was scored from; the API serves
+it only while that version is loaded, so rerun this after train_ranker.py / build_features.py.
+"""
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse, time
+from app.registry import load_snapshot, fingerprint
+from app.scoring import topk_arrays
+from app.topk import write_topk, TopKTable
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--p3-dir', default=os.environ.get('P3_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'phase3_ranking', 'outputs')))
+    ap.add_argument('--k', type=int, default=100, help='K_max: longest list the table can answer')
+    ap.add_argument('--out', default=None, help='table file (default: <p3-dir>/topk.bin)')
+    ap.add_argument('--batch-users', type=int, default=20000, help='users scored per predict_proba call'); a = ap.parse_args()
+    out = a.out or os.path.join(a.p3_dir, 'topk.bin'); t = time.perf_counter()
+    version = fingerprint(a.p3_dir)
+    if version is None: sys.exit(f'Phase 3 artifacts not found in {a.p3_dir}')
+    snap = load_snapshot(a.p3_dir, version); t_load = time.perf_counter() - t
+    items, scores, lens = topk_arrays(snap, a.k, a.batch_users); t_score = time.perf_counter() - t - t_load
+    write_topk(out, snap.user_ids, items, scores, lens, version); table = TopKTable(out)
+    print(f'Wrote {out}: {table.n_users} users x {table.k} ({table.nbytes() / 2**20:.1f} MB, version {version}); '
+          f'load {t_load:.2f}s, score {t_score:.2f}s, total {time.perf_counter() - t:.2f}s')
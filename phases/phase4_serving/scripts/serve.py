@@ -0,0 +1,135 @@
+"""Run the API as several worker processes that map one shared copy of the ranker artifacts.
+
+    python scripts/serve.py --workers 4 --port 8080     # prepare, publish, start the workers, follow new versions
+    python scripts/serve.py --prepare                   # only prepare and publish the current Phase 3 outputs
+    python scripts/serve.py --measure --workers 4       # per-worker memory and startup: private copies vs shared
+
+The supervisor prepares the Phase 3 outputs into --serving-dir (default <P3_DIR>/serving, layout
+in app/shared.py), points `current` at that version and starts `uvicorn app.main:app --workers N`
+with SERVING_DIR set. Each worker then maps the same files instead of building its own snapshot.
+While the workers run, the supervisor polls the Phase 3 fingerprint. Once a new version has been
+stable for one poll, it prepares it in a child process (so the supervisor stays small), flips
+`current` and prunes old versions. Workers keep answering from the old maps until their next
+check (ARTIFACT_CHECK_INTERVAL), then swap in one assignment, so a swap neither drops nor delays
+requests. POST /events reaches one worker, so the workers share events through
+<serving-dir>/events.csv (EVENTS_LOG): each appends the events it receives and applies the lines
+the others wrote before answering. Fold the file into the Phase 1 log with
+`scripts/ingest_delta.py --delta <serving-dir>/events.csv`, then delete it.
+
+--measure starts the workers twice, without and with SERVING_DIR. For each run it reports the
+time until the first and the last worker finished startup, and each worker's memory after
+--requests warm-up calls. Memory comes from /proc/<pid>/smaps_rollup: RSS, PSS (shared pages
+split between the processes mapping them) and USS (private pages only).
+"""
+from __future__ import annotations
+import sys, os
+HERE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(HERE)
+import argparse, json, signal, subprocess, threading, time, urllib.request
+import numpy as np
+from app.registry import fingerprint
+from app.shared import prepare, publish, prune, current_version
+
+def prepare_and_publish(p3_dir: str, serving_dir: str, keep: int) -> str | None:
+    os.makedirs(serving_dir, exist_ok=True); t = time.perf_counter()
+    version = prepare(p3_dir, serving_dir)
+    if version is None: return None
+    if version != current_version(serving_dir): publish(serving_dir, version)
+    gone = prune(serving_dir, keep)
+    print(f'[serve] {version} is current ({time.perf_counter() - t:.2f}s)' + (f', pruned {", ".join(gone)}' if gone else ''), flush=True)
+    return version
+
+def prepare_in_child(a) -> bool:
+    """Prepare and publish in a separate process, so loading the new version never grows the supervisor"""
+    r = subprocess.run([sys.executable, os.path.abspath(__file__), '--prepare', '--p3-dir', a.p3_dir, '--serving-dir', a.serving_dir, '--keep', str(a.keep)])
+    return r.returncode == 0
+
+def start_workers(a, shared: bool, port: int, env: dict | None = None, **popen) -> subprocess.Popen:
+    env = dict(os.environ, P3_DIR=a.p3_dir, ARTIFACT_CHECK_INTERVAL=str(a.check_interval), **(env or {}))
+    env.setdefault('EVENTS_LOG', os.path.join(a.serving_dir, 'events.csv'))   # POST /events state shared by the workers
+    if shared: env['SERVING_DIR'] = a.serving_dir
+    else: env.pop('SERVING_DIR', None)
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', a.host, '--port', str(port), '--workers', str(a.workers)],
+                            cwd=HERE, env=env, **popen)
+
+def supervise(a) -> int:
+    if not prepare_in_child(a) or current_version(a.serving_dir) is None: sys.exit(f'No Phase 3 artifacts to serve in {a.p3_dir}')
+    proc = start_workers(a, True, a.port)
+    for sig in (signal.SIGINT, signal.SIGTERM): signal.signal(sig, lambda *_: proc.terminate())
+    seen = fingerprint(a.p3_dir); failed = None
+    while proc.poll() is None:
+        time.sleep(a.check_interval); v = fingerprint(a.p3_dir)
+        stable = v == seen; seen = v
+        if v is None or not stable or v == current_version(a.serving_dir) or v == failed: continue
+        print(f'[serve] new Phase 3 version {v}, preparing', flush=True)
+        if prepare_in_child(a): failed = None
+        else: failed = v; print(f'[serve] preparing {v} failed; still serving {current_version(a.serving_dir)}', flush=True)
+    return proc.wait()
+
+def worker_pids(parent: int) -> list[int]:
+    """uvicorn's worker processes: the children of its main process started by multiprocessing"""
+    pids = []
+    for d in os.listdir('/proc'):
+        if not d.isdigit(): continue
+        try:
+            ppid = int(open(f'/proc/{d}/stat').read().rsplit(')', 1)[1].split()[1]); cmd = open(f'/proc/{d}/cmdline', 'rb').read()
+        except (OSError, IndexError, ValueError): continue
+        if ppid == parent and b'spawn_main' in cmd and b'resource_tracker' not in cmd: pids.append(int(d))
+    return sorted(pids)
+
+def memory_mb(pid: int) -> dict:
+    """RSS, PSS and USS of a process in MB, from /proc/<pid>/smaps_rollup"""
+    kb = {}
+    for line in open(f'/proc/{pid}/smaps_rollup'):
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB': kb[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss_mb': round(kb['Rss'] / 1024, 1), 'pss_mb': round(kb['Pss'] / 1024, 1),
+            'uss_mb': round((kb['Private_Clean'] + kb['Private_Dirty']) / 1024, 1)}
+
+def measure(a, shared: bool, users: np.ndarray, port: int) -> dict:
+    """Start N workers, time their startup, warm them up with /recommend calls and read each one's memory"""
+    t0 = time.perf_counter(); ready = []
+    # the top-K table and response cache are off, so the warm-up calls score from the snapshot each worker holds
+    proc = start_workers(a, shared, port, env={'TOPK_TABLE': '', 'CACHE_SIZE': '0'}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    def read_log():
+        for line in proc.stderr:
+            if 'Application startup complete' in line: ready.append(time.perf_counter() - t0)
+    threading.Thread(target=read_log, daemon=True).start()
+    try:
+        while len(ready) < a.workers:
+            if proc.poll() is not None or time.perf_counter() - t0 > a.timeout: raise RuntimeError(f'workers did not start (exit {proc.poll()})')
+            time.sleep(0.05)
+        rng = np.random.default_rng(0)
+        for u in rng.choice(users, a.requests):   # a new connection per call, so the calls spread over the workers
+            urllib.request.urlopen(f'http://{a.host}:{port}/recommend?user_id={int(u)}&k=10', timeout=30).read()
+        mem = [{'pid': p, **memory_mb(p)} for p in worker_pids(proc.pid)]
+    finally:
+        proc.terminate(); proc.wait(30)
+    mean = lambda k: round(float(np.mean([m[k] for m in mem])), 1) if mem else None
+    return {'mode': 'shared' if shared else 'private', 'workers': a.workers, 'first_ready_s': round(ready[0], 2), 'all_ready_s': round(ready[-1], 2),
+            'mean_rss_mb': mean('rss_mb'), 'mean_pss_mb': mean('pss_mb'), 'mean_uss_mb': mean('uss_mb'),
+            'total_pss_mb': round(sum(m['pss_mb'] for m in mem), 1), 'per_worker': mem}
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--p3-dir', default=os.environ.get('P3_DIR', os.path.join(HERE, '..', 'phase3_ranking', 'outputs')))
+    ap.add_argument('--serving-dir', default=None, help='prepared versions and the current link (default: <p3-dir>/serving)')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1); ap.add_argument('--host', default='127.0.0.1'); ap.add_argument('--port', type=int, default=8080)
+    ap.add_argument('--check-interval', type=float, default=5.0, help='seconds between version checks (supervisor and workers)')
+    ap.add_argument('--keep', type=int, default=2, help='prepared versions kept on disk')
+    ap.add_argument('--prepare', action='store_true', help='prepare and publish the current Phase 3 outputs, then exit')
+    ap.add_argument('--measure', action='store_true', help='compare private and shared workers, then exit')
+    ap.add_argument('--requests', type=int, default=200, help='--measure: warm-up /recommend calls before reading memory')
+    ap.add_argument('--timeout', type=float, default=600, help='--measure: seconds to wait for the workers to start')
+    ap.add_argument('--out', default=None, help='--measure: JSON file for the results'); a = ap.parse_args()
+    a.p3_dir = os.path.abspath(a.p3_dir); a.serving_dir = os.path.abspath(a.serving_dir or os.path.join(a.p3_dir, 'serving'))
+    if a.prepare: sys.exit(0 if prepare_and_publish(a.p3_dir, a.serving_dir, a.keep) else f'No Phase 3 artifacts in {a.p3_dir}')
+    if not a.measure: sys.exit(supervise(a))
+    if prepare_and_publish(a.p3_dir, a.serving_dir, a.keep) is None: sys.exit(f'No Phase 3 artifacts in {a.p3_dir}')
+    users = np.load(os.path.join(a.serving_dir, 'current', 'user_ids.npy'))
+    res = [measure(a, shared, users, a.port + j) for j, shared in enumerate((False, True))]
+    print(f"{'mode':<8} {'workers':>7} {'first ready':>11} {'all ready':>9} {'RSS/worker':>10} {'PSS/worker':>10} {'USS/worker':>10} {'total PSS':>9}")
+    for r in res:
+        print(f"{r['mode']:<8} {r['workers']:>7} {r['first_ready_s']:>10.2f}s {r['all_ready_s']:>8.2f}s {r['mean_rss_mb']:>8.1f}MB "
+              f"{r['mean_pss_mb']:>8.1f}MB {r['mean_uss_mb']:>8.1f}MB {r['total_pss_mb']:>7.1f}MB")
+    if a.out: json.dump(res, open(a.out, 'w'), indent=2); print('Wrote', a.out)
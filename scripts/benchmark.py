@@ -0,0 +1,170 @@
+"""Time every pipeline stage and record its peak memory at several synthetic scales; compare runs.
+
+    python scripts/benchmark.py --scales 10k 1m --out bench.json           # run, write JSON results
+    python scripts/benchmark.py --scales 10k --skew 1.1 --baseline bench.json   # run and flag regressions
+    python scripts/benchmark.py --compare bench.json new.json              # compare two stored runs
+
+Each scale generates its log with make_synthetic.generate() in a scratch copy of phases/ (code
+only), then runs the stages as separate processes, in pipeline order: generate, split, popularity,
+svd, item_item, user_to_item, features, train_ranker, eval, eval_ranker, recommend. A stage's
+peak memory is the high-water RSS of its own process (VmHWM, read as it exits; os.wait4's
+ru_maxrss where /proc is missing, which also counts the benchmark's own RSS at spawn); worker
+processes a stage forks are not included. `recommend` times sequential GET /recommend calls
+through FastAPI's TestClient, with the response cache and micro-batching off.
+A regression is a metric that grew by more than --threshold (relative) and by more than a small
+absolute floor, so sub-millisecond noise at the smallest scale is not flagged.
+"""
+from __future__ import annotations
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+import argparse, json, platform, shutil, subprocess, tempfile, time
+import numpy as np
+
+# interactions before (user, item) dedup = n_users * n_items * density
+SCALES = {'10k': dict(n_users=2_000, n_items=1_000, density=0.005),
+          '1m': dict(n_users=100_000, n_items=20_000, density=0.0005),
+          '50m': dict(n_users=2_000_000, n_items=100_000, density=0.00025)}
+STAGES = ('generate', 'split', 'popularity', 'svd', 'item_item', 'user_to_item', 'features', 'train_ranker', 'eval', 'eval_ranker', 'recommend')
+# metric -> absolute growth below which a change is noise
+METRICS = {'seconds': 0.05, 'peak_rss_mb': 10.0, 'p50_ms': 0.2, 'p99_ms': 1.0}
+# runs a script as __main__ and reports the process's own peak RSS on the way out
+RUNNER = ("import os, runpy, sys\n"
+          "sys.argv = sys.argv[1:]; sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))\n"
+          "try: runpy.run_path(sys.argv[0], run_name='__main__')\n"
+          "finally:\n"
+          "    try: hwm = [l for l in open('/proc/self/status') if l.startswith('VmHWM:')][0].split()[1]\n"
+          "    except (OSError, IndexError): hwm = None\n"
+          "    if hwm: print('BENCH {\"peak_rss_mb\": %.1f}' % (int(hwm) / 1024), flush=True)\n")
+
+def stage_commands(name: str, scale: dict, a) -> tuple[str, list[str]]:
+    """(working directory under phases/, argv) of one stage"""
+    py = sys.executable; me = os.path.abspath(__file__)
+    p2 = '../phase2_candidates/outputs'
+    return {
+        'generate': ('phase1_baselines', [py, 'scripts/make_synthetic.py', '--n_users', str(scale['n_users']), '--n_items', str(scale['n_items']),
+                                          '--density', str(scale['density']), '--seed', str(a.seed)] + (['--skew', str(a.skew)] if a.skew is not None else [])),
+        'split': ('phase1_baselines', [py, me, '--run-stage', 'split']),
+        'popularity': ('phase1_baselines', [py, 'scripts/run_popularity.py']),
+        'svd': ('phase1_baselines', [py, 'scripts/run_mf_svd.py']),
+        'item_item': ('phase2_candidates', [py, 'scripts/build_item_item.py']),
+        'user_to_item': ('phase2_candidates', [py, 'scripts/build_user_to_item.py']),
+        'features': ('phase3_ranking', [py, 'scripts/build_features.py', '--interactions', '../phase1_baselines/data/raw/interactions.csv',
+                                        '--item-item', f'{p2}/item_item_candidates.json', '--user2item', f'{p2}/user_to_item_candidates.json']),
+        'train_ranker': ('phase3_ranking', [py, 'scripts/train_ranker.py']),
+        'eval': ('phase1_baselines', [py, 'scripts/evaluate.py']),
+        'eval_ranker': ('phase3_ranking', [py, 'scripts/eval_ranker.py']),
+        'recommend': ('phase4_serving', [py, me, '--run-stage', 'recommend', '--requests', str(a.requests), '--seed', str(a.seed)]),
+    }[name]
+
+def run_stage(cwd: str, argv: list[str]) -> dict:
+    """Wall time and peak RSS of one stage process, plus any BENCH {...} line it prints"""
+    env = dict(os.environ, CACHE_SIZE='0', BATCH_WINDOW_MS='0', PYTHONWARNINGS='ignore')
+    t = time.perf_counter()
+    proc = subprocess.Popen([argv[0], '-c', RUNNER] + argv[1:], cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    out = proc.stdout.read(); _, status, ru = os.wait4(proc.pid, 0); dt = time.perf_counter() - t
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    rss = ru.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)   # bytes on macOS, KiB on Linux
+    r = {'seconds': round(dt, 3), 'peak_rss_mb': round(rss / 2**20, 1)}
+    for line in out.splitlines():
+        if line.startswith('BENCH '): r.update(json.loads(line[6:]))
+    if proc.returncode: r['error'] = ([l for l in out.splitlines() if l.strip() and not l.startswith('BENCH ')] or [f'killed by signal {-proc.returncode}' if proc.returncode < 0 else f'exit code {proc.returncode}'])[-1]
+    return r
+
+def stage_split():
+    """Id mapping and leave-last-one-out split of the raw log (what every Phase 1 script starts with)"""
+    sys.path.append(os.getcwd())
+    from src.data.store import read_interactions
+    from src.data.splits import build_mappings, leave_last_one_out
+    df = read_interactions('data/raw/interactions.csv', mmap=False); t = time.perf_counter()
+    mapped, u2i, i2i = build_mappings(df); train, test = leave_last_one_out(mapped)
+    print('BENCH ' + json.dumps({'rows': len(df), 'users': len(u2i), 'items': len(i2i), 'compute_seconds': round(time.perf_counter() - t, 3)}))
+
+def stage_recommend(n_requests: int, seed: int):
+    """Latency of sequential GET /recommend calls through the TestClient (artifact load counted separately)"""
+    import warnings; warnings.simplefilter('ignore')
+    sys.path.append(os.getcwd())
+    from fastapi.testclient import TestClient
+    import app.main as m
+    t = time.perf_counter()
+    with TestClient(m.app) as client:
+        startup = time.perf_counter() - t; snap = m.registry.get()
+        users = np.random.default_rng(seed).choice(snap.user_ids, n_requests)
+        for u in users[:min(50, n_requests)]: client.get('/recommend', params={'user_id': int(u)})   # warm-up
+        lat = np.empty(n_requests)
+        for j, u in enumerate(users):
+            t = time.perf_counter(); client.get('/recommend', params={'user_id': int(u)}).raise_for_status(); lat[j] = time.perf_counter() - t
+    print('BENCH ' + json.dumps({'startup_seconds': round(startup, 3), 'requests': n_requests, 'p50_ms': round(float(np.percentile(lat, 50)) * 1e3, 3),
+                                 'p99_ms': round(float(np.percentile(lat, 99)) * 1e3, 3), 'mean_ms': round(float(lat.mean()) * 1e3, 3)}))
+
+def run_scale(name: str, a) -> dict:
+    scale = SCALES[name]; work = tempfile.mkdtemp(prefix=f'bench_{name}_', dir=a.workdir)
+    # code only: each phase's data/ and outputs/ are left behind (src/data is code)
+    skip = lambda d, names: [n for n in names if n in ('__pycache__', '.pytest_cache') or
+                             (n in ('data', 'outputs') and os.path.basename(os.path.dirname(d)) == 'phases')]
+    shutil.copytree(os.path.join(ROOT, 'phases'), os.path.join(work, 'phases'), ignore=skip)
+    res = {'scale': name, **scale, 'skew': a.skew, 'stage_args': {k: ' '.join(v) for k, v in a.stage_args.items()}, 'stages': {}}
+    print(f'== {name}: {scale} (workspace {work})')
+    try:
+        for st in a.stages:
+            cwd, argv = stage_commands(st, scale, a); argv += a.stage_args.get(st, [])
+            r = res['stages'][st] = run_stage(os.path.join(work, 'phases', cwd), argv)
+            print(f"  {st:<13} {r['seconds']:>9.3f}s {r['peak_rss_mb']:>9.1f} MB" + (f"  ERROR {r['error']}" if 'error' in r else '')
+                  + (f"  p50 {r['p50_ms']}ms p99 {r['p99_ms']}ms" if 'p50_ms' in r else ''))
+        if 'split' in res['stages']: res['interactions'] = res['stages']['split'].get('rows')
+    finally:
+        if not a.keep: shutil.rmtree(work, ignore_errors=True)
+    return res
+
+def environment() -> dict:
+    try: commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: commit = None
+    import pandas, scipy, sklearn
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pandas.__version__, 'scipy': scipy.__version__, 'sklearn': sklearn.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+def compare(base: dict, new: dict, threshold: float) -> list[str]:
+    """Print metric changes per (scale, stage); returns the regressions"""
+    old = {(r['scale'], s): v for r in base['results'] for s, v in r['stages'].items()}; bad = []
+    conf = lambda r: {k: r.get(k) for k in ('n_users', 'n_items', 'density', 'skew', 'stage_args')}
+    base_conf = {r['scale']: conf(r) for r in base['results']}
+    for r in new['results']:
+        if r['scale'] in base_conf and base_conf[r['scale']] != conf(r): print(f"note: {r['scale']} ran with {conf(r)}, baseline with {base_conf[r['scale']]}")
+    print(f"{'scale':<5} {'stage':<13} {'metric':<12} {'baseline':>10} {'new':>10} {'change':>8}")
+    for r in new['results']:
+        for s, v in r['stages'].items():
+            b = old.get((r['scale'], s))
+            if b is None or 'error' in v or 'error' in b: continue
+            for m, floor in METRICS.items():
+                if m not in v or m not in b: continue
+                rel = v[m] / b[m] - 1 if b[m] else 0.0; regressed = rel > threshold and v[m] - b[m] > floor
+                line = f"{r['scale']:<5} {s:<13} {m:<12} {b[m]:>10} {v[m]:>10} {rel:>+8.1%}" + ('  REGRESSION' if regressed else '')
+                print(line)
+                if regressed: bad.append(line)
+    print(f'{len(bad)} regression(s) above {threshold:.0%}' if bad else f'no regressions above {threshold:.0%}')
+    return bad
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--scales', nargs='+', default=['10k', '1m'], choices=list(SCALES))
+    ap.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES, help='subset to run (later stages need earlier outputs)')
+    ap.add_argument('--skew', type=float, default=None, help='power-law exponent of item popularity (default: make_synthetic default)')
+    ap.add_argument('--seed', type=int, default=42); ap.add_argument('--requests', type=int, default=1000, help='/recommend calls timed')
+    ap.add_argument('--out', default=None, help='JSON file for the results')
+    ap.add_argument('--baseline', default=None, help='stored results to compare this run against')
+    ap.add_argument('--compare', nargs=2, metavar=('BASELINE', 'NEW'), help='only compare two stored result files')
+    ap.add_argument('--threshold', type=float, default=0.2, help='relative growth flagged as a regression')
+    ap.add_argument('--stage-args', nargs='+', default=[], metavar='STAGE=ARGS',
+                    help="extra arguments for a stage's script, e.g. user_to_item='--mode lsh' svd='--algo als'")
+    ap.add_argument('--workdir', default=None, help='where scratch workspaces go (default: system temp)')
+    ap.add_argument('--keep', action='store_true', help='keep the scratch workspaces')
+    ap.add_argument('--run-stage', choices=['split', 'recommend'], help=argparse.SUPPRESS); a = ap.parse_args()
+    a.stage_args = {k: v.split() for k, v in (x.split('=', 1) for x in a.stage_args)}
+    if a.run_stage == 'split': stage_split(); sys.exit(0)
+    if a.run_stage == 'recommend': stage_recommend(a.requests, a.seed); sys.exit(0)
+    if a.compare:
+        sys.exit(1 if compare(json.load(open(a.compare[0])), json.load(open(a.compare[1])), a.threshold) else 0)
+    results = {'environment': environment(), 'results': [run_scale(s, a) for s in a.scales]}
+    if a.out: json.dump(results, open(a.out, 'w'), indent=2); print('Wrote', a.out)
+    if a.baseline: sys.exit(1 if compare(json.load(open(a.baseline)), results, a.threshold) else 0)
+    sys.exit(1 if any('error' in v for r in results['results'] for v in r['stages'].values()) else 0)
@@ -0,0 +1,390 @@
+"""Fold a delta of new interactions into every phase's outputs without rebuilding from scratch.
+
+    python scripts/ingest_delta.py --init                           # build the state once from the current log
+    python scripts/ingest_delta.py --delta new.csv [more.csv ...]   # append, then update what the delta touches
+    python scripts/ingest_delta.py --delta new.csv --verify         # ... and compare against a full rebuild
+
+The state directory keeps what a full build would otherwise recompute from the whole log: id
+mappings (codes only ever grow), each user's last interactions, the train CSR, item counts and
+the Phase 2 lists in code space. A delta then recomputes the item-item rows of the items it
+touches and only patches their new scores into the stored top-k of co-occurring items (same for
+user-user Jaccard neighbours), recomputes the candidate lists of users whose neighbourhood
+changed, and the feature rows of users whose candidates or labels can have changed. The outputs
+are identical to running the Phase 1-3 scripts on the appended log (--verify checks it), and
+meta.json and the id maps follow the new user/item counts. SVD/ALS factors and the ranker are not
+retrained: factor outputs (recs_<algo>.npy, factors_<algo>, ann_<algo>) on a different id
+mapping are removed, so the pipeline rebuilds them and the UI reports them missing.
+
+Outputs are written as .npy only unless --format csv/both asks for the text exports. The features
+table is then updated in place: rows of touched users whose row count is unchanged are patched,
+and only the rows from the first user whose count changed onward are rewritten.
+
+Deltas are checked (required columns, no empty values, integer ids and timestamps) before anything
+is written. The state is saved to a sibling directory and renamed into place, and records how many
+log rows it has folded: rows an interrupted run appended to the log are folded by the next run.
+"""
+from __future__ import annotations
+import sys, os
+PHASES = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phases'))
+for p in ('phase1_baselines', 'phase2_candidates', 'phase2_candidates/scripts', 'phase3_ranking'): sys.path.append(os.path.join(PHASES, p))
+import argparse, json, shutil, time
+import numpy as np, pandas as pd
+from scipy import sparse
+from src.data.store import (CandidateIndex, read_interactions, read_table, write_table, append_table, read_candidates,
+                            write_candidates, save_csr, load_csr, save_arrays, load_arrays, save_ids, load_columns,
+                            update_table, binary_source, MANIFEST)
+from src.data.splits import leave_last_one_out, to_csr, build_mappings
+from src.data.incremental import extend_ids, id_rank, append_csr, pad_rows, take_rows, replace_rows, merge_topk, changed_rows, HoldoutState
+from src.models.baselines.popularity import rank_items, recommend_popular
+from src.features.registry import (FEATURES, ITEM_FEATURES, DEFAULT_FEATURES, N_RECENT, N_NEIGHBORS as N_ITEM_NEIGHBORS,
+                                   FeatureContext, neighbor_arrays, build_context, generate_candidates,
+                                   build_features, popular_items)
+from build_item_item import item_item_sims, sims_topk, item_item_index
+from build_user_to_item import N_NEIGHBORS, rank_topk, jaccard_rows, candidate_rows, user_to_item_index
+
+P1 = os.path.join(PHASES, 'phase1_baselines'); P2 = os.path.join(PHASES, 'phase2_candidates', 'outputs')
+P3 = os.path.join(PHASES, 'phase3_ranking', 'outputs')
+LISTS = ('ii', 'nb', 'u2i')   # item-item, user-user neighbours, user-to-item candidates (CSR-style, code space)
+CSRS = ('train', 'X', 'XT')   # train user x item weights, item x user and user x item interaction counts
+
+class Timer:
+    def __init__(self): self.t = time.perf_counter(); self.stages = {}
+    def __call__(self, name: str):
+        now = time.perf_counter(); self.stages[name] = round(now - self.t, 3); self.t = now
+        print(f'  {name:<14} {self.stages[name]:8.3f}s')
+
+def _ones(n: int): return np.ones(n, dtype=np.float32)
+
+def _binary(m: sparse.csr_matrix) -> sparse.csr_matrix:
+    b = m.copy(); b.data[:] = 1; return b
+
+def _blocks(fn, rows: np.ndarray, block_size: int):
+    """fn over row blocks, stacked into one CSR-style (indptr, cols, vals)"""
+    return _stack([fn(rows[s:s + block_size]) for s in range(0, len(rows), block_size)])
+
+def _stack(parts):
+    if not parts: return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indptr = np.concatenate([[0], np.cumsum(np.concatenate([np.diff(p[0]) for p in parts]))]).astype(np.int64)
+    return indptr, np.concatenate([p[1] for p in parts]).astype(np.int64), np.concatenate([p[2] for p in parts])
+
+class State:
+    """Incremental state; every array is indexed by append-only user/item codes"""
+    def __init__(self, arrays: dict, meta: dict):
+        self.a = arrays; self.meta = meta
+
+    @property
+    def user_ids(self): return self.a['user_ids']
+    @property
+    def item_ids(self): return self.a['item_ids']
+
+    def lists(self, name: str): return self.a[f'{name}_indptr'], self.a[f'{name}_idx'], self.a[f'{name}_val']
+
+    def set_lists(self, name: str, lists):
+        self.a[f'{name}_indptr'], self.a[f'{name}_idx'], self.a[f'{name}_val'] = lists
+
+    @property
+    def hold(self) -> HoldoutState:
+        return HoldoutState(self.a['count'], self.a['recent'], self.a['recent_ts'], self.a['recent_w'])
+
+    def save(self, d: str):
+        """Write to a sibling directory, then swap it in: d always holds one complete state (or, after a crash
+        between the two renames, none, and the next run rebuilds it from the log)"""
+        tmp, old = f'{d}.tmp{os.getpid()}', f'{d}.old{os.getpid()}'; shutil.rmtree(tmp, ignore_errors=True)
+        for n in CSRS: save_csr(self.a[n], os.path.join(tmp, n))
+        save_arrays(os.path.join(tmp, 'arrays'), {k: v for k, v in self.a.items() if k not in CSRS}, **self.meta)
+        if os.path.isdir(d): os.rename(d, old)
+        os.rename(tmp, d); shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, d: str) -> 'State':
+        arrays, meta = load_arrays(os.path.join(d, 'arrays'), mmap=False); meta.pop('arrays')
+        for n in CSRS: arrays[n] = load_csr(os.path.join(d, n), mmap=False).copy()
+        return cls(arrays, meta)
+
+def check_delta(df: pd.DataFrame, log: str) -> pd.DataFrame:
+    """df with a weight column; ValueError unless ids and timestamps are non-null integers the log's columns can hold"""
+    missing = [c for c in ('user_id', 'item_id', 'timestamp') if c not in df.columns]
+    if missing: raise ValueError(f'missing columns {missing}')
+    if 'weight' not in df.columns: df = df.assign(weight=1.0)
+    for c in ('user_id', 'item_id', 'timestamp', 'weight'):
+        n = int(df[c].isna().sum())
+        if n: raise ValueError(f'{n} empty {c} values')
+        if not (pd.api.types.is_integer_dtype(df[c]) if c != 'weight' else pd.api.types.is_numeric_dtype(df[c])):
+            raise ValueError(f'{c} must be {"numeric" if c == "weight" else "integers"}, got {df[c].dtype}')
+    d = binary_source(log); cols = load_columns(d) if d else {}
+    for c in ('user_id', 'item_id', 'timestamp'):
+        dt = cols[c].dtype if c in cols else np.dtype(np.int64); info = np.iinfo(dt) if dt.kind in 'iu' else None
+        if info is not None and len(df) and (df[c].min() < info.min or df[c].max() > info.max):
+            raise ValueError(f'{c} outside the range of the log column ({dt})')
+    return df
+
+def log_rows(log: str) -> int:
+    """Rows in the log, counted in the form readers load (binary manifest, else the CSV lines)"""
+    d = binary_source(log)
+    if d: return int(json.load(open(os.path.join(d, MANIFEST)))['n_rows'])
+    with open(log, 'rb') as f: return sum(1 for _ in f) - 1
+
+def fold(st: State, df: pd.DataFrame, t: Timer) -> dict:
+    """Apply the interactions in df to st; returns what was touched (codes) for the output stages"""
+    a, meta = st.a, st.meta
+    u, a['user_ids'] = extend_ids(a['user_ids'], df['user_id'].to_numpy())
+    i, a['item_ids'] = extend_ids(a['item_ids'], df['item_id'].to_numpy())
+    nU, nI = len(a['user_ids']), len(a['item_ids']); ts = df['timestamp'].to_numpy().astype(np.int64)
+    w = df['weight'].to_numpy() if 'weight' in df.columns else _ones(len(df))
+    # Phase 1: held-out rows, train CSR, counts
+    hold = st.hold; add, sub = hold.update(u, i, ts, w, nU)
+    a['count'], a['recent'], a['recent_ts'], a['recent_w'] = hold.count, hold.items, hold.ts, hold.weight
+    a['train'] = append_csr(append_csr(a['train'], *add, shape=(nU, nI)), sub[0], sub[1], -np.asarray(sub[2]))
+    a['train_pop'] = pad_rows(a['train_pop'], nI, 0) + np.bincount(add[1], minlength=nI) - np.bincount(sub[1], minlength=nI)
+    a['item_pop'] = pad_rows(a['item_pop'], nI, 0) + np.bincount(i, minlength=nI)
+    t_max_old = int(a['t_max']); last = pad_rows(a['item_last_ts'], nI, int(ts.min()))
+    np.maximum.at(last, i, ts); a['item_last_ts'] = last; a['t_max'] = np.int64(max(t_max_old, int(ts.max())))
+    t('phase1')
+    # Phase 2 item-item: touched items get new rows; every other item only has new scores against them
+    a['X'] = append_csr(a['X'], i, u, _ones(len(i)), (nI, nU)); a['XT'] = append_csr(a['XT'], u, i, _ones(len(i)), (nU, nI))
+    X, XT = a['X'], a['XT']; Xb, XbT = _binary(X), _binary(XT); T = np.unique(i)
+    norms = pad_rows(a['norms'], nI, 0.0); XTt = X[T]
+    norms[T] = np.sqrt(np.asarray(XTt.multiply(XTt).sum(axis=1), dtype=np.float64).ravel()); a['norms'] = norms
+    item_rank = id_rank(a['item_ids']); bs, k = meta['block_size'], meta['topk']; old = st.lists('ii')
+    new, ii_rows, n_redo = refresh(old, nI, T, lambda r: item_item_sims(X, XT, Xb, XbT, norms, r, meta['min_cooc']),
+                                lambda m, r: sims_topk(m, r, k, item_rank), k, item_rank, bs)
+    st.set_lists('ii', new); R = changed_rows(old, new, ii_rows, N_ITEM_NEIGHBORS); t('item_item')
+    # Phase 2 user-to-item: same for Jaccard neighbours, then candidates of users whose neighbours changed
+    U = np.unique(u); B, BT = XbT, Xb; size = np.diff(B.indptr).astype(np.float32); user_rank = id_rank(a['user_ids'])
+    old = st.lists('nb')
+    new, nb_rows, n_redo_u = refresh(old, nU, U, lambda r: jaccard_rows(B, BT, size, r),
+                                  lambda m, r: rank_topk(m, N_NEIGHBORS, r, user_rank, drop_self=True), N_NEIGHBORS, user_rank, bs)
+    st.set_lists('nb', new); N = sparse.csr_matrix((_ones(len(new[1])), new[1], new[0]), shape=(nU, nU))
+    C = np.union1d(np.union1d(U, changed_rows(old, new, nb_rows)), np.flatnonzero(N[:, U].getnnz(axis=1)))
+    old = st.lists('u2i'); new = replace_rows(old, nU, C, _blocks(lambda r: candidate_rows(B, N, r, meta['u2i_topk'], item_rank), C, bs))
+    st.set_lists('u2i', new); A = changed_rows(old, new, C); t('user_to_item')
+    print(f'  item rows: {len(T)} recomputed, {len(ii_rows) - len(T)} merged ({n_redo} redone); user rows: {len(U)} recomputed, '
+          f'{len(nb_rows) - len(U)} merged ({n_redo_u} redone), {len(C)} candidate lists')
+    return {'U': U, 'A': A, 'T': T, 'R': R, 't_max_changed': int(a['t_max']) != t_max_old, 'Xb': Xb}
+
+def refresh(lists, n_rows: int, touched: np.ndarray, scores, topk, k: int, col_rank: np.ndarray, block_size: int):
+    """Top-k lists after the scores of the touched rows (and, by symmetry, columns) changed.
+
+    Touched rows are recomputed from scores(rows) (a len(rows) x n_rows CSR); any other row that
+    scores against a touched one gets those entries patched in with merge_topk, and is recomputed
+    only when the merge cannot prove its list exact. Returns (lists, rows updated, rows recomputed).
+    """
+    stale = np.zeros(n_rows, dtype=bool); stale[touched] = True; parts, tr = [], []
+    for s in range(0, len(touched), block_size):
+        r = touched[s:s + block_size]; m = scores(r); keep = ~stale[m.indices]
+        tr.append((m.indices[keep].astype(np.int64), np.repeat(r, np.diff(m.indptr))[keep], m.data[keep])); parts.append(topk(m, r))
+    rows, cols, vals = (np.concatenate(x) for x in zip(*tr)) if tr else (np.zeros(0, dtype=np.int64),) * 3
+    M = np.unique(rows); merged, exact = merge_topk(lists, M, stale, (np.searchsorted(M, rows), cols, vals), k, col_rank)
+    out = replace_rows(replace_rows(lists, n_rows, touched, _stack(parts)), n_rows, M, merged)
+    redo = M[~exact]
+    if len(redo): out = replace_rows(out, n_rows, redo, _blocks(lambda r: topk(scores(r), r), redo, block_size))
+    return out, np.union1d(touched, M), len(redo)
+
+def raw_index(st: State, name: str, keys: str, values: str) -> CandidateIndex:
+    """CandidateIndex over raw ids, in sorted key order, of one code-space list"""
+    ids = st.a[keys]; perm = np.argsort(ids, kind='stable'); ptr, idx, _ = st.lists(name)
+    ptr, items = take_rows((ptr, st.a[values][idx].astype(np.int64)), perm)
+    return CandidateIndex(ids[perm].astype(np.int64), ptr, items)
+
+def feature_context(st: State, users: np.ndarray, nn: tuple, Xb=None) -> FeatureContext:
+    """FeatureContext for the given user codes in the sorted-id code space a full build_context uses"""
+    a = st.a; perm = np.argsort(a['item_ids'], kind='stable'); item_rank = id_rank(a['item_ids']); nI = len(perm)
+    users = users[np.argsort(a['user_ids'][users], kind='stable')]; rec = a['recent'][users]; valid = rec >= 0
+    pos = np.repeat(np.arange(len(users)), valid.sum(axis=1)); recent_items = item_rank[rec[valid]]
+    recent_offsets = np.concatenate(([0], np.cumsum(valid.sum(axis=1)))).astype(np.int64)
+    return FeatureContext(a['user_ids'][users].astype(np.int64), a['item_ids'][perm].astype(np.int64), a['item_pop'][perm],
+                          a['item_last_ts'][perm], int(a['t_max']), a['count'][users], recent_offsets, recent_items,
+                          np.sort(pos.astype(np.int64) * nI + recent_items), np.arange(len(users), dtype=np.int64) * nI + item_rank[rec[:, -1]],
+                          *nn, item_user=None if Xb is None else Xb[perm])
+
+def affected_users(st: State, touched: dict, old: dict, fallback_changed: bool) -> np.ndarray:
+    """User codes whose feature rows can differ after the delta"""
+    a = st.a; nU, nI = len(a['user_ids']), len(a['item_ids']); F = np.zeros(nU, dtype=bool); F[touched['U']] = True; F[touched['A']] = True
+    rec = a['recent']; valid = rec >= 0; r = np.where(valid, rec, 0)
+    inR = np.zeros(nI, dtype=bool); inR[touched['R']] = True; F |= (inR[r] & valid).any(axis=1)
+    if fallback_changed:   # users whose candidates come from the popularity fallback
+        has_nn = np.diff(st.lists('ii')[0]) > 0; has_u2i = np.diff(st.lists('u2i')[0]) > 0
+        F |= ~(has_u2i | (has_nn[r] & valid).any(axis=1))
+    if 'cooc' in st.meta['features']:   # co-occurrence with a touched item changed for every pair on it
+        hit = np.isin(old['item_id'], a['item_ids'][touched['T']])
+        F |= np.isin(a['user_ids'], np.asarray(old['user_id'])[hit])
+    return np.flatnonzero(F)
+
+def update_features(st: State, touched: dict, old: dict, ii: CandidateIndex, u2i: CandidateIndex):
+    """What changes in the features table: (new rows of the affected users, sorted by user; their raw ids;
+    positions in the old table whose per-item features changed; the new values of those features)"""
+    names = st.meta['features']; cooc = 'cooc' in names; Xb = touched['Xb'] if cooc else None
+    nn = neighbor_arrays(np.sort(st.item_ids).astype(np.int64), ii, N_ITEM_NEIGHBORS)
+    all_ctx = feature_context(st, np.zeros(0, dtype=np.int64), nn)
+    fallback = all_ctx.item_ids[popular_items(all_ctx)]; changed = fallback.tolist() != st.meta['fallback']
+    st.meta['fallback'] = fallback.tolist()
+    F = affected_users(st, touched, old, changed); ctx = feature_context(st, F, nn, Xb)
+    u, i = generate_candidates(ctx, u2i, fallback=ctx.item_codes(fallback)); new = build_features(ctx, u, i, names)
+    per_item = [n for n in names if n in ITEM_FEATURES]; pos = np.zeros(0, dtype=np.int64); vals = {}
+    if per_item:
+        items = np.asarray(old['item_id'])
+        pos = np.arange(len(items)) if touched['t_max_changed'] else np.flatnonzero(np.isin(items, st.a['item_ids'][touched['T']]))
+        codes = ctx.item_codes(items[pos]); zero = np.zeros(len(codes), dtype=np.int64)
+        vals = {n: FEATURES[n](ctx, zero, codes) for n in per_item}
+    return new, ctx.user_ids, pos, vals
+
+def _ranges(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Concatenated aranges lo[k]..hi[k]"""
+    n = hi - lo; return np.repeat(lo - np.concatenate(([0], np.cumsum(n)[:-1])), n) + np.arange(int(n.sum()))
+
+def write_features(path: str, fmt: str, old: dict, new: pd.DataFrame, users: np.ndarray, pos: np.ndarray, vals: dict):
+    """Apply update_features() to the table sorted by user. In its binary form, affected users whose row
+    count is unchanged and per-item values are written in place, and only the rows from the first
+    user whose count changed on are rewritten (new users with the highest ids are an append); the
+    text exports can only be rewritten whole."""
+    uid = np.asarray(old['user_id']); n = len(uid); nu = new['user_id'].to_numpy(); d = binary_source(path)
+    lo, hi = np.searchsorted(uid, users, 'left'), np.searchsorted(uid, users, 'right')
+    nlo, nhi = np.searchsorted(nu, users, 'left'), np.searchsorted(nu, users, 'right')
+    same = hi - lo == nhi - nlo; j = len(users) if same.all() else int(np.argmin(same))
+    if fmt != 'npy' or d is None: j = 0
+    start = int(lo[j]) if j < len(users) else (n if fmt == 'npy' and d else 0)
+    rows, src = _ranges(lo[:j], hi[:j]), _ranges(nlo[:j], nhi[:j]); p = pos < start; q = ~p
+    patches = [(pos[p][~np.isin(pos[p], rows)], {c: v[p][~np.isin(pos[p], rows)] for c, v in vals.items()}),
+               (rows, {c: new[c].to_numpy()[src] for c in new.columns})]
+    # rows from start on: the old ones of unaffected users (per-item values applied) with the new rows merged in
+    tail = {c: np.array(old[c][start:]) for c in new.columns}
+    for c, v in vals.items(): tail[c][pos[q] - start] = v[q]
+    keep = ~np.isin(tail['user_id'], users[j:]); nt = new.iloc[int(nlo[j]) if j < len(users) else len(new):]
+    at = np.searchsorted(tail['user_id'][keep], nt['user_id'].to_numpy())
+    tail = pd.DataFrame({c: np.insert(tail[c][keep], at, nt[c].to_numpy()) for c in new.columns})
+    if start == 0: write_table(tail, path, fmt)
+    else: update_table(d, patches, start, tail)
+
+def drop_stale_factors(processed: str, user_ids: np.ndarray, item_ids: np.ndarray) -> list[str]:
+    """Remove the factor-model outputs whose rows/columns follow another id mapping; returns their names"""
+    algos = set()
+    for n in os.listdir(processed):
+        p = os.path.join(processed, n)
+        if n.startswith('factors_'):
+            try: same = np.array_equal(np.load(os.path.join(p, 'user_ids.npy'), mmap_mode='r'), user_ids) and \
+                        np.array_equal(np.load(os.path.join(p, 'item_ids.npy'), mmap_mode='r'), item_ids)
+            except FileNotFoundError: same = False
+            if not same: algos.add(n[len('factors_'):])
+        elif n.startswith('recs_') and n.endswith('.npy') and n != 'recs_popularity.npy':
+            if np.load(p, mmap_mode='r').shape[0] != len(user_ids): algos.add(n[len('recs_'):-len('.npy')])
+    removed = []
+    for algo in sorted(algos):
+        for n in (f'recs_{algo}.npy', f'factors_{algo}', f'ann_{algo}'):
+            p = os.path.join(processed, n)
+            if os.path.isdir(p): shutil.rmtree(p); removed.append(n)
+            elif os.path.isfile(p): os.remove(p); removed.append(n)
+    return removed
+
+def write_outputs(st: State, feat: pd.DataFrame | None, a_: argparse.Namespace, t: Timer) -> dict:
+    """Phase 1 processed CSRs, popularity recs, meta.json and id maps, Phase 2 candidate lists, Phase 3 features"""
+    a = st.a; pu = id_rank(a['user_ids']); pi = id_rank(a['item_ids']); nU, nI = len(pu), len(pi)
+    tr = a['train'].tocoo(); train = sparse.csr_matrix((tr.data, (pu[tr.row], pi[tr.col])), shape=(nU, nI))
+    hu, hi, hw = st.hold.heldout(); held = sparse.csr_matrix((hw, (pu[hu], pi[hi])), shape=(nU, nI), dtype=np.float32)
+    processed = os.path.join(a_.phase1, 'data', 'processed'); os.makedirs(processed, exist_ok=True)
+    save_csr(train, os.path.join(processed, 'train_csr')); save_csr(held, os.path.join(processed, 'heldout_csr'))
+    heldout_json = os.path.join(processed, 'heldout.json')
+    if a_.format != 'npy':
+        heldout = [[] for _ in range(nU)]
+        for x, y in zip(pu[hu].tolist(), pi[hi].tolist()): heldout[x] = [y]
+        with open(heldout_json, 'w') as f: json.dump(heldout, f)
+    elif os.path.isfile(heldout_json): os.remove(heldout_json)   # a stale export would disagree with heldout_csr
+    counts = np.zeros(nI, dtype=np.int64); counts[pi] = a['train_pop']
+    np.save(os.path.join(processed, 'recs_popularity.npy'), recommend_popular(rank_items(counts), train, a_.k))
+    user_ids, item_ids = np.sort(a['user_ids']), np.sort(a['item_ids']); save_ids(processed, user_ids, item_ids)
+    with open(os.path.join(processed, 'meta.json'), 'w') as f: json.dump({'n_users': nU, 'n_items': nI, 'K': a_.k}, f)
+    for n in drop_stale_factors(processed, user_ids, item_ids): print(f'  removed {n} (built on the previous id mapping)')
+    ii = raw_index(st, 'ii', 'item_ids', 'item_ids'); u2i = raw_index(st, 'u2i', 'user_ids', 'item_ids')
+    os.makedirs(a_.p2, exist_ok=True); fmt = {'both': 'both', 'csv': 'json', 'npy': 'npy'}[a_.format]
+    write_candidates(ii, os.path.join(a_.p2, 'item_item_candidates.json'), fmt)
+    write_candidates(u2i, os.path.join(a_.p2, 'user_to_item_candidates.json'), fmt)
+    if feat is not None:
+        os.makedirs(a_.p3, exist_ok=True); write_table(feat, os.path.join(a_.p3, 'features.csv'), a_.format)
+    t('write'); return {'ii': ii, 'u2i': u2i}
+
+def init_state(df: pd.DataFrame, a_: argparse.Namespace, t: Timer) -> tuple[State, pd.DataFrame]:
+    """State (and features) for the full log, through the same update path a delta takes"""
+    meta = {'topk': a_.topk, 'u2i_topk': a_.topk, 'min_cooc': a_.min_cooc, 'block_size': a_.block_size,
+            'features': list(a_.features), 'fallback': []}
+    z = np.zeros(0, dtype=np.int64); ptr = np.zeros(1, dtype=np.int64); h = HoldoutState.empty(N_RECENT)
+    arrays = {'user_ids': z, 'item_ids': z, 'count': h.count, 'recent': h.items, 'recent_ts': h.ts, 'recent_w': h.weight,
+              'train_pop': z, 'item_pop': z, 'item_last_ts': z, 't_max': np.int64(0), 'norms': np.zeros(0),
+              'train': sparse.csr_matrix((0, 0), dtype=np.float32), 'X': sparse.csr_matrix((0, 0), dtype=np.float32),
+              'XT': sparse.csr_matrix((0, 0), dtype=np.float32)}
+    for n in LISTS: arrays.update({f'{n}_indptr': ptr, f'{n}_idx': z, f'{n}_val': np.zeros(0, dtype=np.float32)})
+    st = State(arrays, meta); touched = fold(st, df, t); meta['log_rows'] = len(df)
+    out = write_outputs(st, None, a_, t); feat = all_features(st, touched, out['ii'], out['u2i']); t('features')
+    return st, feat
+
+def all_features(st: State, touched: dict, ii: CandidateIndex, u2i: CandidateIndex) -> pd.DataFrame:
+    """Feature rows of every user, as build_features.py writes them"""
+    names = st.meta['features']; nn = neighbor_arrays(np.sort(st.item_ids).astype(np.int64), ii, N_ITEM_NEIGHBORS)
+    ctx = feature_context(st, np.arange(len(st.user_ids)), nn, touched['Xb'] if 'cooc' in names else None)
+    u, i = generate_candidates(ctx, u2i); st.meta['fallback'] = ctx.item_ids[popular_items(ctx)].tolist()
+    return build_features(ctx, u, i, names)
+
+def apply(st: State, df: pd.DataFrame, a_: argparse.Namespace, t: Timer, features_path: str, rebuild: bool = False):
+    """Fold df into st and write the outputs; rebuild: every feature row instead of the affected users' ones"""
+    touched = fold(st, df, t); out = write_outputs(st, None, a_, t)
+    if rebuild: write_table(all_features(st, touched, out['ii'], out['u2i']), features_path, a_.format); t('features'); return
+    d = binary_source(features_path)   # only the columns the update reads are paged in
+    old = load_columns(d) if d else {c: v.to_numpy() for c, v in pd.read_csv(features_path).items()}
+    write_features(features_path, a_.format, old, *update_features(st, touched, old, out['ii'], out['u2i'])); t('features')
+
+def verify(meta: dict, log: str, processed: str, features_path: str, ii: CandidateIndex, u2i: CandidateIndex) -> bool:
+    """Rebuild everything from the full log with the batch code paths and compare"""
+    df = read_interactions(log, mmap=False)
+    full_ii = item_item_index(df, meta['topk'], meta['block_size'], meta['min_cooc']); full_u2i = user_to_item_index(df, meta['u2i_topk'])
+    ctx = build_context(df, full_ii, extra_items=full_u2i.items, with_item_user='cooc' in meta['features'])
+    u, i = generate_candidates(ctx, full_u2i); full_feat = build_features(ctx, u, i, meta['features'])
+    df_i, u2i_map, it2i_map = build_mappings(df); train, test = leave_last_one_out(df_i)
+    same = lambda x, y: all(np.array_equal(np.asarray(getattr(x, f)), np.asarray(getattr(y, f))) for f in ('keys', 'offsets', 'items'))
+    frame_eq = lambda x, y: list(x.columns) == list(y.columns) and len(x) == len(y) and all(np.array_equal(x[c], y[c]) for c in x.columns)
+    csr_eq = lambda m, n: m.shape == n.shape and (abs(m - n) > 0).nnz == 0
+    checks = {'item_item': same(ii, full_ii), 'user_to_item': same(u2i, full_u2i),
+              'features': frame_eq(read_table(features_path, mmap=False), full_feat),
+              'train_csr': csr_eq(load_csr(os.path.join(processed, 'train_csr')), to_csr(train, len(u2i_map), len(it2i_map))),
+              'heldout_csr': csr_eq(load_csr(os.path.join(processed, 'heldout_csr')), to_csr(test, len(u2i_map), len(it2i_map)))}
+    for k, ok in checks.items(): print(f'  verify {k:<13} {"OK" if ok else "MISMATCH"}')
+    return all(checks.values())
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--init', action='store_true', help='(re)build the state and all outputs from the current log')
+    ap.add_argument('--delta', nargs='*', default=[], help='interaction files (csv or binary table, - for stdin) to append in order')
+    ap.add_argument('--state', default=os.path.join(P1, 'data', 'incremental'))
+    ap.add_argument('--phase1', default=P1, help='Phase 1 directory (log in data/raw, outputs in data/processed)')
+    ap.add_argument('--p2', default=P2); ap.add_argument('--p3', default=P3)
+    ap.add_argument('--topk', type=int, default=100); ap.add_argument('--min-cooc', type=int, default=1)
+    ap.add_argument('--block-size', type=int, default=2048); ap.add_argument('--k', type=int, default=10, help='popularity recs per user')
+    ap.add_argument('--features', nargs='+', default=list(DEFAULT_FEATURES), help=f'registered features, any of {sorted(FEATURES)}')
+    ap.add_argument('--format', choices=['csv', 'npy', 'both'], default='npy',
+                    help='outputs to write; the csv/json exports are rewritten whole on every delta, so only ask for them when needed')
+    ap.add_argument('--verify', action='store_true', help='compare the updated outputs with a full rebuild')
+    a_ = ap.parse_args(); log = os.path.join(a_.phase1, 'data', 'raw', 'interactions.csv'); features_path = os.path.join(a_.p3, 'features.csv')
+    if not a_.init and not a_.delta: ap.error('nothing to do: pass --init and/or --delta')
+    deltas = []   # every delta is checked before anything is written
+    for path in a_.delta:
+        try: deltas.append((path, check_delta(pd.read_csv(sys.stdin) if path == '-' else read_table(path, mmap=False), log)))
+        except ValueError as e: ap.error(f'{path}: {e}')
+    t = Timer(); t0 = time.perf_counter()
+    if a_.init or not os.path.isdir(a_.state):
+        print(f'Building state from {log}'); st, feat = init_state(read_interactions(log, mmap=False), a_, t)
+        os.makedirs(a_.p3, exist_ok=True); write_table(feat, features_path, a_.format); st.save(a_.state); t('save')
+    if deltas:
+        # the log is appended first and the state records how many of its rows it has folded, so a run that
+        # stopped in between leaves rows the next one folds from the log before its own deltas
+        st = State.load(a_.state); n = log_rows(log); done = st.meta.setdefault('log_rows', n)
+        if n < done: sys.exit(f'{log} has {n} rows but the state in {a_.state} folded {done}: rebuild it with --init')
+        if n > done:
+            print(f'Folding {n - done} log rows appended by an interrupted run')
+            apply(st, read_interactions(log).iloc[done:].reset_index(drop=True), a_, t, features_path, rebuild=True)
+            st.meta['log_rows'] = n; st.save(a_.state); t('save')
+    for path, delta in deltas:
+        print(f'Ingesting {len(delta)} interactions from {path}')
+        append_table(delta, log, 'both'); t('append_log')   # every form the log exists in, whatever --format is
+        apply(st, delta, a_, t, features_path); st.meta['log_rows'] += len(delta); st.save(a_.state); t('save')
+    print(f'Done in {time.perf_counter() - t0:.2f}s')
+    if a_.verify:
+        ok = verify(State.load(a_.state).meta, log, os.path.join(a_.phase1, 'data', 'processed'), features_path, read_candidates(os.path.join(a_.p2, 'item_item_candidates.json'), mmap=False),
+                    read_candidates(os.path.join(a_.p2, 'user_to_item_candidates.json'), mmap=False))
+        sys.exit(0 if ok else 1)
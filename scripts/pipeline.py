@@ -0,0 +1,227 @@
+"""Run the Phase 1-3 scripts as a DAG of stages, skipping every stage whose inputs and parameters are unchanged.
+
+    python scripts/pipeline.py                                               # whatever is out of date
+    python scripts/pipeline.py eval_ranker --stage-args train_ranker='--model hgb'   # a target and what it needs
+    python scripts/pipeline.py --dry-run                                     # show what would run
+    python scripts/pipeline.py --force features --jobs 2                     # rerun a stage even if cached
+
+Stages declare the files they read and write (paths under phases/; a `x.csv`/`x.json` artifact
+covers its binary directory `x/` too). A stage depends on the stages that write its inputs, and
+stages whose dependencies are done run concurrently, up to --jobs processes. A stage's key hashes
+its command line, its code (the script and the src/ packages it imports) and the content of its
+inputs. After a successful run the key and the hashes of its outputs go to .pipeline/state.json;
+the next run skips the stage while the key matches and the outputs still hash to what it wrote.
+Keys follow content, not mtimes, so a stage that reruns and writes identical outputs does not
+invalidate the stages after it. File hashes are memoized by (size, mtime), so unchanged
+artifacts are not read again.
+
+Each run writes a manifest to .pipeline/runs/<time>-<pid>.json (copied to .pipeline/last_run.json) with
+every stage's status (ran, cached, failed, blocked), key, wall time, peak RSS (VmHWM of the stage
+process, as in benchmark.py) and start/end offsets. Stage output goes to .pipeline/logs/<stage>.log.
+The raw log (phase1_baselines/data/raw/interactions) is an input, not a stage: create it with
+create_demo_data.py or make_synthetic.py.
+"""
+from __future__ import annotations
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..')); PHASES = os.path.join(ROOT, 'phases')
+sys.path.append(os.path.join(PHASES, 'phase1_baselines'))
+import argparse, hashlib, json, shutil, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from src.data.store import binary_path
+from benchmark import RUNNER
+
+@dataclass
+class Stage:
+    name: str
+    cwd: str                 # phase directory the script runs in
+    argv: list[str]          # script (relative to cwd) and its arguments
+    inputs: list[str]
+    outputs: list[str]
+    code: list[str] = field(default_factory=list)   # source trees besides the script
+
+RAW = 'phase1_baselines/data/raw/interactions.csv'
+P1 = 'phase1_baselines/data/processed'; P2 = 'phase2_candidates/outputs'; P3 = 'phase3_ranking/outputs'
+SRC1, SRC2, SRC3 = 'phase1_baselines/src', 'phase2_candidates/src', 'phase3_ranking/src'
+SPLIT = [f'{P1}/train_csr', f'{P1}/heldout_csr', f'{P1}/heldout.json', f'{P1}/meta.json', f'{P1}/user_ids.npy', f'{P1}/item_ids.npy']
+STAGES = [
+    Stage('popularity', 'phase1_baselines', ['scripts/run_popularity.py'], [RAW], [f'{P1}/recs_popularity.npy', *SPLIT], [SRC1]),
+    # popularity alone writes the split; svd computes the same one in memory and leaves the files alone
+    Stage('svd', 'phase1_baselines', ['scripts/run_mf_svd.py', '--no-split'], [RAW], [f'{P1}/recs_svd.npy', f'{P1}/factors_svd'], [SRC1]),
+    Stage('evaluate', 'phase1_baselines', ['scripts/evaluate.py'], [f'{P1}/recs_popularity.npy', f'{P1}/recs_svd.npy', *SPLIT], [], [SRC1]),
+    Stage('item_item', 'phase2_candidates', ['scripts/build_item_item.py'], [RAW], [f'{P2}/item_item_candidates.json'], [SRC1, SRC2]),
+    Stage('user_to_item', 'phase2_candidates', ['scripts/build_user_to_item.py'], [RAW], [f'{P2}/user_to_item_candidates.json'], [SRC1, SRC2]),
+    Stage('features', 'phase3_ranking', ['scripts/build_features.py', '--interactions', f'../{RAW}',
+                                         '--item-item', f'../{P2}/item_item_candidates.json', '--user2item', f'../{P2}/user_to_item_candidates.json'],
+          [RAW, f'{P2}/item_item_candidates.json', f'{P2}/user_to_item_candidates.json'], [f'{P3}/features.csv'], [SRC1, SRC3]),
+    Stage('train_ranker', 'phase3_ranking', ['scripts/train_ranker.py'], [f'{P3}/features.csv'], [f'{P3}/ranker.joblib'], [SRC1, SRC3]),
+    Stage('eval_ranker', 'phase3_ranking', ['scripts/eval_ranker.py'], [f'{P3}/features.csv', f'{P3}/ranker.joblib', *SPLIT], [],
+          [SRC1, SRC3, 'phase1_baselines/scripts/evaluate.py']),
+]
+OK = ('ran', 'cached')
+
+class Hasher:
+    """Content hashes of files and directories, memoized by (size, mtime_ns) across runs"""
+    def __init__(self, memo: dict | None = None):
+        self.memo = memo or {}; self._lock = threading.Lock()
+
+    def file(self, path: str) -> str:
+        st = os.stat(path); stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock: m = self.memo.get(path)
+        if m and m[0] == stamp: return m[1]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for b in iter(lambda: f.read(1 << 20), b''): h.update(b)
+        with self._lock: self.memo[path] = [stamp, h.hexdigest()]
+        return h.hexdigest()
+
+    def path(self, path: str) -> str | None:
+        """Hash of a file, or of a directory's relative names and file hashes; None when missing"""
+        if os.path.isfile(path): return self.file(path)
+        if not os.path.isdir(path): return None
+        h = hashlib.blake2b(digest_size=16)
+        for d, dirs, files in os.walk(path):
+            dirs[:] = sorted(x for x in dirs if x != '__pycache__')
+            for f in sorted(files):
+                if f.endswith('.pyc'): continue
+                p = os.path.join(d, f); h.update(f'{os.path.relpath(p, path)}={self.file(p)}\n'.encode())
+        return h.hexdigest()
+
+    def artifact(self, rel: str) -> str | None:
+        """Hash of an artifact under phases/: a .csv/.json export together with its binary directory"""
+        p = os.path.join(PHASES, rel); forms = [p, binary_path(p)] if binary_path(p) != p else [p]
+        hs = [self.path(x) for x in forms]
+        if all(x is None for x in hs): return None
+        return hs[0] if len(hs) == 1 else hashlib.blake2b(json.dumps(hs).encode(), digest_size=16).hexdigest()
+
+def stage_key(s: Stage, argv: list[str], hasher: Hasher) -> tuple[str, list[str]]:
+    """(key, missing inputs) of a stage about to run with argv"""
+    h = hashlib.sha256(json.dumps({'argv': argv, 'python': sys.version.split()[0]}).encode()); missing = []
+    for rel in [os.path.join(s.cwd, argv[0]), *s.code]: h.update(f'{rel}={hasher.artifact(rel)}\n'.encode())
+    for rel in s.inputs:
+        d = hasher.artifact(rel); h.update(f'{rel}={d}\n'.encode())
+        if d is None: missing.append(rel)
+    return h.hexdigest()[:16], missing
+
+def select(stages: list[Stage], targets: list[str]) -> tuple[list[Stage], dict[str, set[str]]]:
+    """Stages needed for the targets (all when none), in declaration order, and each stage's dependencies"""
+    producer = {o: s.name for s in stages for o in s.outputs}
+    deps = {s.name: {producer[i] for i in s.inputs if i in producer} for s in stages}
+    need = set(targets or [s.name for s in stages]); todo = list(need)
+    while todo:
+        for d in deps[todo.pop()] - need: need.add(d); todo.append(d)
+    return [s for s in stages if s.name in need], deps
+
+def peak_rss(log: str, ru) -> float:
+    """VmHWM the stage printed on exit, else wait4's ru_maxrss"""
+    with open(log, errors='replace') as f:
+        for line in f:
+            if line.startswith('BENCH '): return json.loads(line[6:])['peak_rss_mb']
+    return round(ru.ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+class Runner:
+    def __init__(self, stages: list[Stage], a):
+        self.a = a; self.dir = a.state_dir; self.lock = threading.Lock(); self.t0 = time.perf_counter()
+        os.makedirs(os.path.join(self.dir, 'logs'), exist_ok=True); os.makedirs(os.path.join(self.dir, 'runs'), exist_ok=True)
+        p = os.path.join(self.dir, 'state.json'); st = json.load(open(p)) if os.path.isfile(p) else {}
+        self.state = st.get('stages', {}); self.hasher = Hasher(st.get('hashes'))
+        self.stages, self.deps = select(stages, a.targets); self.results: dict[str, dict] = {}
+
+    def argv(self, s: Stage) -> list[str]:
+        return s.argv + self.a.stage_args.get(s.name, [])
+
+    def save_state(self):
+        p = os.path.join(self.dir, 'state.json')
+        with self.lock: data = json.dumps({'stages': self.state, 'hashes': self.hasher.memo})
+        with open(p + '.tmp', 'w') as f: f.write(data)
+        os.replace(p + '.tmp', p)
+
+    def is_cached(self, s: Stage, key: str) -> bool:
+        prev = self.state.get(s.name)
+        if s.name in self.a.force or not prev or prev['key'] != key: return False
+        return all(self.hasher.artifact(o) == prev['outputs'].get(o) for o in s.outputs)
+
+    def run(self, s: Stage) -> dict:
+        start = time.perf_counter() - self.t0; argv = self.argv(s); key, missing = stage_key(s, argv, self.hasher)
+        r = {'key': key, 'argv': argv, 'deps': sorted(self.deps[s.name]), 'start': round(start, 3)}
+        if missing: return {**r, 'status': 'failed', 'error': f'missing inputs: {", ".join(missing)}'}
+        if self.is_cached(s, key): return {**r, 'status': 'cached', 'last_seconds': self.state[s.name].get('seconds')}
+        log = os.path.join(self.dir, 'logs', f'{s.name}.log'); t = time.perf_counter()
+        with open(log, 'w') as out:
+            proc = subprocess.Popen([sys.executable, '-c', RUNNER, *argv], cwd=os.path.join(PHASES, s.cwd), stdout=out, stderr=subprocess.STDOUT)
+            _, status, ru = os.wait4(proc.pid, 0); proc.returncode = os.waitstatus_to_exitcode(status)
+        r.update(seconds=round(time.perf_counter() - t, 3), peak_rss_mb=peak_rss(log, ru), log=os.path.relpath(log, ROOT))
+        if proc.returncode:
+            tail = [l.rstrip() for l in open(log, errors='replace') if l.strip() and not l.startswith('BENCH ')][-1:]
+            return {**r, 'status': 'failed', 'error': (tail or [f'exit code {proc.returncode}'])[0]}
+        outputs = {o: self.hasher.artifact(o) for o in s.outputs}
+        if None in outputs.values(): return {**r, 'status': 'failed', 'error': f'did not write {[o for o, d in outputs.items() if d is None]}'}
+        with self.lock: self.state[s.name] = {'key': key, 'outputs': outputs, 'seconds': r['seconds'], 'peak_rss_mb': r['peak_rss_mb']}
+        self.save_state(); return {**r, 'status': 'ran'}
+
+    def report(self, s: Stage, r: dict):
+        r['end'] = round(time.perf_counter() - self.t0, 3); self.results[s.name] = r
+        extra = {'ran': lambda: f"{r['seconds']:>8.2f}s {r['peak_rss_mb']:>8.1f} MB", 'cached': lambda: 'cached',
+                 'failed': lambda: f"FAILED {r['error']}", 'blocked': lambda: f"blocked by {r['blocked_by']}"}[r['status']]()
+        print(f'  {s.name:<13} {extra}', flush=True)
+
+    def execute(self) -> dict:
+        """Run the selected stages, each as soon as its dependencies succeed"""
+        pending = {s.name: s for s in self.stages}; running = {}
+        with ThreadPoolExecutor(max(1, self.a.jobs)) as ex:
+            while pending or running:
+                for name, s in list(pending.items()):
+                    status = {d: self.results[d]['status'] if d in self.results else None for d in self.deps[name]}
+                    bad = sorted(d for d, x in status.items() if x is not None and x not in OK)
+                    if bad: del pending[name]; self.report(s, {'status': 'blocked', 'blocked_by': bad, 'deps': sorted(self.deps[name])})
+                    elif all(x in OK for x in status.values()): del pending[name]; running[ex.submit(self.run, s)] = s
+                if not running: continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in done: self.report(running.pop(f), f.result())
+        return self.manifest()
+
+    def manifest(self) -> dict:
+        res = self.results; ran = [r for r in res.values() if r['status'] == 'ran']
+        m = {'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - (time.perf_counter() - self.t0))),
+             'seconds': round(time.perf_counter() - self.t0, 3), 'jobs': self.a.jobs, 'targets': self.a.targets,
+             'stage_seconds': round(sum(r['seconds'] for r in ran), 3), 'peak_rss_mb': max((r['peak_rss_mb'] for r in ran), default=0.0),
+             'counts': {k: sum(r['status'] == k for r in res.values()) for k in ('ran', 'cached', 'failed', 'blocked')},
+             'stages': {s.name: res[s.name] for s in self.stages}}
+        self.save_state(); t = time.time()
+        p = os.path.join(self.dir, 'runs', f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(t))}.{int(t % 1 * 1e6):06d}-{os.getpid()}.json")
+        with open(p, 'w') as f: json.dump(m, f, indent=1)
+        shutil.copyfile(p, os.path.join(self.dir, 'last_run.json')); m['path'] = p
+        return m
+
+    def plan(self):
+        """What a run would do: a stage reruns if its key changed or an upstream stage reruns
+        (an upstream rerun that writes identical outputs would still let it be skipped)"""
+        will = set()
+        for s in self.stages:
+            up = sorted(self.deps[s.name] & will); key, missing = stage_key(s, self.argv(s), self.hasher)
+            why = (f'after {", ".join(up)}' if up else f'missing {", ".join(missing)}' if missing else
+                   'forced' if s.name in self.a.force else 'no previous run' if s.name not in self.state else
+                   'cached' if self.is_cached(s, key) else 'changed')
+            if why != 'cached': will.add(s.name)
+            print(f"  {s.name:<13} {'skip' if why == 'cached' else 'run ':<4} {why}")
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('targets', nargs='*', metavar='STAGE',
+                    help=f'stages to bring up to date, with their dependencies (default: all of {[s.name for s in STAGES]})')
+    ap.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='stages run at once')
+    ap.add_argument('--force', nargs='+', default=[], choices=[s.name for s in STAGES], metavar='STAGE', help='rerun these even if cached')
+    ap.add_argument('--stage-args', nargs='+', default=[], metavar='STAGE=ARGS',
+                    help="extra arguments for a stage's script (part of its key), e.g. train_ranker='--model hgb'")
+    ap.add_argument('--state-dir', default=os.path.join(ROOT, '.pipeline'), help='state, logs and run manifests')
+    ap.add_argument('--dry-run', action='store_true', help='print what would run and exit'); a = ap.parse_args()
+    a.stage_args = {k: v.split() for k, v in (x.split('=', 1) for x in a.stage_args)}
+    unknown = set(a.targets) - {s.name for s in STAGES}
+    if unknown: ap.error(f'unknown stage(s): {", ".join(sorted(unknown))}')
+    runner = Runner(STAGES, a)
+    if a.dry_run: runner.plan(); sys.exit(0)
+    print(f'Running {len(runner.stages)} stage(s) with up to {a.jobs} at a time')
+    m = runner.execute(); c = m['counts']
+    print(f"{c['ran']} ran, {c['cached']} cached, {c['failed']} failed, {c['blocked']} blocked in {m['seconds']:.2f}s "
+          f"(stage time {m['stage_seconds']:.2f}s, largest peak {m['peak_rss_mb']:.1f} MB); manifest {os.path.relpath(m['path'], ROOT)}")
+    sys.exit(1 if c['failed'] or c['blocked'] else 0)
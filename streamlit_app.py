@@ -1,25 +1,13 @@
 """
 Main entry point for Streamlit Cloud deployment
 """
-import streamlit as st
 import sys
 from pathlib import Path
 
-# Set page config first (must be the first Streamlit command)
-st.set_page_config(
-    page_title="Recommender System",
-    page_icon="🛍️", 
-    layout="wide",
-)
+# The UI lives in phases/phase4_serving/app/ui.py; importing it (once per process) and calling
+# main() on every rerun keeps its cached artifacts and imports alive between interactions
+sys.path.insert(0, str(Path(__file__).parent / "phases" / "phase4_serving"))
 
-# Add the correct path to find our UI module
-current_dir = Path(__file__).parent
-ui_path = current_dir / "phases" / "phase4_serving" / "app"
-sys.path.insert(0, str(ui_path))
+from app.ui import main
 
-# Import the simplified UI
-try:
-    exec(open(ui_path / "ui_simple.py").read())
-except:
-    # Fallback to original UI
-    exec(open(ui_path / "ui.py").read())
\ No newline at end of file
+main()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import sys, os, time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'phases', 'phase4_serving'))
+from app.cache import ResponseCache
+
+def test_hit_miss_and_smaller_k_slices():
+    c = ResponseCache()
+    assert c.get(1, 3, 'v1') is None
+    c.put(1, 3, 'v1', [7, 8, 9])
+    assert c.get(1, 3, 'v1') == [7, 8, 9] and c.get(1, 2, 'v1') == [7, 8]
+    assert c.get(1, 5, 'v1') is None                      # a longer list was never computed
+    c.put(2, 5, 'v1', [4, 5])                             # shorter than k: complete, answers any k
+    assert c.get(2, 50, 'v1') == [4, 5]
+    assert (c.hits, c.misses) == (3, 2)
+
+def test_ttl_expires_entries():
+    c = ResponseCache(ttl=0.05); c.put(1, 2, 'v1', [1, 2])
+    assert c.get(1, 2, 'v1') == [1, 2]
+    time.sleep(0.1)
+    assert c.get(1, 2, 'v1') is None and c.expired == 1 and c.stats()['size'] == 0
+
+def test_lru_evicts_the_least_recently_used():
+    c = ResponseCache(max_entries=2)
+    c.put(1, 1, 'v1', [1]); c.put(2, 1, 'v1', [2])
+    assert c.get(1, 1, 'v1') == [1]                       # 2 is now the least recently used
+    c.put(3, 1, 'v1', [3])
+    assert c.get(2, 1, 'v1') is None and c.get(1, 1, 'v1') == [1] and c.get(3, 1, 'v1') == [3]
+    assert c.evictions == 1
+
+def test_new_version_invalidates():
+    c = ResponseCache(); c.put(1, 1, 'v1', [1])
+    assert c.get(1, 1, 'v2') is None and c.version == 'v2' and c.invalidations == 1
+    c.put(1, 1, 'v2', [2])
+    assert c.get(1, 1, 'v2') == [2]
+
+def test_old_version_is_ignored():
+    c = ResponseCache(); c.put(1, 1, 'v1', [1]); c.put(1, 1, 'v2', [2])
+    # a request still holding the v1 snapshot neither reads, writes nor wipes the v2 entries
+    assert c.get(1, 1, 'v1') is None and c.get_many([1], 1, 'v1') == [None]
+    c.put(1, 1, 'v1', [9]); c.put_many([1, 5], 1, 'v1', [[9], [9]])
+    assert c.version == 'v2' and c.get(1, 1, 'v2') == [2] and c.get(5, 1, 'v2') is None
+    assert c.invalidations == 1
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import sys, os, json, subprocess
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(ROOT, 'phases', 'phase1_baselines'))
+import numpy as np, pandas as pd
+from src.data.store import write_interactions, append_table, read_interactions, load_csr
+
+SCRIPT = os.path.join(ROOT, 'scripts', 'ingest_delta.py')
+PARTS = ('item_item', 'user_to_item', 'features', 'train_csr', 'heldout_csr')
+
+def log(rng, n: int, users: int, items: int, t0: int) -> pd.DataFrame:
+    return pd.DataFrame({'user_id': rng.integers(0, users, n), 'item_id': rng.integers(0, items, n),
+                         'timestamp': t0 + rng.integers(0, 50, n), 'weight': np.ones(n, dtype=np.float32)})
+
+def ingest(tmp, *args) -> subprocess.CompletedProcess:
+    dirs = ['--phase1', str(tmp / 'p1'), '--p2', str(tmp / 'p2'), '--p3', str(tmp / 'p3'), '--state', str(tmp / 'state'), '--topk', '20']
+    return subprocess.run([sys.executable, SCRIPT, *dirs, *args], capture_output=True, text=True, timeout=300)
+
+def init(tmp, rng):
+    (tmp / 'p1' / 'data' / 'raw').mkdir(parents=True)
+    write_interactions(log(rng, 3000, 150, 80, 0), str(tmp / 'p1' / 'data' / 'raw' / 'interactions.csv'))
+    r = ingest(tmp, '--init'); assert r.returncode == 0, r.stdout + r.stderr
+
+def assert_verified(r: subprocess.CompletedProcess):
+    out = r.stdout + r.stderr; assert r.returncode == 0, out
+    for part in PARTS: assert f'verify {part:<13} OK' in out
+
+def test_delta_matches_full_rebuild(tmp_path):
+    rng = np.random.default_rng(0); init(tmp_path, rng)
+    # factor outputs on the init mapping, as run_mf_svd.py would leave them
+    processed = tmp_path / 'p1' / 'data' / 'processed'; users = np.load(processed / 'user_ids.npy')
+    for algo in ('svd', 'als'):
+        (processed / f'factors_{algo}').mkdir(); (processed / f'ann_{algo}').mkdir()
+        for n in ('user_ids', 'item_ids'): np.save(processed / f'factors_{algo}' / f'{n}.npy', np.load(processed / f'{n}.npy'))
+        np.save(processed / f'recs_{algo}.npy', np.zeros((len(users), 10), dtype=np.int32))
+    r = ingest(tmp_path, '--init'); assert r.returncode == 0 and (processed / 'factors_svd').is_dir(), r.stdout + r.stderr
+    # new users and items, pairs already in the log, and rows tied on timestamp within a user
+    delta = pd.concat([log(rng, 80, 180, 30, 40).assign(item_id=lambda d: d['item_id'] + 70),
+                       pd.DataFrame({'user_id': [3, 3, 3, 170, 170], 'item_id': [5, 5, 9, 95, 96],
+                                     'timestamp': [60, 60, 60, 55, 55], 'weight': np.ones(5, dtype=np.float32)})])
+    delta.to_csv(tmp_path / 'delta.csv', index=False)
+    assert_verified(ingest(tmp_path, '--delta', str(tmp_path / 'delta.csv'), '--verify'))
+    # the delta adds users and items: meta.json and the id maps follow, factor outputs on the old mapping are gone
+    meta = json.load(open(processed / 'meta.json')); shape = load_csr(str(processed / 'train_csr')).shape
+    assert (meta['n_users'], meta['n_items']) == shape == (len(np.load(processed / 'user_ids.npy')), len(np.load(processed / 'item_ids.npy')))
+    assert shape[0] > len(users)
+    for algo in ('svd', 'als'):
+        for n in (f'recs_{algo}.npy', f'factors_{algo}', f'ann_{algo}'): assert not (processed / n).exists()
+
+def test_invalid_delta_is_rejected_before_anything_is_written(tmp_path):
+    rng = np.random.default_rng(1); init(tmp_path, rng); path = str(tmp_path / 'p1' / 'data' / 'raw' / 'interactions.csv')
+    n = len(read_interactions(path))
+    for text in ('user_id,item_id,timestamp\n1,2,\n', 'user_id,item_id\n1,2\n', 'user_id,item_id,timestamp\n1,2.5,7\n',
+                 'user_id,item_id,timestamp\n1,2,99999999999999999999\n'):
+        (tmp_path / 'bad.csv').write_text(text)
+        r = ingest(tmp_path, '--delta', str(tmp_path / 'bad.csv')); assert r.returncode == 2 and 'bad.csv' in r.stderr, r.stdout + r.stderr
+    assert len(read_interactions(path)) == n
+
+def test_rows_appended_by_an_interrupted_run_are_folded_next_time(tmp_path):
+    rng = np.random.default_rng(2); init(tmp_path, rng); path = str(tmp_path / 'p1' / 'data' / 'raw' / 'interactions.csv')
+    append_table(log(rng, 40, 160, 85, 50), path)   # a run that appended and died before saving the state
+    log(rng, 30, 170, 90, 60).to_csv(tmp_path / 'delta.csv', index=False)
+    r = ingest(tmp_path, '--delta', str(tmp_path / 'delta.csv'), '--verify'); assert 'Folding 40 log rows' in r.stdout
+    assert_verified(r)
+
+def test_text_exports_only_on_request(tmp_path):
+    rng = np.random.default_rng(3); init(tmp_path, rng); heldout = tmp_path / 'p1' / 'data' / 'processed' / 'heldout.json'
+    log(rng, 30, 170, 90, 60).to_csv(tmp_path / 'delta.csv', index=False)
+    assert_verified(ingest(tmp_path, '--delta', str(tmp_path / 'delta.csv'), '--format', 'both', '--verify'))
+    assert heldout.is_file() and (tmp_path / 'p3' / 'features.csv').is_file()
+    log(rng, 30, 180, 95, 70).to_csv(tmp_path / 'delta.csv', index=False)
+    assert_verified(ingest(tmp_path, '--delta', str(tmp_path / 'delta.csv'), '--verify'))
+    assert not heldout.exists()
@@ -0,0 +1,22 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'phases', 'phase1_baselines'))
+import numpy as np, pytest
+from src.utils.metrics import evaluate, recall_at_k, ndcg_at_k
+
+REC = np.array([[1, 2, 3], [4, 5, 6]])
+HELD = [[3], [9]]
+
+def test_metrics_are_reported_under_the_requested_k():
+    m = evaluate(REC, HELD, ks=(2, 3, 2))['metrics']
+    assert {k for k in m if k.startswith('recall')} == {'recall@2', 'recall@3'}
+    assert m['recall@2'] == 0.0 and m['recall@3'] == 0.5 and m['hit_rate@3'] == 0.5
+
+def test_k_beyond_the_recommendation_columns_is_an_error():
+    for ks in [(10,), (3, 20), (0,)]:
+        with pytest.raises(ValueError): evaluate(REC, HELD, ks=ks)
+    with pytest.raises(ValueError): recall_at_k(REC, HELD, k=10)
+    with pytest.raises(ValueError): ndcg_at_k(REC, HELD, k=10)
+
+def test_single_k_helpers():
+    assert recall_at_k(REC, HELD, k=3) == 0.5 and ndcg_at_k(REC, HELD, k=1) == 0.0
@@ -0,0 +1,28 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'phases', 'phase4_serving'))
+import pytest
+from app.registry import HotSwap
+
+class Counter(HotSwap):
+    artifact = 'test'
+    def __init__(self):
+        super().__init__(check_interval=0.0); self.v = '1'; self.fail = False; self.loads = 0
+    def version(self): return self.v
+    def load(self, version):
+        self.loads += 1
+        if self.fail: raise OSError('partial write')
+        return f'value {version}'
+
+def test_subclass_missing_a_hook_fails_at_instantiation():
+    class NoLoad(HotSwap):
+        def version(self): return '1'
+    with pytest.raises(TypeError): NoLoad()
+
+def test_swaps_on_new_version_and_keeps_serving_after_a_failed_load():
+    h = Counter(); assert h.get() == 'value 1' and h.get() == 'value 1' and h.loads == 1
+    h.v = '2'; h.fail = True
+    assert h.get() == 'value 1' and h.last_error == 'OSError: partial write'
+    assert h.get() == 'value 1' and h.loads == 2        # the failed version is not retried
+    h.v = '3'; h.fail = False
+    assert h.get() == 'value 3' and h.last_error is None
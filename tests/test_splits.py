@@ -0,0 +1,35 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'phases', 'phase1_baselines'))
+import numpy as np, pandas as pd
+from src.data.splits import leave_last_one_out, leave_last_n_indices
+
+def reference_split(df):
+    """The original groupby split: stable sort by (user, timestamp), last row per user held out"""
+    s = df.sort_values(['user_id', 'timestamp'], kind='stable')
+    last = s.groupby('user_id').cumcount(ascending=False) == 0
+    multi = s.groupby('user_id')['user_id'].transform('size') > 1
+    return s[~(last & multi)].reset_index(drop=True), s[last & multi].reset_index(drop=True)
+
+def test_float_timestamps_keep_sub_second_order():
+    df = pd.DataFrame({'user_id': [1, 1, 1], 'item_id': [7, 8, 9], 'timestamp': [10.7, 10.2, 5.0]})
+    train, test = leave_last_one_out(df)
+    assert test['item_id'].tolist() == [7] and sorted(train['item_id']) == [8, 9]
+
+def test_tied_timestamps_hold_out_the_later_row():
+    df = pd.DataFrame({'user_id': [2, 1, 2, 1, 2], 'item_id': [1, 2, 3, 4, 5], 'timestamp': [5, 3, 5, 3, 1]})
+    train, test = leave_last_one_out(df)
+    assert test.sort_values('user_id')['item_id'].tolist() == [4, 3]
+    ref_train, ref_test = reference_split(df)
+    pd.testing.assert_frame_equal(test, ref_test); pd.testing.assert_frame_equal(train, ref_train)
+
+def test_matches_reference_on_random_logs():
+    rng = np.random.default_rng(0)
+    for ts in (rng.integers(0, 20, 500), rng.integers(0, 20, 500) + rng.random(500).round(1)):
+        df = pd.DataFrame({'user_id': rng.integers(0, 40, 500), 'item_id': np.arange(500), 'timestamp': ts})
+        train, test = leave_last_one_out(df); ref_train, ref_test = reference_split(df)
+        pd.testing.assert_frame_equal(test, ref_test); pd.testing.assert_frame_equal(train, ref_train)
+
+def test_indices_without_timestamps_keep_input_order():
+    train, test = leave_last_n_indices(np.array([3, 1, 3, 1, 3]), None, 1)
+    assert test.tolist() == [3, 4] and train.tolist() == [1, 0, 2]
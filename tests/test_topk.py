@@ -0,0 +1,35 @@
+from __future__ import annotations
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'phases', 'phase4_serving'))
+import numpy as np, pytest
+from app.topk import write_topk, TopKTable, TopKStore
+
+ITEMS = np.array([[7, 3, 5, -1], [2, -1, -1, -1], [9, 8, 1, 4]])
+LENS = np.array([3, 1, 4])
+
+def table(tmp_path, user_ids) -> TopKTable:
+    path = str(tmp_path / 'topk.bin'); scores = np.linspace(1, 0, ITEMS.size).reshape(ITEMS.shape)
+    write_topk(path, np.array(user_ids), ITEMS, scores, LENS, 'v1')
+    return TopKTable(path)
+
+@pytest.mark.parametrize('user_ids, dense', [([0, 2, 5], True), ([3, 10 ** 9, 10 ** 12], False)])
+def test_lookup_dense_and_sparse_index(tmp_path, user_ids, dense):
+    t = table(tmp_path, user_ids); assert bool(len(t.index)) == dense and t.version == 'v1' and t.k == 4
+    assert t.lookup(user_ids[0], 2) == [7, 3] and t.lookup(user_ids[0], 4) == [7, 3, 5] and t.lookup(user_ids[1], 4) == [2]
+    assert t.lookup(user_ids[2], 4) == [9, 8, 1, 4]
+    rows = t.rows(np.array(user_ids[::-1])); assert rows.tolist() == [2, 1, 0]
+    assert t.lookup_rows(rows, 2) == [[9, 8], [2], [7, 3]]
+
+@pytest.mark.parametrize('user_ids', [[0, 2, 5], [3, 10 ** 9, 10 ** 12]])
+def test_absent_and_negative_users(tmp_path, user_ids):
+    t = table(tmp_path, user_ids); missing = [1, 4, 6, 10 ** 6, -1, -(10 ** 12)]
+    assert t.rows(np.array(missing)).tolist() == [-1] * len(missing)
+    assert all(t.row(u) == -1 and t.lookup(u, 2) is None for u in missing)
+
+def test_k_beyond_k_max_is_not_answered(tmp_path):
+    t = table(tmp_path, [0, 2, 5]); assert t.lookup(0, 5) is None and t.lookup(0, 4) == [7, 3, 5]
+
+def test_store_maps_the_file_and_drops_it_when_removed(tmp_path):
+    s = TopKStore(str(tmp_path / 'topk.bin'), check_interval=0.0); assert s.get() is None and s.current is None
+    table(tmp_path, [0, 2, 5]); t = s.get(); assert t is s.current and s.status('v1')['current']
+    os.remove(tmp_path / 'topk.bin'); assert s.get() is None and s.current is None